@@ -6,55 +6,126 @@
 
 from __future__ import print_function
 
-from   pyflyby._autoimp         import (auto_eval, auto_import,
-                                        find_missing_imports)
-from   pyflyby._dbg             import (add_debug_functions_to_builtins,
-                                        attach_debugger, debug_on_exception,
-                                        debug_statement, debugger,
-                                        enable_exception_handler_debugger,
-                                        enable_faulthandler,
-                                        enable_signal_handler_debugger,
-                                        print_traceback, remote_print_stack)
-from   pyflyby._dynimp          import add_import
-from   pyflyby._file            import Filename
-from   pyflyby._flags           import CompilerFlags
-from   pyflyby._importdb        import ImportDB
-from   pyflyby._imports2s       import (canonicalize_imports,
-                                        reformat_import_statements,
-                                        remove_broken_imports,
-                                        replace_star_imports,
-                                        transform_imports)
-from   pyflyby._importstmt      import (Import, ImportStatement,
-                                        NonImportStatementError)
-from   pyflyby._interactive     import (disable_auto_importer,
-                                        enable_auto_importer,
-                                        install_in_ipython_config_file,
-                                        load_ipython_extension,
-                                        unload_ipython_extension)
-from   pyflyby._livepatch       import livepatch, xreload
-from   pyflyby._log             import logger
-from   pyflyby._modules         import rebuild_import_cache
-from   pyflyby._parse           import PythonBlock, PythonStatement
-from   pyflyby._saveframe       import saveframe
-from   pyflyby._saveframe_reader \
-                                import SaveframeReader
-from   pyflyby._version         import __version__
-
-# Deprecated:
-from   pyflyby._dbg             import (breakpoint, debug_exception,
-                                        enable_exception_handler,
-                                        enable_signal_handler_breakpoint,
-                                        waitpoint)
-
-from   typing                   import Sequence
-
-
-# Promote the function & classes that we've chosen to expose publicly to be
-# known as pyflyby.Foo instead of pyflyby._module.Foo.
-for x in list(globals().values()):
-    if getattr(x, "__module__", "").startswith("pyflyby."):
-        x.__module__ = "pyflyby"
-del x
+import importlib
+from   typing                   import Any, Dict, List, Sequence, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from   pyflyby._autoimp         import (auto_eval, auto_import,
+                                            find_missing_imports)
+    from   pyflyby._dbg             import (add_debug_functions_to_builtins,
+                                            attach_debugger, debug_on_exception,
+                                            debug_statement, debugger,
+                                            enable_exception_handler_debugger,
+                                            enable_faulthandler,
+                                            enable_signal_handler_debugger,
+                                            print_traceback, remote_print_stack,
+                                            remote_stacks)
+    from   pyflyby._dynimp          import add_import
+    from   pyflyby._file            import Filename
+    from   pyflyby._flags           import CompilerFlags
+    from   pyflyby._importdb        import ImportDB
+    from   pyflyby._imports2s       import (canonicalize_imports,
+                                            reformat_import_statements,
+                                            remove_broken_imports,
+                                            replace_star_imports,
+                                            transform_imports)
+    from   pyflyby._importstmt      import (Import, ImportStatement,
+                                            NonImportStatementError)
+    from   pyflyby._interactive     import (disable_auto_importer,
+                                            enable_auto_importer,
+                                            install_in_ipython_config_file,
+                                            load_ipython_extension,
+                                            unload_ipython_extension)
+    from   pyflyby._livepatch       import livepatch, xreload, xreload_all
+    from   pyflyby._log             import logger
+    from   pyflyby._modules         import rebuild_import_cache
+    from   pyflyby._parse           import PythonBlock, PythonStatement
+    from   pyflyby._saveframe       import saveframe
+    from   pyflyby._saveframe_reader \
+                                    import (SaveframeReader, group_saveframes,
+                                            query_saveframes)
+    from   pyflyby._version         import __version__
+
+    # Deprecated:
+    from   pyflyby._dbg             import (breakpoint, debug_exception,
+                                            enable_exception_handler,
+                                            enable_signal_handler_breakpoint,
+                                            waitpoint)
+
+
+# The public names, by the module that defines them.  They are imported on
+# first access (PEP 562), so that e.g. ``py 'os.getcwd()'`` doesn't pay for
+# importing the debugger, saveframe or IPython support.
+_EXPORTS: Dict[str, List[str]] = {
+    "pyflyby._autoimp": ["auto_eval", "auto_import", "find_missing_imports"],
+    "pyflyby._dbg": [
+        "add_debug_functions_to_builtins", "attach_debugger",
+        "debug_on_exception", "debug_statement", "debugger",
+        "enable_exception_handler_debugger", "enable_faulthandler",
+        "enable_signal_handler_debugger", "print_traceback",
+        "remote_print_stack", "remote_stacks",
+        # Deprecated:
+        "breakpoint", "debug_exception", "enable_exception_handler",
+        "enable_signal_handler_breakpoint", "waitpoint",
+    ],
+    "pyflyby._dynimp": ["add_import"],
+    "pyflyby._file": ["Filename"],
+    "pyflyby._flags": ["CompilerFlags"],
+    "pyflyby._importdb": ["ImportDB"],
+    "pyflyby._imports2s": [
+        "canonicalize_imports", "reformat_import_statements",
+        "remove_broken_imports", "replace_star_imports", "transform_imports",
+    ],
+    "pyflyby._importstmt": ["Import", "ImportStatement",
+                            "NonImportStatementError"],
+    "pyflyby._interactive": [
+        "disable_auto_importer", "enable_auto_importer",
+        "install_in_ipython_config_file", "load_ipython_extension",
+        "unload_ipython_extension",
+    ],
+    "pyflyby._livepatch": ["livepatch", "xreload", "xreload_all"],
+    "pyflyby._log": ["logger"],
+    "pyflyby._modules": ["rebuild_import_cache"],
+    "pyflyby._parse": ["PythonBlock", "PythonStatement"],
+    "pyflyby._saveframe": ["saveframe"],
+    "pyflyby._saveframe_reader": ["SaveframeReader", "group_saveframes",
+                                  "query_saveframes"],
+    "pyflyby._version": ["__version__"],
+}
+
+_EXPORTED_FROM = {name: modname
+                  for modname, names in _EXPORTS.items()
+                  for name in names}
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        modname = _EXPORTED_FROM[name]
+    except KeyError:
+        if name.startswith("_") and not name.startswith("__"):
+            # Submodules used to be imported along with pyflyby, and code
+            # refers to e.g. ``pyflyby._interactive`` after just ``import
+            # pyflyby``; keep that working.
+            try:
+                return importlib.import_module("%s.%s" % (__name__, name))
+            except ModuleNotFoundError as e:
+                if e.name != "%s.%s" % (__name__, name):
+                    raise
+        raise AttributeError(
+            "module %r has no attribute %r" % (__name__, name)) from None
+    module = importlib.import_module(modname)
+    # Promote the functions & classes that we've chosen to expose publicly
+    # to be known as pyflyby.Foo instead of pyflyby._module.Foo.
+    for x in _EXPORTS[modname]:
+        value = getattr(module, x)
+        if getattr(value, "__module__", "").startswith("pyflyby."):
+            value.__module__ = "pyflyby"
+        globals()[x] = value
+    return globals()[name]
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_EXPORTED_FROM))
 
 
 # Discourage "from pyflyby import *".
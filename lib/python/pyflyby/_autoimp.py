@@ -13,7 +13,10 @@ import contextlib
 import copy
 from   dataclasses              import field
 
+import importlib.machinery
+import importlib.util
 import logging
+import opcode
 from   pyflyby._file            import FileText, Filename
 from   pyflyby._flags           import CompilerFlags
 from   pyflyby._idents          import (BadDottedIdentifierError,
@@ -24,13 +27,16 @@ from   pyflyby._log             import logger
 from   pyflyby._modules         import ModuleHandle
 from   pyflyby._parse           import (PythonBlock, _is_ast_str,
                                         infer_compile_mode)
+from   pyflyby._symbolindex     import SymbolIndex
 from   pyflyby._util            import _has_ignore_pragma
 
 import sys
 import types
 from   types                    import EllipsisType, NoneType
-from   typing                   import (Any, Callable, Dict, Iterator, List,
-                                        Optional, Set, Tuple, Union)
+from   typing                   import (Any, Callable, Dict, FrozenSet,
+                                        Iterator, List, Optional, Set, Tuple,
+                                        Union)
+import weakref
 
 
 if sys.version_info >= (3, 13):
@@ -495,6 +501,9 @@ class _MissingImportFinder:
 
         # Whether we're currently in a FunctionDef.
         self._in_FunctionDef = False
+        # Names loaded (or stored into) outside any function body or lambda.
+        # Missing imports not in here are only needed once a function runs.
+        self._loaded_outside_functions: Set[str] = set()
         # Current lineno.
         self._lineno = None
         self._in_class_def = 0
@@ -507,6 +516,23 @@ class _MissingImportFinder:
         self._scan_node(node)
         return sorted(set(imp for lineno,imp in self.missing_imports))
 
+    def find_missing_imports_by_scope(
+        self, node: ast.AST
+    ) -> Tuple[List[DottedIdentifier], List[DottedIdentifier]]:
+        """
+        Like `find_missing_imports`, but also return the missing names that
+        are only referenced inside function bodies and lambdas, i.e. that
+        aren't needed until one of those is called.  A name doesn't count as
+        function-only if another name with the same first component (e.g.
+        "os.sep" for "os.path") is needed outside functions.
+        """
+        missing = self.find_missing_imports(node)
+        needed_now = set(m.parts[0] for m in missing
+                         if str(m) in self._loaded_outside_functions)
+        in_functions_only = [m for m in missing
+                             if m.parts[0] not in needed_now]
+        return missing, in_functions_only
+
     def _scan_node(self, node: ast.AST) -> None:
         oldscopestack = self.scopestack
         myglobals = self.scopestack[-1]
@@ -1228,6 +1254,8 @@ class _MissingImportFinder:
                         )
                         if m not in self.missing_imports:
                             self.missing_imports.append(m)
+                        if not self._in_FunctionDef:
+                            self._loaded_outside_functions.add(fullname)
             # If we're redefining something, and it has not been used, then
             # record it as unused.
             oldvalue = scope.get(fullname)
@@ -1295,6 +1323,7 @@ class _MissingImportFinder:
         """
         assert isinstance(fullname, str), fullname
         logger.debug("_visit_Load_defered_global(%r)", fullname)
+        self._loaded_outside_functions.add(fullname)
         current_scope = self._scope_name_stack[-1] if self._scope_name_stack else None
         if symbol_needs_import(
             fullname, self.scopestack, using_scope_name=current_scope
@@ -1314,6 +1343,7 @@ class _MissingImportFinder:
 
     def _visit_Load_immediate(self, fullname: str) -> None:
         logger.debug("_visit_Load_immediate(%r)", fullname)
+        self._loaded_outside_functions.add(fullname)
         self._check_load(fullname, self.scopestack, self._lineno)
 
 
@@ -1618,27 +1648,58 @@ def _find_loads_without_stores_in_code(
         raise TypeError(
             "_find_loads_without_stores_in_code(): expected a CodeType; got a %s"
             % (type(co).__name__,))
-    # Initialize local constants for fast access.
-    from opcode import EXTENDED_ARG, opmap
-
-    LOAD_ATTR    = opmap['LOAD_ATTR']
-    # LOAD_METHOD is _supposed_ to be removed in 3.12 but still present in opmap
-    # it was actually removed in 3.14
-    if sys.version_info < (3, 12):
-        LOAD_METHOD = opmap["LOAD_METHOD"]
-    else:
-        # Just delete any ref to LOAD_METHOD once we drop <3.12
-        LOAD_METHOD = None
-    LOAD_GLOBAL = opmap["LOAD_GLOBAL"]
-    LOAD_NAME = opmap["LOAD_NAME"]
-    STORE_ATTR = opmap["STORE_ATTR"]
-    STORE_GLOBAL = opmap["STORE_GLOBAL"]
-    STORE_NAME = opmap["STORE_NAME"]
-
-    if sys.version_info > (3, 11):
-        CACHE = opmap["CACHE"]
-    else:
-        CACHE = object()
+    try:
+        result = _loads_without_stores_cache[co]
+    except KeyError:
+        found: Set[str] = set()
+        _scan_loads_without_stores(co, found)
+        # Recurse on inner function definitions, lambdas, generators, etc.
+        for arg in co.co_consts:
+            if isinstance(arg, types.CodeType):
+                _find_loads_without_stores_in_code(arg, found)
+        result = frozenset(found)
+        _loads_without_stores_cache[co] = result
+    loads_without_stores.update(result)
+
+
+# Results of `_find_loads_without_stores_in_code`, by code object.  Code
+# objects compare equal when their bytecode, names and constants do, so
+# identical code compiled again (e.g. a re-run cell) shares an entry.
+_loads_without_stores_cache: weakref.WeakKeyDictionary[
+    types.CodeType, FrozenSet[str]] = weakref.WeakKeyDictionary()
+
+
+# Opcode constants for `_scan_loads_without_stores`.
+_EXTENDED_ARG = opcode.EXTENDED_ARG
+_LOAD_ATTR    = opcode.opmap['LOAD_ATTR']
+# LOAD_METHOD is _supposed_ to be removed in 3.12 but still present in opmap
+# it was actually removed in 3.14
+if sys.version_info < (3, 12):
+    _LOAD_METHOD: Optional[int] = opcode.opmap["LOAD_METHOD"]
+else:
+    # Just delete any ref to LOAD_METHOD once we drop <3.12
+    _LOAD_METHOD = None
+_LOAD_GLOBAL  = opcode.opmap["LOAD_GLOBAL"]
+_LOAD_NAME    = opcode.opmap["LOAD_NAME"]
+_STORE_ATTR   = opcode.opmap["STORE_ATTR"]
+_STORE_GLOBAL = opcode.opmap["STORE_GLOBAL"]
+_STORE_NAME   = opcode.opmap["STORE_NAME"]
+if sys.version_info > (3, 11):
+    _CACHE: Optional[int] = opcode.opmap["CACHE"]
+else:
+    _CACHE = None
+_LOAD_ATTR_OPS = frozenset({_LOAD_ATTR, _LOAD_METHOD})
+_STORE_NAME_OPS = frozenset({_STORE_GLOBAL, _STORE_NAME})
+
+
+def _scan_loads_without_stores(
+    co: types.CodeType, loads_without_stores: Set[str]
+) -> None:
+    """
+    Find global LOADs without corresponding STOREs in the bytecode of ``co``
+    itself (not of the code objects nested in it).  Helper for
+    `_find_loads_without_stores_in_code`.
+    """
     # Keep track of the partial name so far that started with a LOAD_GLOBAL.
     # If ``pending`` is not None, then it is a list representing the name
     # components we've seen so far.
@@ -1718,7 +1779,8 @@ def _find_loads_without_stores_in_code(
     #         f: STORE_DEREF, LOAD_CLOSURE, MAKE_CLOSURE
     #         g = f(): LOAD_DEREF
     bytecode = co.co_code
-    n = len(bytecode)
+    names = co.co_names
+    has_arg = _HAS_ARG
     i = 0
     extended_arg = 0
     stores = set()
@@ -1726,29 +1788,28 @@ def _find_loads_without_stores_in_code(
     loads_before_label_without_stores = set()
     # Find the earliest target of a backward jump.
     earliest_backjump_label = _find_earliest_backjump_label(bytecode)
-    # Loop through bytecode.
-    while i < n:
-        op = bytecode[i]
-        i += 1
-        if op == CACHE:
+    # Loop through bytecode.  Each instruction is an (opcode, argument) pair
+    # of bytes; ``i`` is the offset of the next instruction.
+    for op, arg in zip(bytecode[0::2], bytecode[1::2]):
+        i += 2
+        if op == _CACHE:
             continue
-        if take_arg(op):
-            oparg = bytecode[i] | extended_arg
+        if op in has_arg:
+            oparg = arg | extended_arg
             extended_arg = 0
-            if op == EXTENDED_ARG:
+            if op == _EXTENDED_ARG:
                 extended_arg = (oparg << 8)
                 continue
-            i += 1
 
         if pending is not None:
-            if op == STORE_ATTR:
+            if op == _STORE_ATTR:
                 # {LOAD_GLOBAL|LOAD_NAME} {LOAD_ATTR}* {STORE_ATTR}
-                pending.append(co.co_names[oparg])
+                pending.append(names[oparg])
                 fullname = ".".join(pending)
                 pending = None
                 stores.add(fullname)
                 continue
-            if op in {LOAD_ATTR, LOAD_METHOD}:
+            if op in _LOAD_ATTR_OPS:
                 if sys.version_info >= (3,12):
                     # from the docs:
                     #
@@ -1778,11 +1839,11 @@ def _find_loads_without_stores_in_code(
                     #
                     # In any case this seem to match what load_method was doing
                     # before.
-                    pending.append(co.co_names[oparg>>1])
+                    pending.append(names[oparg>>1])
                 else:
                     # {LOAD_GLOBAL|LOAD_NAME} {LOAD_ATTR}* so far;
                     # possibly more LOAD_ATTR/STORE_ATTR will follow
-                    pending.append(co.co_names[oparg])
+                    pending.append(names[oparg])
                 continue
             # {LOAD_GLOBAL|LOAD_NAME} {LOAD_ATTR}* (and no more
             # LOAD_ATTR/STORE_ATTR)
@@ -1794,18 +1855,18 @@ def _find_loads_without_stores_in_code(
                 loads_before_label_without_stores.add(fullname)
             # Fall through.
 
-        if op is LOAD_GLOBAL:
+        if op == _LOAD_GLOBAL:
             # Starting with 3.11, the low bit is used to tell whether to
             # push an extra null on the stack, so we need to >> 1
             # >> 0 does nothing
-            pending = [co.co_names[oparg >> LOAD_SHIFT]]
+            pending = [names[oparg >> LOAD_SHIFT]]
             continue
-        if op is LOAD_NAME:
-            pending = [co.co_names[oparg]]
+        if op == _LOAD_NAME:
+            pending = [names[oparg]]
             continue
 
-        if op in [STORE_GLOBAL, STORE_NAME]:
-            stores.add(co.co_names[oparg])
+        if op in _STORE_NAME_OPS:
+            stores.add(names[oparg])
             continue
 
         # We don't need to worry about: LOAD_FAST, STORE_FAST, LOAD_CLOSURE,
@@ -1864,19 +1925,14 @@ def _find_loads_without_stores_in_code(
     # end in a LOAD_ATTR.
     assert pending is None
 
-    # Recurse on inner function definitions, lambdas, generators, etc.
-    for arg in co.co_consts:
-        if isinstance(arg, types.CodeType):
-            _find_loads_without_stores_in_code(arg, loads_without_stores)
-
 if sys.version_info >= (3,12):
     from dis import hasarg
-    def take_arg(op: int) -> bool:
-        return op in hasarg
+    _HAS_ARG = frozenset(hasarg)
 else:
-    def take_arg(op: int) -> bool:
-        from opcode import HAVE_ARGUMENT
-        return op >= HAVE_ARGUMENT
+    _HAS_ARG = frozenset(range(opcode.HAVE_ARGUMENT, 256))
+
+def take_arg(op: int) -> bool:
+    return op in _HAS_ARG
 
 def _find_earliest_backjump_label(bytecode: bytes) -> int:
     """
@@ -1918,16 +1974,18 @@ def _find_earliest_backjump_label(bytecode: bytes) -> int:
       The earliest target of a backward jump, as an offset into the bytecode.
     """
     # Code based on dis.findlabels().
-    from opcode import hasjrel, hasjabs
     if not isinstance(bytecode, bytes):
         raise TypeError
+    hasjrel = _HASJREL
+    hasjabs = _HASJABS
+    has_arg = _HAS_ARG
     n = len(bytecode)
     earliest_backjump_label = n
     i = 0
     while i < n:
         op = bytecode[i]
         i += 1
-        if not take_arg(op):
+        if op not in has_arg:
             continue
         if i+1 >= len(bytecode):
             break
@@ -1949,6 +2007,10 @@ def _find_earliest_backjump_label(bytecode: bytes) -> int:
     return earliest_backjump_label
 
 
+_HASJREL = frozenset(opcode.hasjrel)
+_HASJABS = frozenset(opcode.hasjabs)
+
+
 def find_missing_imports(
     arg: Any,
     namespaces: Union[ScopeStack, Dict[str, Any], List[Dict[str, Any]]],
@@ -2098,6 +2160,44 @@ def find_missing_imports(
             % (type(arg).__name__,))
 
 
+def _find_missing_imports_by_scope(
+    arg: Any,
+    namespaces: ScopeStack,
+    exec_star_imports: bool = False,
+) -> Tuple[List[DottedIdentifier], List[DottedIdentifier]]:
+    """
+    Find symbols in ``arg`` that require import, like `find_missing_imports`,
+    and which of them are only referenced inside function bodies and lambdas.
+
+      >>> missing, in_functions_only = _find_missing_imports_by_scope(
+      ...     "def f(): return numpy.pi + os.sep\\nos.getcwd()", ScopeStack([{}]))
+      >>> [str(m) for m in missing]
+      ['numpy.pi', 'os.getcwd', 'os.sep']
+      >>> [str(m) for m in in_functions_only]
+      ['numpy.pi']
+
+    Compiled code has no function bodies to tell apart, so for code objects
+    and callables nothing is reported as function-only.
+    """
+    if isinstance(arg, (DottedIdentifier, str)):
+        try:
+            DottedIdentifier(arg)
+        except BadDottedIdentifierError:
+            arg = ast.parse(str(arg), type_comments=True) # may raise SyntaxError
+    elif isinstance(arg, PythonBlock):
+        arg = arg.ast_node
+    if not isinstance(arg, ast.AST):
+        return find_missing_imports(arg, namespaces), []
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("ast=%s", ast.dump(arg))
+    return _MissingImportFinder(
+        namespaces,
+        find_unused_imports=False,
+        parse_docstrings=False,
+        exec_star_imports=exec_star_imports,
+    ).find_missing_imports_by_scope(arg)
+
+
 def get_known_import(
     fullname: Union[str, DottedIdentifier], db: Any = None
 ) -> Optional[Tuple[Import, ...]]:
@@ -2111,6 +2211,10 @@ def get_known_import(
 
     Then we return "import foo.bar".
 
+    If nothing is known and the first component isn't itself an importable
+    module, fall back to the reverse symbol index, if one is configured (see
+    `SymbolIndex.get_default`).
+
     :type fullname:
       `DottedIdentifier`
     :param fullname:
@@ -2131,6 +2235,15 @@ def get_known_import(
         except KeyError:
             logger.debug("get_known_import(%r): no known import for %r", fullname, partial_name)
             pass
+    index = SymbolIndex.get_default()
+    if index is not None:
+        name0 = fullname.parts[0]
+        if not ModuleHandle(name0).exists:
+            imp = index.find_import(name0, exclude=db.forget_imports)
+            if imp is not None:
+                logger.debug("get_known_import(%r): found %r in symbol index",
+                             fullname, imp)
+                return (imp,)
     logger.debug("get_known_import(%r): found nothing", fullname)
     return None
 
@@ -2221,12 +2334,131 @@ def _try_import(imp: Union[Import, str],
     return True
 
 
+def _lazy_module_specs(
+    fullname: Union[str, DottedIdentifier]
+) -> Optional[List[importlib.machinery.ModuleSpec]]:
+    """
+    Find the specs of the longest prefix of ``fullname`` that names a module,
+    and of its parent packages, without executing any of them.
+
+    Return ``None`` if the first component isn't a module, if any of the
+    modules is already imported, or if any of them isn't plain Python source
+    (or bytecode), which is all `importlib.util.LazyLoader` is safe to use on.
+    """
+    parts = DottedIdentifier(fullname).parts
+    specs: List[importlib.machinery.ModuleSpec] = []
+    path = None
+    for i in range(len(parts)):
+        name = ".".join(parts[:i+1])
+        if name in sys.modules:
+            return None
+        spec = None
+        for finder in sys.meta_path:
+            find_spec = getattr(finder, "find_spec", None)
+            if find_spec is None:
+                continue
+            try:
+                spec = find_spec(name, path)
+            except Exception as e:
+                logger.debug("_lazy_module_specs(%r): %r.find_spec(%r): %s: %s",
+                             fullname, finder, name, type(e).__name__, e)
+                return None
+            if spec is not None:
+                break
+        if spec is None:
+            break
+        if not isinstance(spec.loader, (importlib.machinery.SourceFileLoader,
+                                        importlib.machinery.SourcelessFileLoader)):
+            return None
+        specs.append(spec)
+        path = spec.submodule_search_locations
+        if path is None:
+            break
+    return specs or None
+
+
+def _try_lazy_import(fullname: Union[str, DottedIdentifier],
+                     imports: Optional[Tuple[Import, ...]],
+                     namespace: Dict[str, Any],
+                     forget_imports: Any = ()) -> Optional[Import]:
+    """
+    Lazily import the module(s) that ``fullname`` needs into ``namespace``.
+
+    Each module is created with `importlib.util.LazyLoader` and entered in
+    ``sys.modules``, but its code only runs the first time one of its
+    attributes is accessed.  Submodules are bound as attributes of their
+    (still unloaded) parent packages, so ``scipy.stats.norm`` works once
+    "import scipy.stats" has been lazily imported.
+
+    Only plain "import foo.bar" and "import foo as bar" imports of modules
+    that haven't been imported yet are done lazily.
+
+    :param imports:
+      The result of `get_known_import` for ``fullname``.
+    :param forget_imports:
+      Imports not to do; if any module we'd import is among them, we leave
+      it to the eager import to refuse.
+    :return:
+      The `Import` that was lazily done, or ``None`` if this can't be done
+      lazily, in which case nothing was changed.
+    """
+    fullname = DottedIdentifier(fullname)
+    if imports is None:
+        modulename = fullname.parts[0]
+        import_as = modulename
+    elif len(imports) == 1 and imports[0].split.module_name is None:
+        modulename = imports[0].fullname
+        import_as = imports[0].import_as
+    else:
+        return None
+    if import_as.split(".", 1)[0] in namespace:
+        return None
+    if import_as == modulename:
+        # Go as deep as the name goes, like the eager import would.
+        specs = _lazy_module_specs(fullname)
+    else:
+        specs = _lazy_module_specs(modulename)
+    num_parts = len(DottedIdentifier(modulename).parts)
+    if not specs or len(specs) < num_parts:
+        return None
+    if any(Import.from_parts(spec.name, spec.name) in forget_imports
+           for spec in specs):
+        return None
+    if import_as == modulename:
+        imp = Import("import %s" % (specs[-1].name,))
+    else:
+        imp = Import("import %s as %s" % (modulename, import_as))
+    if imp in _IMPORT_FAILED:
+        return None
+    logger.info("%s (lazy)", imp)
+    modules: List[types.ModuleType] = []
+    for spec in specs:
+        assert spec.loader is not None
+        loader = importlib.util.LazyLoader(spec.loader)
+        spec.loader = loader
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = module
+        loader.exec_module(module)
+        if modules:
+            # Bind the submodule in its parent the way the import system
+            # would.  This doesn't trigger loading the parent.
+            setattr(modules[-1], spec.name.rpartition(".")[2], module)
+        modules.append(module)
+    if import_as == modulename:
+        namespace[import_as.split(".", 1)[0]] = modules[0]
+    else:
+        namespace[import_as] = modules[-1]
+    return imp
+
+
 def auto_import_symbol(
     fullname: Union[str, DottedIdentifier],
     namespaces: Union[ScopeStack, Dict[str, Any], List[Dict[str, Any]]],
     db: Any = None,
     autoimported: Optional[Dict[DottedIdentifier, Optional[bool]]] = None,
     post_import_hook: Optional[Callable[[Import], Any]] = None,
+    *,
+    lazy: bool = False,
 ) -> Optional[bool]:
     """
     Try to auto-import a single name.
@@ -2256,6 +2488,9 @@ def auto_import_symbol(
       It is invoked with the `Import` object representing the successful import
     :type post_import_hook:
       ``callable``
+    :param lazy:
+      Whether to import modules lazily where possible, so that they're only
+      really imported when first used.  See `_try_lazy_import`.
     :return:
       ``True`` if the symbol was already in the namespace, or the auto-import
       succeeded; ``False`` if the auto-import failed, or ``None``
@@ -2282,6 +2517,14 @@ def auto_import_symbol(
     successful_import = None
     logger.debug("auto_import_symbol(%r): get_known_import() => %r",
                  fullname, imports)
+    if lazy:
+        imp = _try_lazy_import(fullname, imports, namespaces[-1],
+                               forget_imports=set(db.forget_imports.imports))
+        if imp is not None:
+            autoimported[DottedIdentifier(fullname)] = True
+            if post_import_hook:
+                post_import_hook(imp)
+            return True
     if imports is None:
         # No known imports.
         pass
@@ -2374,6 +2617,7 @@ def auto_import(
     *,
     extra_db: Any = None,
     exec_star_imports: bool = False,
+    lazy: bool = False,
 ) -> Optional[bool]:
     """
     Parse ``arg`` for symbols that need to be imported and automatically import
@@ -2413,6 +2657,11 @@ def auto_import(
       to find out which names it supplies.  Without this, a star import makes
       us give up on auto-importing anything else in ``arg``.  See
       `find_missing_imports`.
+    :param lazy:
+      Whether to import the modules needed by names that ``arg`` only uses
+      inside function bodies and lambdas lazily, i.e. to install modules
+      whose code only runs when one of their attributes is first accessed.
+      Names used at the top level are always imported right away.
     :return:
       ``True`` if all symbols are already in the namespace or successfully
       auto-imported; ``False`` if any auto-imports failed, or ``None`` (also
@@ -2425,9 +2674,15 @@ def auto_import(
     else:
         filename = "."
     try:
-        fullnames = find_missing_imports(
-            arg, namespaces, exec_star_imports=exec_star_imports
-        )
+        if lazy:
+            fullnames, lazy_fullnames = _find_missing_imports_by_scope(
+                arg, namespaces, exec_star_imports=exec_star_imports
+            )
+        else:
+            fullnames = find_missing_imports(
+                arg, namespaces, exec_star_imports=exec_star_imports
+            )
+            lazy_fullnames = []
     except SyntaxError:
         logger.debug("syntax error parsing %r", arg)
         return False
@@ -2440,7 +2695,8 @@ def auto_import(
     if extra_db:
         db = db|extra_db
     results = [auto_import_symbol(fullname, namespaces, db, autoimported,
-                                  post_import_hook=post_import_hook)
+                                  post_import_hook=post_import_hook,
+                                  lazy=fullname in lazy_fullnames)
                for fullname in fullnames]
     if any(r is None for r in results):
         # An import that raised is more actionable than "not importable".
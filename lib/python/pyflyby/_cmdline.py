@@ -24,11 +24,6 @@ from   pyflyby._importstmt      import ImportFormatParams
 from   pyflyby._log             import logger
 from   pyflyby._util            import cached_attribute, indent
 
-if sys.version_info < (3, 11):
-    from tomli import loads
-else:
-    from tomllib import loads
-
 
 # An "action" callable applied to a `Modifier` (see ``process_actions``).
 _Action = Callable[["Modifier"], Any]
@@ -690,5 +685,9 @@ def _get_pyproj_toml_config() -> Optional[Dict[str, Any]]:
     """
     pyproject_toml = _get_pyproj_toml_file()
     if pyproject_toml is not None:
+        if sys.version_info < (3, 11):
+            from tomli import loads
+        else:
+            from tomllib import loads
         return loads(pyproject_toml.read_text())
     return None
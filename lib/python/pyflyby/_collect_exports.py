@@ -1,11 +1,22 @@
 """
 collect-exports module1 module2...
+collect-exports --all [--jobs N]
 
 Collect all exports in the specified modules and generate "from foo import
 ..." lines for public members defined in those modules.
 
 Print the result to stdout.
 
+Results are kept in the on-disk exports index, which is also used by
+replace-star-imports.  With --all, every importable module (including
+submodules of packages) is scanned across a pool of worker processes; this can
+be used to fill the index ahead of time.
+
+With --symbol-index=FILE, also write a reverse index from symbol name to the
+modules exporting it.  Point $PYFLYBY_SYMBOL_INDEX at FILE to let find-import,
+tidy-imports and auto-import use it for names that aren't in the known-imports
+database.
+
 """
 
 # pyflyby/_collect_exports.py
@@ -14,12 +25,91 @@ Print the result to stdout.
 
 
 
+from   concurrent.futures       import ProcessPoolExecutor
+import os
 import sys
 
 from   pyflyby._cmdline         import hfmt, parse_args
+from   pyflyby._file            import Filename
 from   pyflyby._importdb        import ImportDB
 from   pyflyby._log             import logger
-from   pyflyby._modules         import ModuleHandle
+from   pyflyby._modules         import ModuleHandle, _walk_modules
+from   pyflyby._symbolindex     import SymbolIndex
+
+
+def _init_worker():
+    # Modules may print when their parent package is imported (which
+    # computing exports can do); keep that out of our output.
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+    sys.stdout = open(os.devnull, 'w')
+
+
+def _module_handle(module_name, filename):
+    """
+    Return a `ModuleHandle`, using an already known ``filename`` if given.
+
+    Locating the file of a submodule imports its parent package; seeding the
+    handle with a filename found by `_walk_modules` avoids that when the
+    exports are already in the exports index.
+    """
+    module = ModuleHandle(module_name)
+    if filename and 'filename' not in module.__dict__:
+        try:
+            module.filename = Filename(filename)
+        except ValueError:
+            pass
+    return module
+
+
+def _static_export_names(module_name, filename=None):
+    """
+    Compute the exports of ``module_name`` in a worker process.
+
+    `ImportSet` isn't picklable, so return the member names.
+
+    :return:
+      ``(module_name, names, error)``, where ``names`` is a list of member
+      names (or ``None`` on error) and ``error`` a description of the error.
+    """
+    try:
+        exports = _module_handle(module_name, filename).exports
+    except Exception as e:
+        return module_name, None, "%s: %s" % (type(e).__name__, e)
+    if not exports:
+        return module_name, [], None
+    return module_name, [imp.split.member_name
+                         for imp in exports.imports], None
+
+
+def _iter_exports(module_names, filenames, jobs):
+    """
+    Yield ``(module_name, exports, error)`` for each module, in order.
+
+    :param filenames:
+      Mapping from module name to its file, for modules whose file is already
+      known.
+    """
+    if jobs <= 1 or len(module_names) <= 1:
+        for module_name in module_names:
+            module = _module_handle(module_name, filenames.get(module_name))
+            try:
+                yield module_name, module.exports, None
+            except Exception as e:
+                yield module_name, None, "%s: %s" % (type(e).__name__, e)
+        return
+    with ProcessPoolExecutor(max_workers=jobs,
+                             initializer=_init_worker) as executor:
+        chunksize = max(1, min(64, len(module_names) // (jobs * 4)))
+        results = executor.map(
+            _static_export_names, module_names,
+            [filenames.get(m) for m in module_names], chunksize=chunksize)
+        for module_name, names, error in results:
+            exports = None
+            if names:
+                exports = ModuleHandle(module_name)._exports_from_names(names)
+            yield module_name, exports, error
 
 
 def main():
@@ -50,29 +140,66 @@ def main():
                           help=hfmt('''
                                 (Default) Scan only modules listed explicitly
                                 on the command line.'''))
+        parser.add_option("--all", dest="all_modules", default=False,
+                          action='store_true',
+                          help=hfmt('''
+                                Scan all importable modules, including
+                                submodules of packages.  Modules whose exports
+                                can't be determined are skipped silently.'''))
+        parser.add_option("--jobs", "-j", type="int", default=None,
+                          metavar="N",
+                          help=hfmt('''
+                                Number of worker processes.  (Default: the
+                                number of CPUs with --all, otherwise 1.)'''))
+        parser.add_option("--symbol-index", default=None, metavar="FILE",
+                          help=hfmt('''
+                                Also write a reverse symbol index of the
+                                scanned modules to FILE.'''))
     options, args = parse_args(addopts)
+    jobs = options.jobs
+    if jobs is None:
+        jobs = (os.cpu_count() or 1) if options.all_modules else 1
+    explicit = set(args)
+    filenames = {}
     if options.expand_known:
         db = ImportDB.get_default(".")
         known = db.known_imports.imports
         args += sorted(set(
                 [_f for _f in [i.split.module_name for i in known] if _f]))
+    if options.all_modules:
+        seen = set(args)
+        for module_name, filename in _walk_modules():
+            if module_name not in seen:
+                args.append(module_name)
+                filenames[module_name] = filename
     bad_module_names = []
-    for module_name in args:
-        module = ModuleHandle(module_name)
-        try:
-            imports = module.exports
-        except Exception as e:
-            logger.warning("couldn't get exports for %s; ignoring: %s: %s",
-                           module, type(e).__name__, e)
+    index_entries = []
+    for module_name, imports, error in _iter_exports(args, filenames, jobs):
+        if error is not None:
+            if options.all_modules and module_name not in explicit:
+                logger.debug("couldn't get exports for %s; ignoring: %s",
+                             module_name, error)
+                continue
+            logger.warning("couldn't get exports for %s; ignoring: %s",
+                           module_name, error)
             bad_module_names.append(module_name)
             continue
         if not imports:
             continue
+        if options.symbol_index:
+            index_entries.append(
+                (module_name, [imp.split.member_name
+                               for imp in imports.imports]))
         if options.ignore_known:
-            db = ImportDB.get_default(module.__file__)
-            imports = imports.without_imports(db)
+            filename = ModuleHandle(module_name).filename
+            db = ImportDB.get_default(filename or ".")
+            imports = imports.without_imports(db.known_imports)
         sys.stdout.write(imports.pretty_print(
                 allow_conflicts=True, params=options.params))
+    if options.symbol_index:
+        count = SymbolIndex.build(options.symbol_index, index_entries)
+        logger.info("Wrote %d symbols from %d modules to %s",
+                    count, len(index_entries), options.symbol_index)
     if bad_module_names:
         print("collect-exports: there were problems with: %s" % (
             ' '.join(bad_module_names)), file=sys.stderr)
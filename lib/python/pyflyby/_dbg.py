@@ -5,6 +5,7 @@
 
 import builtins
 from   contextlib               import contextmanager
+from   dataclasses              import dataclass
 import errno
 from   functools                import wraps
 import os
@@ -12,7 +13,9 @@ import pwd
 import signal
 import sys
 import time
+import traceback
 from   types                    import CodeType, FrameType, TracebackType
+from   typing                   import Optional
 
 from   collections.abc          import Callable
 
@@ -1262,19 +1265,20 @@ def attach_debugger(pid):
         pass
 
 
-def remote_print_stack(pid, output=1):
+def remote_print_stack(pid, output=1, all_threads=False):
     """
     Tell a target process to print a stack trace.
 
-    This currently only handles the main thread.
-    TODO: handle multiple threads.
-
     :param pid:
       PID of target process.
     :type output:
       ``int``, ``file``, or ``str``
     :param output:
       Output file descriptor.
+    :param all_threads:
+      If ``True``, print the stacks of all threads, each headed by its id and
+      name.  Otherwise print only the stack of the thread that the debugger
+      interrupted, normally the main thread.
     """
     # Interpret ``output`` argument as a file-like object, file descriptor, or
     # filename.
@@ -1332,7 +1336,10 @@ def remote_print_stack(pid, output=1):
             "/proc/%d/fd/%d" % (os.getpid(), temp_file.fileno()))
         assert remote_fn.iswritable
     # *** Do the code injection ***
-    _remote_print_stack_to_file(pid, remote_fn)
+    if all_threads:
+        _remote_print_all_stacks_to_file(pid, remote_fn)
+    else:
+        _remote_print_stack_to_file(pid, remote_fn)
     # Copy from temp file to the requested output.
     if temp_file is not None:
         data = temp_file.read()
@@ -1354,6 +1361,112 @@ def _remote_print_stack_to_file(pid, filename):
         ], wait=True)
 
 
+# Executed (in a fresh namespace) in a target process by `inject`, to write
+# the stacks of all its threads to ``{filename}``, as text or as JSON
+# ``[[thread_id, name, [[filename, lineno, function, line], ...]], ...]``.
+_CAPTURE_STACKS_CODE = """
+import json, sys, threading, traceback
+names = {{t.ident: t.name for t in threading.enumerate()}}
+frames = sys._current_frames()
+# The interrupted thread is running this code, called from the statement
+# that gdb ran; show what it was doing before that instead.
+try:
+    frames[threading.get_ident()] = sys._getframe(2)
+except ValueError:
+    frames[threading.get_ident()] = None
+stacks = [(tid, names.get(tid),
+           traceback.extract_stack(frame) if frame is not None
+           else traceback.StackSummary())
+          for tid, frame in sorted(frames.items())]
+with open({filename!r}, 'w') as f:
+    if {as_json!r}:
+        json.dump([[tid, name, [[fs.filename, fs.lineno, fs.name, fs.line]
+                                for fs in stack]]
+                   for tid, name, stack in stacks], f)
+    else:
+        for tid, name, stack in stacks:
+            f.write('Thread %s (%s):\\n' % (tid, name))
+            f.write(''.join(stack.format()))
+            f.write('\\n')
+"""
+
+
+def _inject_capture_stacks(pid, filename, as_json):
+    code = _CAPTURE_STACKS_CODE.format(filename=str(filename), as_json=as_json)
+    inject(pid, ["exec(%r, {})" % (code,)], wait=True)
+
+
+def _remote_print_all_stacks_to_file(pid, filename):
+    _inject_capture_stacks(pid, filename, as_json=False)
+
+
+@dataclass(frozen=True)
+class ThreadStack:
+    """
+    The stack of one thread of another process, as captured by
+    `remote_stacks`.
+    """
+
+    thread_id: int
+    name: Optional[str]
+    """
+    Name of the ``threading.Thread``, or ``None`` for threads not started via
+    ``threading``.
+    """
+    stack: traceback.StackSummary
+    """
+    Innermost frame last, as from ``traceback.extract_stack``.
+    """
+
+
+def remote_stacks(pids, max_workers=8):
+    """
+    Capture the stacks of all threads of several python processes.
+
+    Each process is attached to once with the debugger, which captures all
+    of its threads at once; up to ``max_workers`` processes are attached to
+    at a time.  Calling this repeatedly makes a simple sampling profiler for a
+    set of worker processes.
+
+    :type pids:
+      iterable of ``int``
+    :param pids:
+      PIDs of target processes.
+    :param max_workers:
+      Maximum number of processes to attach to concurrently.
+    :rtype:
+      ``dict``
+    :return:
+      ``{pid: [ThreadStack, ...]}``, with threads in order of thread id.  If
+      capturing a process's stacks failed (e.g. it exited or we may not attach
+      to it), its value is the exception instead.
+    """
+    import json
+    from   concurrent.futures       import ThreadPoolExecutor
+    from   tempfile                 import TemporaryDirectory
+    pids = list(dict.fromkeys(pids))
+    def capture(pid):
+        filename = os.path.join(tmpdir, "%d.json" % (pid,))
+        try:
+            _inject_capture_stacks(pid, filename, as_json=True)
+            try:
+                with open(filename) as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                raise Exception(
+                    "Process %s didn't write its stacks (see its stderr)"
+                    % (pid,)) from None
+        except Exception as e:
+            return e
+        return [
+            ThreadStack(tid, name, traceback.StackSummary.from_list(
+                [tuple(frame) for frame in frames]))
+            for tid, name, frames in data]
+    with TemporaryDirectory(prefix="pyflyby_stacks_") as tmpdir:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return dict(zip(pids, executor.map(capture, pids)))
+
+
 
 # Deprecated wrapper for wait_for_debugger_to_attach().
 def waitpoint(frame=None, mailto=None, background=False, timeout=86400):
@@ -2,6 +2,10 @@
 Usage: find-import names...
 
 Prints how to import given name(s).
+
+Names not in the known-imports database are looked up in the reverse symbol
+index named by $PYFLYBY_SYMBOL_INDEX, if any (see collect-exports --all
+--symbol-index).
 """
 # pyflyby/_find_import.py
 # Copyright (C) 2011, 2014 Karl Chen.
@@ -11,6 +15,7 @@ Prints how to import given name(s).
 from   pyflyby._cmdline         import parse_args, syntax
 from   pyflyby._importdb        import ImportDB
 from   pyflyby._log             import logger
+from   pyflyby._symbolindex     import SymbolIndex
 
 
 def main():
@@ -27,13 +32,19 @@ def main():
         syntax()
     db = ImportDB.get_default(".")
     known = db.known_imports.by_import_as
+    index = SymbolIndex.get_default()
     errors = 0
     for arg in args:
         try:
             imports = known[arg]
         except KeyError:
-            errors += 1
-            logger.error("Can't find import for %r", arg)
+            imp = index.find_import(arg, exclude=db.forget_imports) \
+                if index else None
+            if imp is None:
+                errors += 1
+                logger.error("Can't find import for %r", arg)
+            else:
+                print(imp.pretty_print(params=options.params), end=' ')
         else:
             for imp in imports:
                 print(imp.pretty_print(params=options.params), end=' ')
@@ -4,6 +4,8 @@
 
 from __future__ import annotations, print_function
 
+import heapq
+import re
 import sys
 
 from   collections              import defaultdict
@@ -20,8 +22,8 @@ from   pyflyby._util            import (cached_attribute, cmp, partition,
                                         stable_unique)
 
 from   typing                   import (Any, ClassVar, Dict, FrozenSet,
-                                        Iterable, Iterator, Optional, Sequence,
-                                        Tuple, Union)
+                                        Iterable, Iterator, List, Optional,
+                                        Sequence, Set, Tuple, Union)
 
 if sys.version_info < (3, 12):
     from typing_extensions          import Self
@@ -29,6 +31,10 @@ else:
     from typing import Self
 
 
+_WORD_RE = re.compile(r"\w+")
+_DOTTED_WORDS_RE = re.compile(r"\w+(?:\.\w+)*")
+
+
 class NoSuchImportError(ValueError):
     pass
 
@@ -543,6 +549,121 @@ class ImportSet:
 ImportSet._EMPTY = ImportSet._from_imports([])
 
 
+class PrefixMatcher:
+    r"""
+    Applies a map of dotted-name prefixes to their replacements, as used by
+    `transform_imports`, without looping over the whole map.
+
+    The transformations behave as if applied one after another in the map's
+    order, each to the result of the previous ones.  Only the entries that can
+    match are looked at: the entries whose key is a component-wise prefix of a
+    name, or, for text, whose first component appears as a word in it.  The
+    cost therefore depends on the size of the input, not the size of the map.
+
+      >>> m = PrefixMatcher({"a.b": "x", "x": "y.z", "q": "r"})
+      >>> m.transform_import(Import("from a.b import c"))
+      Import('from y.z import c')
+      >>> m.longest_match(["a", "b", "c"])
+      (('a', 'b'), 'x')
+      >>> m.replace_words("a.b.c; qq; q")
+      'y.z.c; qq; r'
+
+    Build one with `ImportMap.prefix_matcher` to have it cached on the map.
+    """
+
+    def __init__(self, transformations: Any):
+        self._entries: List[Tuple[str, str]] = list(transformations.items())
+        # Position of each key, by its components.
+        self._index: Dict[Tuple[str, ...], int] = {}
+        # Positions of the keys by their first component, for `replace_words`.
+        self._by_first_word: Dict[str, List[int]] = defaultdict(list)
+        # Positions of keys that aren't plain dotted names, which
+        # `replace_words` always tries.
+        self._irregular: Set[int] = set()
+        self._regexes: Dict[int, re.Pattern] = {}
+        self._import_cache: Dict[Import, Import] = {}
+        for i, (k, _) in enumerate(self._entries):
+            components = tuple(k.split("."))
+            self._index.setdefault(components, i)
+            if _DOTTED_WORDS_RE.fullmatch(k):
+                self._by_first_word[components[0]].append(i)
+            else:
+                self._irregular.add(i)
+        self._max_len = max((len(kc) for kc in self._index), default=0)
+
+    def _matching_positions(self, components: Sequence[str]) -> Iterator[int]:
+        for n in range(min(len(components), self._max_len), 0, -1):
+            i = self._index.get(tuple(components[:n]))
+            if i is not None:
+                yield i
+
+    def transform_import(self, imp: Import) -> Import:
+        """
+        Return ``imp`` with the transformations applied, like
+        ``for k, v in transformations.items(): imp = imp.replace(k, v)``.
+
+        Memoized.
+        """
+        try:
+            return self._import_cache[imp]
+        except KeyError:
+            pass
+        result = imp
+        pos = -1
+        while True:
+            components = result.fullname.split(".")
+            later = [i for i in self._matching_positions(components)
+                     if i > pos]
+            if not later:
+                break
+            pos = min(later)
+            result = result.replace(*self._entries[pos])
+        self._import_cache[imp] = result
+        return result
+
+    def longest_match(
+        self, components: Sequence[str]
+    ) -> Optional[Tuple[Tuple[str, ...], str]]:
+        """
+        Return ``(key components, replacement)`` for the longest key that is a
+        component-wise prefix of ``components``, or ``None``.
+        """
+        for i in self._matching_positions(components):
+            k, v = self._entries[i]
+            return tuple(k.split(".")), v
+        return None
+
+    def replace_words(self, text: str) -> str:
+        """
+        Return ``text`` with each transformation applied in turn as a
+        word-boundary regex substitution, ``re.sub(r"\bk\b", v, text)``.
+        """
+        by_first_word = self._by_first_word
+        pending = [i for w in set(_WORD_RE.findall(text))
+                   for i in by_first_word.get(w, ())]
+        pending.extend(self._irregular)
+        heapq.heapify(pending)
+        seen = set(pending)
+        while pending:
+            i = heapq.heappop(pending)
+            k, v = self._entries[i]
+            regex = self._regexes.get(i)
+            if regex is None:
+                regex = re.compile(r"\b%s\b" % (re.escape(k),))
+                self._regexes[i] = regex
+            new_text = regex.sub(v, text)
+            if new_text == text:
+                continue
+            text = new_text
+            # The replacement may introduce words that later keys match.
+            for w in set(_WORD_RE.findall(text if i in self._irregular else v)):
+                for j in by_first_word.get(w, ()):
+                    if j > i and j not in seen:
+                        seen.add(j)
+                        heapq.heappush(pending, j)
+        return text
+
+
 @total_ordering
 class ImportMap(object):
     r"""
@@ -617,6 +738,15 @@ class ImportMap(object):
     def __len__(self) -> int:
         return len(self._data)
 
+    @cached_attribute
+    def prefix_matcher(self) -> PrefixMatcher:
+        """
+        A `PrefixMatcher` for this map.
+
+        Built once per map, since an ``ImportMap`` is immutable.
+        """
+        return PrefixMatcher(self)
+
     def without_imports(self, removals: Any) -> "ImportMap":
         """
         Return a copy of self without the given imports.
@@ -6,10 +6,13 @@ from __future__ import annotations, print_function
 
 
 
+import ast
 from   collections              import defaultdict
+from   keyword                  import iskeyword
 import logging
 import os
 import re
+import tokenize
 
 from   pathlib                  import Path
 
@@ -185,6 +188,364 @@ def _expand_tripledots(
     return result
 
 
+_IMPORT_DB_ASSIGNMENT_NAMES = frozenset([
+    "__mandatory_imports__",
+    "__canonical_imports__",
+    "__forget_imports__",
+])
+
+
+def _scan_import_tokens(
+    tokens: List[tokenize.TokenInfo],
+) -> Optional[Tuple[Optional[str], Tuple[Tuple[str, Optional[str]], ...]]]:
+    r"""
+    Interpret the tokens of a single ``import``/``from`` statement.
+
+      >>> import io
+      >>> def scan(code):
+      ...     toks = tokenize.generate_tokens(io.StringIO(code).readline)
+      ...     return _scan_import_tokens(
+      ...         [t for t in toks if t.type == tokenize.NAME or
+      ...          t.type == tokenize.OP])
+      >>> scan("import a.b as c, d")
+      (None, (('a.b', 'c'), ('d', None)))
+      >>> scan("from ..a import (b as c,\n d,)")
+      ('..a', (('b', 'c'), ('d', None)))
+      >>> scan("from a import b,") is None
+      True
+
+    :return:
+      ``(fromname, aliases)``, or ``None`` if the tokens are not a simple
+      import statement.
+    """
+    strings = [t.string for t in tokens]
+    n = len(strings)
+    i = 0
+
+    def ident(i: int) -> Optional[str]:
+        if (i < n and tokens[i].type == tokenize.NAME
+                and not iskeyword(strings[i])):
+            return strings[i]
+        return None
+
+    def dotted(i: int) -> Tuple[Optional[str], int]:
+        parts = []
+        while True:
+            name = ident(i)
+            if name is None:
+                return None, i
+            parts.append(name)
+            i += 1
+            if i < n and strings[i] == ".":
+                i += 1
+                continue
+            return ".".join(parts), i
+
+    def alias_list(i: int, end: int, names_parser: Any,
+                   allow_trailing_comma: bool) -> Optional[
+                       Tuple[Tuple[str, Optional[str]], ...]]:
+        aliases: List[Tuple[str, Optional[str]]] = []
+        while True:
+            name, i = names_parser(i)
+            if name is None:
+                return None
+            asname = None
+            if i < end and strings[i] == "as":
+                asname = ident(i + 1)
+                if asname is None:
+                    return None
+                i += 2
+            aliases.append((name, asname))
+            if i == end:
+                return tuple(aliases)
+            if strings[i] != ",":
+                return None
+            i += 1
+            if i == end and allow_trailing_comma:
+                return tuple(aliases)
+
+    if n == 0:
+        return None
+    if strings[0] == "import":
+        aliases = alias_list(1, n, dotted, False)
+        if aliases is None:
+            return None
+        return None, aliases
+    if strings[0] != "from":
+        return None
+    i = 1
+    dots = ""
+    while i < n and strings[i] in (".", "..."):
+        dots += strings[i]
+        i += 1
+    module = ""
+    if i < n and strings[i] != "import":
+        module, i = dotted(i)  # type: ignore[assignment]
+        if module is None:
+            return None
+    if not (dots or module) or i >= n or strings[i] != "import":
+        return None
+    i += 1
+    if i == n - 1 and strings[i] == "*":
+        return dots + module, (("*", None),)
+    if i < n and strings[i] == "(":
+        if strings[-1] != ")":
+            return None
+        aliases = alias_list(
+            i + 1, n - 1, lambda j: (ident(j), j + 1), True)
+    else:
+        aliases = alias_list(i, n, lambda j: (ident(j), j + 1), False)
+    if aliases is None:
+        return None
+    return dots + module, aliases
+
+
+# A complete import statement on a single line, e.g. ``from a.b import c as
+# d, e  # comment``.  This is what nearly every line of an import database
+# file looks like, and is cheap to recognize with a regex.  Anything else is
+# handed to the tokenizer.
+_SIMPLE_IMPORT_LINE_RE = re.compile(r"""
+    (?:import \s+ (?P<names> [\w.]+ (?:\s+as\s+\w+)?
+                             (?:\s*,\s* [\w.]+ (?:\s+as\s+\w+)?)* )
+      |from \s+ (?P<fromname> \.*[\w.]* ) \s+ import \s+
+           (?P<fromnames> \* | \w+ (?:\s+as\s+\w+)?
+                          (?:\s*,\s* \w+ (?:\s+as\s+\w+)?)* ))
+    \s* (?:\#.*)? $
+""", re.VERBOSE)
+
+
+def _is_dotted_name(name: str) -> bool:
+    return all(p.isidentifier() and not iskeyword(p) for p in name.split("."))
+
+
+def _scan_simple_import_line(
+    line: str,
+) -> Optional[Tuple[Optional[str], Tuple[Tuple[str, Optional[str]], ...]]]:
+    """
+    Interpret a single-line import statement using `_SIMPLE_IMPORT_LINE_RE`.
+
+      >>> _scan_simple_import_line("import a.b as c, d  # x")
+      (None, (('a.b', 'c'), ('d', None)))
+      >>> _scan_simple_import_line("from .. import b")
+      ('..', (('b', None),))
+      >>> _scan_simple_import_line("from a import (b)") is None
+      True
+
+    :return:
+      ``(fromname, aliases)``, or ``None`` if ``line`` is not a simple import
+      statement.
+    """
+    m = _SIMPLE_IMPORT_LINE_RE.match(line)
+    if not m:
+        return None
+    fromname = m.group("fromname")
+    if fromname is None:
+        names = m.group("names")
+    else:
+        module = fromname.lstrip(".")
+        if not module:
+            if not fromname:
+                return None
+        elif not _is_dotted_name(module):
+            return None
+        names = m.group("fromnames")
+        if names == "*":
+            return fromname, (("*", None),)
+    aliases: List[Tuple[str, Optional[str]]] = []
+    for piece in names.split(","):
+        parts = piece.split()
+        if not _is_dotted_name(parts[0]):
+            return None
+        if len(parts) == 1:
+            aliases.append((parts[0], None))
+        else:
+            if not _is_dotted_name(parts[2]) or "." in parts[2]:
+                return None
+            aliases.append((parts[0], parts[2]))
+    return fromname, tuple(aliases)
+
+
+def _tokenize_logical_line(
+    lines: List[str], start: int,
+) -> Optional[Tuple[List[tokenize.TokenInfo], int]]:
+    """
+    Tokenize the logical line starting at ``lines[start]``.
+
+    :return:
+      ``(tokens, end)``, where ``tokens`` are the significant tokens of the
+      logical line (with row numbers relative to ``start``), and ``end`` is
+      the index of the line following it; or ``None`` if the logical line
+      contains anything other than names, operators and literals.
+    """
+    pos = start
+
+    def readline() -> str:
+        nonlocal pos
+        if pos >= len(lines):
+            return ""
+        line = lines[pos]
+        pos += 1
+        return line + "\n" if pos < len(lines) else line
+
+    tokens: List[tokenize.TokenInfo] = []
+    end = len(lines)
+    try:
+        for tok in tokenize.generate_tokens(readline):
+            if tok.type in (tokenize.COMMENT, tokenize.NL):
+                continue
+            if tok.type in (tokenize.NEWLINE, tokenize.ENDMARKER):
+                if tok.type == tokenize.NEWLINE:
+                    end = start + tok.end[0]
+                break
+            if tok.type not in (tokenize.NAME, tokenize.OP,
+                                tokenize.STRING, tokenize.NUMBER):
+                # Indentation, f-strings, error tokens, etc.
+                return None
+            if tok.string == ";":
+                return None
+            tokens.append(tok)
+    except (tokenize.TokenError, SyntaxError):
+        return None
+    if not tokens:
+        return None
+    return tokens, end
+
+
+_PAREN_FROM_IMPORT_RE = re.compile(
+    r"(from\s+\S+\s+import)\s*[(]([^()]*?),?\s*[)]\s*$", re.DOTALL)
+
+_IMPORT_DB_ASSIGNMENT_RE = re.compile(r"(__[a-z]+_imports__)\s*=")
+
+
+def _scan_import_db_chunk(
+    chunk: List[str],
+) -> Optional[Union[Tuple[Optional[str], Tuple[Tuple[str, Optional[str]], ...]],
+                    Tuple[str, Any]]]:
+    """
+    Interpret a statement spanning the lines ``chunk``, without tokenizing it.
+
+    Handles the multiline forms that occur in import database files:
+    parenthesized and backslash-continued imports, and literal assignments.
+
+      >>> _scan_import_db_chunk(["from a import (b,  # x", "    c as d,", ")"])
+      ('a', (('b', None), ('c', 'd')))
+      >>> _scan_import_db_chunk(["__forget_imports__ = [", "  'a.b',", "]"])
+      ('__forget_imports__', ['a.b'])
+
+    :return:
+      ``(fromname, aliases)`` for an import, ``(name, literal_value)`` for an
+      assignment, or ``None`` if the statement needs the tokenizer.
+    """
+    first = chunk[0]
+    if first.startswith(("import", "from")):
+        code = " ".join(
+            l.split("#", 1)[0].rstrip().rstrip("\\") for l in chunk)
+        if "(" in code:
+            m = _PAREN_FROM_IMPORT_RE.match(code)
+            if not m or m.group(2).strip() == "*":
+                return None
+            code = "%s %s" % (m.group(1), m.group(2))
+        return _scan_simple_import_line(code)
+    m = _IMPORT_DB_ASSIGNMENT_RE.match(first)
+    if m and m.group(1) in _IMPORT_DB_ASSIGNMENT_NAMES:
+        try:
+            value = ast.literal_eval("\n".join(chunk)[m.end():].strip())
+        except (ValueError, TypeError, SyntaxError, MemoryError,
+                RecursionError):
+            return None
+        return m.group(1), value
+    return None
+
+
+def _scan_import_db_code(
+    text: str,
+) -> Optional[List[Union[ImportStatement, Tuple[str, Any]]]]:
+    r"""
+    Extract the import statements and ``__xxx_imports__`` literal assignments
+    from the code of an import database file, without parsing it into an AST.
+
+    Import database files consist almost entirely of import statements, so
+    scanning them line by line is much cheaper than compiling them.  Each
+    statement is recognized with regexes where possible and with the
+    tokenizer otherwise.  If the code contains anything else, return ``None``
+    and let the caller fall back to the full parser (which also produces the
+    error messages).
+
+      >>> _scan_import_db_code("import os  # c\n__forget_imports__ = ['x.y']\n")
+      [ImportStatement('import os # c'), ('__forget_imports__', ['x.y'])]
+      >>> _scan_import_db_code("def f(): pass\n") is None
+      True
+
+    :rtype:
+      ``list`` of `ImportStatement` s and ``(name, literal_value)`` tuples, or
+      ``None``
+    """
+    lines = text.split("\n")
+    nlines = len(lines)
+    result: List[Union[ImportStatement, Tuple[str, Any]]] = []
+    seen_non_future = False
+    i = 0
+    while i < nlines:
+        line = lines[i]
+        if not line or line.isspace() or line.lstrip().startswith("#"):
+            i += 1
+            continue
+        # Guess the extent of the statement: a statement starts at column 0,
+        # so it extends over the following indented, comment and blank lines
+        # and lines closing a bracket.
+        end = i + 1
+        while end < nlines and lines[end][:1] in ("", " ", "\t", "#",
+                                                 ")", "]", "}"):
+            end += 1
+        while end - 1 > i and (not lines[end-1].strip() or
+                               lines[end-1].lstrip().startswith("#")):
+            end -= 1
+        scanned: Optional[Tuple[Any, Any]] = _scan_import_db_chunk(
+            lines[i:end])
+        if scanned is None:
+            # Something unusual.  Let the tokenizer find the logical line.
+            tokenized = _tokenize_logical_line(lines, i)
+            if tokenized is None:
+                return None
+            tokens, end = tokenized
+            first, last = tokens[0], tokens[-1]
+            if first.string in ("import", "from"):
+                scanned = _scan_import_tokens(tokens)
+            elif (len(tokens) > 2 and tokens[1].string == "="
+                  and first.string in _IMPORT_DB_ASSIGNMENT_NAMES):
+                (srow, scol), (erow, ecol) = tokens[2].start, last.end
+                value_lines = lines[i+srow-1:i+erow]
+                value_lines[-1] = value_lines[-1][:ecol]
+                value_lines[0] = value_lines[0][scol:]
+                try:
+                    scanned = (first.string,
+                               ast.literal_eval("\n".join(value_lines)))
+                except (ValueError, TypeError, SyntaxError, MemoryError,
+                        RecursionError):
+                    return None
+            if scanned is None:
+                return None
+        if not line.startswith(("import", "from")):
+            name, value = scanned
+            assert isinstance(name, str)
+            result.append((name, value))
+            seen_non_future = True
+            i = end
+            continue
+        fromname, aliases = scanned
+        if fromname == "__future__":
+            if seen_non_future:
+                # Misplaced __future__ import; a SyntaxError.
+                return None
+        else:
+            seen_non_future = True
+        comments = [l.split("#", 1)[1] if "#" in l else None
+                    for l in lines[i:end]]
+        result.append(ImportStatement.from_parts(fromname, aliases, comments))
+        i = end
+    return result
+
+
 class ImportDB:
     """
     A database of known, mandatory, canonical imports.
@@ -424,6 +785,31 @@ class ImportDB:
         forget_imports: List[ImportSet]      = []
         blocks = [PythonBlock(b) for b in blocks]
         for block in blocks:
+            scanned = _scan_import_db_code(block.text.joined)
+            if scanned is not None:
+                try:
+                    parsed: List[Any] = [
+                        item if isinstance(item, ImportStatement) else
+                        (item[0], cls._parse_import_map(item[1])
+                         if item[0] == "__canonical_imports__"
+                         else cls._parse_import_set(item[1]))
+                        for item in scanned]
+                except ValueError:
+                    # Let the full parser below produce the error message.
+                    pass
+                else:
+                    for item in parsed:
+                        if isinstance(item, ImportStatement):
+                            known_imports.extend(item.imports)
+                        elif item[0] == "__mandatory_imports__":
+                            mandatory_imports.append(item[1])
+                        elif item[0] == "__canonical_imports__":
+                            canonical_imports.append(item[1])
+                        else:
+                            forget_imports.append(item[1])
+                    continue
+            # The code contains something other than imports and literal
+            # assignments; parse it fully.
             for statement in block.statements:
                 if statement.is_comment_or_blank:
                     continue
@@ -0,0 +1,282 @@
+# pyflyby/_importprobe.py.
+# License: MIT http://opensource.org/licenses/MIT
+
+"""
+Test whether imports work, without importing anything into this process.
+
+Each distinct import statement is executed once, in a fresh subprocess that
+uses this process's ``sys.path``, with a timeout.  Probes run in parallel.
+Results are remembered for the lifetime of the `ImportProber` (so identical
+imports in many files are only probed once) and in an on-disk cache under
+``<user cache dir>/pyflyby/import_probes/``.
+
+A cache entry is keyed by the import statement, ``sys.path`` and the python
+interpreter.  It also records the ``st_mtime_ns`` of every module file and
+package directory the probe loaded or tried to load, and is only used while
+those are unchanged, so editing a module (e.g. fixing one that raised while
+being imported) or adding a submodule to a package re-probes the imports that
+depend on it.  Entries for failed imports also record the
+``sys.path`` directories, so installing a missing module re-probes them.
+``$PYFLYBY_DISABLE_CACHE=1`` disables the on-disk cache.
+"""
+
+from __future__ import annotations
+
+from   concurrent.futures       import ThreadPoolExecutor
+import hashlib
+import json
+import os
+import pathlib
+import platformdirs
+import subprocess
+import sys
+from   typing                   import (Dict, Iterable, List, Optional, Set,
+                                        Tuple)
+
+from   pyflyby._importstmt      import Import
+from   pyflyby._log             import logger
+
+
+DEFAULT_TIMEOUT = 30.0
+"""
+Seconds to wait for a single import before giving up on it.
+"""
+
+
+# Executed in the probe subprocess.  Reads ``{"path", "statement"}`` from
+# stdin and writes ``{"error", "deps"}`` to the original stdout; anything the
+# imported modules print goes to /dev/null.
+_PROBE_SCRIPT = r'''
+import json, os, sys
+request = json.load(sys.stdin)
+out = os.fdopen(os.dup(1), "w")
+devnull = os.open(os.devnull, os.O_WRONLY)
+os.dup2(devnull, 1)
+sys.stdout = open(os.devnull, "w")
+sys.path[:] = request["path"]
+paths = []
+class Recorder:
+    # Record the file of every module we try to load, including those that
+    # fail while executing (which are then removed from sys.modules).
+    @staticmethod
+    def find_spec(name, path=None, target=None):
+        for finder in sys.meta_path:
+            find_spec = getattr(finder, "find_spec", None)
+            if finder is Recorder or find_spec is None:
+                continue
+            spec = find_spec(name, path, target)
+            if spec is not None:
+                paths.append(spec.origin)
+                paths.extend(spec.submodule_search_locations or ())
+                return spec
+        return None
+sys.meta_path.insert(0, Recorder)
+before = set(sys.modules)
+error = None
+try:
+    exec(request["statement"], {})
+except BaseException as e:
+    error = "%s: %s" % (type(e).__name__, e)
+deps = {}
+for name in set(sys.modules) - before:
+    module = sys.modules[name]
+    paths.append(getattr(module, "__file__", None))
+    paths.extend(getattr(module, "__path__", None) or ())
+if error is not None:
+    paths.extend(os.path.abspath(p) for p in sys.path)
+for p in paths:
+    if isinstance(p, str):
+        try:
+            deps[p] = os.stat(p).st_mtime_ns
+        except OSError:
+            pass
+json.dump({"error": error, "deps": deps}, out)
+out.flush()
+os._exit(0)
+'''
+
+
+def _mtime_ns(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _sys_path_fingerprint(path: List[str]) -> str:
+    """
+    Return a digest of ``path`` (with relative entries made absolute) and the
+    python interpreter.
+    """
+    key = json.dumps([sys.executable, sys.version,
+                      [os.path.abspath(p) for p in path]])
+    return hashlib.sha256(key.encode("utf-8", "surrogateescape")).hexdigest()
+
+
+class ImportProber:
+    """
+    Probe imports in worker subprocesses.
+
+      >>> prober = ImportProber(jobs=2, use_cache=False)
+      >>> results = prober.probe([Import("import os"),
+      ...                         Import("import omgdoesntexist_48129376")])
+      >>> results[Import("import os")] is None
+      True
+      >>> print(results[Import("import omgdoesntexist_48129376")])
+      ModuleNotFoundError: No module named 'omgdoesntexist_48129376'
+    """
+
+    def __init__(
+        self,
+        jobs: Optional[int] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        use_cache: bool = True,
+        path: Optional[List[str]] = None,
+    ):
+        """
+        :param jobs:
+          Number of probes to run at once.  Defaults to the number of CPUs.
+        :param timeout:
+          Seconds to wait for each import.
+        :param use_cache:
+          Whether to use the on-disk cache.
+        :param path:
+          ``sys.path`` for the probes.  Defaults to this process's.
+        """
+        self.jobs = jobs or os.cpu_count() or 1
+        self.timeout = timeout
+        self.use_cache = (
+            use_cache and os.environ.get("PYFLYBY_DISABLE_CACHE", "0") != "1")
+        self.path = list(sys.path if path is None else path)
+        self._fingerprint = _sys_path_fingerprint(self.path)
+        self._results: Dict[str, Optional[str]] = {}
+        self._timed_out: Set[str] = set()
+        self.num_probed = 0
+
+    def probe(self, imports: Iterable[Import]) -> Dict[Import, Optional[str]]:
+        """
+        Test each of ``imports``.
+
+        Imports that were already probed by this prober or that have a valid
+        on-disk cache entry aren't probed again.  The rest are probed in
+        parallel, each distinct statement once.
+
+        :return:
+          Mapping from each import to ``None`` if it works, or else a
+          description of the error.
+        """
+        imports = list(imports)
+        statements = {imp: imp.pretty_print().strip() for imp in imports}
+        todo = []
+        for statement in dict.fromkeys(statements.values()):
+            if statement in self._results:
+                continue
+            found, error = self._cache_lookup(statement)
+            if found:
+                self._results[statement] = error
+            else:
+                todo.append(statement)
+        if todo:
+            logger.debug("Probing %d import(s) in %d worker(s)",
+                         len(todo), min(self.jobs, len(todo)))
+            self.num_probed += len(todo)
+            results: List[Optional[str]]
+            if self.jobs <= 1 or len(todo) <= 1:
+                results = [self._probe_one(s) for s in todo]
+            else:
+                executor = ThreadPoolExecutor(max_workers=self.jobs)
+                with executor:
+                    results = list(executor.map(self._probe_one, todo))
+            for statement, error in zip(todo, results):
+                self._results[statement] = error
+        return {imp: self._results[statement]
+                for imp, statement in statements.items()}
+
+    def broken(self, imports: Iterable[Import]) -> Dict[Import, str]:
+        """
+        Return the imports among ``imports`` that fail, with their errors.
+
+        Imports that time out aren't considered broken (a slow import may
+        well work); they are logged and left out.
+        """
+        result = {}
+        for imp, error in self.probe(imports).items():
+            if error is None:
+                continue
+            if imp.pretty_print().strip() in self._timed_out:
+                logger.warning("Import %r %s; keeping it",
+                               imp.pretty_print().strip(), error)
+                continue
+            result[imp] = error
+        return result
+
+    def _probe_one(self, statement: str) -> Optional[str]:
+        request = json.dumps({"path": self.path, "statement": statement})
+        try:
+            proc = subprocess.run(
+                [sys.executable, "-c", _PROBE_SCRIPT],
+                input=request, stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL, text=True, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            self._timed_out.add(statement)
+            return "timed out after %s seconds" % (self.timeout,)
+        try:
+            result = json.loads(proc.stdout)
+            error = result["error"]
+            deps = result["deps"]
+        except (ValueError, KeyError, TypeError):
+            return "probe process exited with code %s" % (proc.returncode,)
+        self._cache_store(statement, error, deps)
+        return error
+
+    def _cache_file(self, statement: str) -> Optional[pathlib.Path]:
+        if not self.use_cache:
+            return None
+        key = "\0".join([statement, self._fingerprint])
+        digest = hashlib.sha256(
+            key.encode("utf-8", "surrogateescape")).hexdigest()
+        cache_dir = pathlib.Path(
+            platformdirs.user_cache_dir(appname='pyflyby', appauthor=False)
+        )
+        return cache_dir / "import_probes" / ("%s.json" % (digest,))
+
+    def _cache_lookup(self, statement: str) -> Tuple[bool, Optional[str]]:
+        """
+        :return:
+          ``(found, error)``.
+        """
+        path = self._cache_file(statement)
+        if path is None:
+            return False, None
+        try:
+            with open(path) as fp:
+                entry = json.load(fp)
+            if entry["statement"] != statement:
+                return False, None
+            for dep, mtime in entry["deps"].items():
+                if _mtime_ns(dep) != mtime:
+                    return False, None
+            return True, entry["error"]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return False, None
+
+    def _cache_store(
+        self, statement: str, error: Optional[str], deps: Dict[str, int]
+    ) -> None:
+        path = self._cache_file(statement)
+        if path is None:
+            return
+        tmp = path.with_name("%s.tmp.%s" % (path.name, os.getpid()))
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, 'w') as fp:
+                json.dump({"statement": statement, "error": error,
+                           "deps": deps}, fp)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.debug("Couldn't write import probe cache entry %s: %s",
+                         path, e)
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
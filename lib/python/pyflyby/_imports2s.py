@@ -11,16 +11,18 @@ from   pyflyby._autoimp         import scan_for_import_issues
 from   pyflyby._file            import FileText, Filename
 from   pyflyby._flags           import CompilerFlags
 from   pyflyby._format          import FormatParams
-from   pyflyby._importclns      import ImportMap, ImportSet, NoSuchImportError
+from   pyflyby._importclns      import (ImportMap, ImportSet,
+                                        NoSuchImportError, PrefixMatcher)
 from   pyflyby._importdb        import ImportDB
+from   pyflyby._importprobe     import ImportProber
 from   pyflyby._importstmt      import (Import, ImportFormatParams,
                                         ImportStatement,
                                         NonImportStatementError)
 from   pyflyby._log             import logger
 from   pyflyby._modules         import ModuleHandle
 from   pyflyby._parse           import PythonBlock, PythonStatement
-from   pyflyby._util            import (ImportPathCtx, Inf, _has_ignore_pragma,
-                                        memoize)
+from   pyflyby._symbolindex     import SymbolIndex
+from   pyflyby._util            import ImportPathCtx, Inf, _has_ignore_pragma
 
 import re
 import sys
@@ -37,6 +39,20 @@ from   textwrap                 import dedent, indent
 # ``canonical_imports``); both expose ``.items()``/``.keys()``.
 _Transformations = Union[Dict[str, str], ImportMap]
 
+
+def _prefix_matcher(
+    transformations: Union[_Transformations, PrefixMatcher]
+) -> PrefixMatcher:
+    """
+    Return a `PrefixMatcher` for ``transformations``, reusing the one cached on
+    an `ImportMap`.
+    """
+    if isinstance(transformations, PrefixMatcher):
+        return transformations
+    if isinstance(transformations, ImportMap):
+        return transformations.prefix_matcher
+    return PrefixMatcher(transformations)
+
 # AST node types for function and class definitions
 _FUNCTION_OR_CLASS_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
 # AST node types for import statements
@@ -1093,6 +1109,7 @@ def fix_unused_and_missing_imports(
     if add_missing and missing_imports:
         missing_imports.sort(key=lambda k: (k[1], k[0]))
         known = db.known_imports.by_import_as
+        index = SymbolIndex.get_default()
         # Decide on where to put each import to be added.  Find the import
         # block with the longest common prefix.  Tie-break by preferring later
         # blocks.
@@ -1102,10 +1119,14 @@ def fix_unused_and_missing_imports(
             try:
                 imports = known[import_as]
             except KeyError:
-                logger.warning(
-                    "%s:%s: undefined name %r and no known import for it",
-                    filename, lineno, import_as)
-                continue
+                imp = index.find_import(import_as, exclude=db.forget_imports) \
+                    if index else None
+                if imp is None:
+                    logger.warning(
+                        "%s:%s: undefined name %r and no known import for it",
+                        filename, lineno, import_as)
+                    continue
+                imports = (imp,)
             if len(imports) != 1:
                 logger.error("%s: don't know which of %r to use",
                              filename, imports)
@@ -1134,7 +1155,9 @@ def fix_unused_and_missing_imports(
 
 
 def remove_broken_imports(
-    codeblock: Union[PythonBlock, FileText, Filename, str], params: Optional[FormatParams] = None
+    codeblock: Union[PythonBlock, FileText, Filename, str],
+    params: Optional[FormatParams] = None,
+    prober: Optional[ImportProber] = None,
 ) -> PythonBlock:
     """
     Try to execute each import, and remove the ones that don't work.
@@ -1143,6 +1166,10 @@ def remove_broken_imports(
 
     :type codeblock:
       `PythonBlock` or convertible (``str``)
+    :param prober:
+      If given, test the imports in subprocesses with this `ImportProber`
+      instead of executing them in this process.  A prober shared across
+      files probes each distinct import only once.
     :rtype:
       `PythonBlock`
     """
@@ -1150,9 +1177,19 @@ def remove_broken_imports(
         codeblock = PythonBlock(codeblock)
     filename = codeblock.filename
     transformer = SourceToSourceFileImportsTransformation(codeblock)
+    if prober is not None:
+        # Probe the imports of all blocks at once, in parallel.
+        errors = prober.broken(imp for block in transformer.import_blocks
+                               for imp in block.importset.imports)
     for block in transformer.import_blocks:
         broken: List[Import] = []
         for imp in list(block.importset.imports):
+            if prober is not None:
+                if imp in errors:
+                    logger.info("%s: Could not import %r; removing it: %s",
+                                filename, imp.fullname, errors[imp])
+                    broken.append(imp)
+                continue
             ns: Dict[str, Any] = {}
             try:
                 exec(imp.pretty_print(), ns)
@@ -1287,14 +1324,13 @@ class _NoImportBlockTransformer:
     `PythonBlock`.
     """
 
-    # Map of dotted-name prefixes to their replacements, e.g. {"a.b": "x.y"}.
-    _transformations: _Transformations
+    # Matcher for the map of dotted-name prefixes to their replacements, e.g.
+    # {"a.b": "x.y"}.
+    _matcher: PrefixMatcher
     # Whether to also rewrite inside string literals.
     _transform_strings: bool
     # The (position-normalized) block being transformed.
     _block: PythonBlock
-    # ``_transformations`` with keys pre-split into components, longest first.
-    _key_specs: list[tuple[tuple[str, ...], str]]
     # UTF-8 encoding of the block source; edits splice on bytes.
     _data: bytes
     # Byte offset of the start of each (1-based) line.
@@ -1305,10 +1341,10 @@ class _NoImportBlockTransformer:
     def __init__(
         self,
         block: PythonBlock,
-        transformations: _Transformations,
+        transformations: Union[_Transformations, PrefixMatcher],
         transform_strings: bool,
     ) -> None:
-        self._transformations = transformations
+        self._matcher = _prefix_matcher(transformations)
         self._transform_strings = transform_strings
         # Re-wrap so the AST node positions start at line 1 / column 0,
         # regardless of where this block sits in the original file (a
@@ -1325,13 +1361,6 @@ class _NoImportBlockTransformer:
             raise SyntaxError(
                 "transform_imports: could not parse code block:\n%s" % (source,)
             )
-        # Pre-split keys into components for component-wise prefix matching,
-        # longest first so the most specific transformation wins.
-        self._key_specs = sorted(
-            ((tuple(k.split(".")), v) for k, v in transformations.items()),
-            key=lambda kv: len(kv[0]),
-            reverse=True,
-        )
         self._data = source.encode("utf-8")
         # Byte offset of the start of each (1-based) line.  ``ast`` reports
         # ``col_offset`` as a UTF-8 byte offset, so we splice on bytes.
@@ -1364,9 +1393,7 @@ class _NoImportBlockTransformer:
         substitution.  Used for spans that contain only dotted names (local
         imports) or that we deliberately rewrite verbatim (strings).
         """
-        for k, v in self._transformations.items():
-            text = re.sub(r"\b%s\b" % (re.escape(k),), v, text)
-        return text
+        return self._matcher.replace_words(text)
 
     def _abspos(self, lineno: int, col_offset: int) -> int:
         """Return the absolute byte offset of a (1-based ``lineno``,
@@ -1382,10 +1409,7 @@ class _NoImportBlockTransformer:
         that is a component-wise prefix of ``components``, or None if none
         matches.
         """
-        for kc, v in self._key_specs:
-            if len(kc) <= len(components) and tuple(components[: len(kc)]) == kc:
-                return kc, v
-        return None
+        return self._matcher.longest_match(components)
 
     def _node_start(self, node: Union[ast.stmt, ast.expr]) -> int:
         """Return the absolute byte offset of ``node``'s start position."""
@@ -1487,7 +1511,7 @@ class _NoImportBlockTransformer:
 
 def _transform_noimport_block(
     block: PythonBlock,
-    transformations: _Transformations,
+    transformations: Union[_Transformations, PrefixMatcher],
     transform_strings: bool,
 ) -> PythonBlock:
     """
@@ -1568,14 +1592,11 @@ def transform_imports(
     if not isinstance(codeblock, PythonBlock):
         codeblock = PythonBlock(codeblock)
     transformer = SourceToSourceFileImportsTransformation(codeblock)
-    @memoize
-    def transform_import(imp: Import) -> Import:
-        # Transform a block of imports.
-        # TODO: optimize
-        # TODO: handle transformations containing both a.b=>x and a.b.c=>y
-        for k, v in transformations.items():
-            imp = imp.replace(k, v)
-        return imp
+    # Only the transformations matching each name are looked at, so this
+    # doesn't depend on the size of the map.
+    matcher = _prefix_matcher(transformations)
+    # TODO: handle transformations containing both a.b=>x and a.b.c=>y
+    transform_import = matcher.transform_import
     # Loop over transformer blocks.
     for block in transformer.blocks:
         if isinstance(block, SourceToSourceImportBlockTransformation):
@@ -1584,7 +1605,7 @@ def transform_imports(
             block.importset = ImportSet(output_imports, ignore_shadowed=True)
         else:
             block._output = _transform_noimport_block(
-                block.input, transformations, transform_strings
+                block.input, matcher, transform_strings
             )
     return transformer.output(params=params)
 
@@ -854,6 +854,7 @@ class AutoImporter:
     # See `enable_auto_importer`.  Assigning on the class sets the default for
     # the process, which is how 'py --exec-star-imports' turns it on.
     exec_star_imports: bool = False
+    lazy: bool = False
 
     def __new__(cls, arg=Ellipsis):
         """
@@ -1762,7 +1763,8 @@ class AutoImporter:
             autoimported=self._autoimported_this_cell,
             raise_on_error=raise_on_error, on_error=on_error,
             post_import_hook=post_import_hook,
-            exec_star_imports=self.exec_star_imports)
+            exec_star_imports=self.exec_star_imports,
+            lazy=self.lazy)
 
     def compile_with_autoimport(self, src, filename, mode, flags=0):
         logger.debug("compile_with_autoimport(%r)", src)
@@ -1783,7 +1785,8 @@ class AutoImporter:
 
 
 
-def enable_auto_importer(if_no_ipython='raise', *, exec_star_imports=None):
+def enable_auto_importer(if_no_ipython='raise', *, exec_star_imports=None,
+                         lazy=None):
     """
     Turn on the auto-importer in the current IPython application.
 
@@ -1799,6 +1802,12 @@ def enable_auto_importer(if_no_ipython='raise', *, exec_star_imports=None):
       else in that cell.  Off by default; turn it on from e.g.
       ``ipython_config.py`` with
       ``pyflyby.enable_auto_importer(exec_star_imports=True)``.
+    :param lazy:
+      If not ``None``, whether modules needed only inside the functions and
+      lambdas a cell defines should be imported lazily: the module is put in
+      the namespace right away, but its code only runs when one of its
+      attributes is first accessed.  This makes cells that define functions
+      using heavy modules quicker to run.  Off by default.
     """
     try:
         app = _get_ipython_app()
@@ -1810,6 +1819,8 @@ def enable_auto_importer(if_no_ipython='raise', *, exec_star_imports=None):
     auto_importer = AutoImporter(app)
     if exec_star_imports is not None:
         auto_importer.exec_star_imports = exec_star_imports
+    if lazy is not None:
+        auto_importer.lazy = lazy
     auto_importer.enable()
 
 
@@ -1825,6 +1836,60 @@ def disable_auto_importer():
     auto_importer.disable()
 
 
+def _autoxreload(ip, line):
+    """
+    Implementation of the ``%autoxreload`` line magic.  See
+    `_register_autoxreload_magic`.
+    """
+    from pyflyby._livepatch import xreload_all
+    args = line.split()
+    scoped = "--scoped" in args
+    args = [arg for arg in args if arg != "--scoped"]
+    if not args:
+        xreload_all(scoped=scoped)
+        return
+    if args not in (["on"], ["off"]):
+        from IPython.core.error import UsageError
+        raise UsageError(
+            "%%autoxreload: expected 'on', 'off' or no argument, got %r"
+            % (line,))
+    callback = getattr(ip, "_pyflyby_autoxreload_callback", None)
+    if callback is not None:
+        ip.events.unregister("pre_run_cell", callback)
+        ip._pyflyby_autoxreload_callback = None
+    if args == ["off"]:
+        return
+    def callback(*args):
+        try:
+            xreload_all(scoped=scoped)
+        except Exception:
+            logger.error("%%autoxreload: failed to reload modified modules")
+            ip.showtraceback()
+    ip.events.register("pre_run_cell", callback)
+    ip._pyflyby_autoxreload_callback = callback
+
+
+def _register_autoxreload_magic(ip):
+    """
+    Register the ``%autoxreload`` line magic in the IPython shell ``ip``.
+    """
+    def autoxreload(line):
+        """
+        Reload the modules whose source files were modified, with xreload.
+
+        Usage::
+
+          %autoxreload               # Reload modified modules now
+          %autoxreload on            # Reload modified modules before each cell
+          %autoxreload off           # Stop reloading before each cell
+          %autoxreload on --scoped   # Only reload the changed definitions
+
+        See `pyflyby.xreload_all`.
+        """
+        _autoxreload(ip, line)
+    ip.register_magic_function(autoxreload, "line", "autoxreload")
+
+
 def load_ipython_extension(arg=Ellipsis):
     """
     Turn on pyflyby features, including the auto-importer, for the given
@@ -1846,6 +1911,9 @@ def load_ipython_extension(arg=Ellipsis):
     ~/.ipython/profile_default/ipython_config.py::
       c.InteractiveShellApp.extensions.append("pyflyby")
 
+    This also defines the ``%autoxreload`` magic, to reload modified modules
+    (before each cell, with ``%autoxreload on``).
+
     :type arg:
       ``InteractiveShell``
     :see:
@@ -1857,6 +1925,7 @@ def load_ipython_extension(arg=Ellipsis):
     auto_importer = AutoImporter(arg)
     if arg is not Ellipsis:
         arg._auto_importer = auto_importer
+        _register_autoxreload_magic(arg)
     auto_importer.enable(even_if_previously_errored=True)
     # Clear ImportDB cache.
     ImportDB.clear_default_cache()
@@ -1892,5 +1961,7 @@ def unload_ipython_extension(arg=Ellipsis):
                  os.path.dirname(__file__))
     auto_importer = AutoImporter(arg)
     auto_importer.disable()
+    if arg is not Ellipsis:
+        _autoxreload(arg, "off")
     remove_comms()
     # TODO: disable signal handlers etc.
@@ -134,6 +134,7 @@ XXX test
 from __future__ import annotations, print_function
 
 import ast
+from   concurrent.futures       import ThreadPoolExecutor
 import os
 import re
 import sys
@@ -145,8 +146,9 @@ from   importlib                import reload as reload_module
 import inspect
 from   pyflyby._log             import logger
 
-from   typing                   import (Any, Callable, Dict, List, Optional,
-                                        Tuple)
+from   typing                   import (Any, Callable, Collection, Dict,
+                                        Generator, List, Optional, Set, Tuple,
+                                        Union)
 
 
 # Keep track of when the process was started.
@@ -162,12 +164,18 @@ else:
         _PROCESS_START_TIME = psutil.Process(os.getpid()).create_time()
 
 
+# Map from filename to the (mtime, source) of the version of the file most
+# recently executed by xreload.  Used by scoped reloads to find out which
+# definitions changed.
+_LOADED_SOURCES: Dict[str, Tuple[float, str]] = {}
+
+
 class UnknownModuleError(ImportError):
     pass
 
 
 def livepatch(old: Any, new: Any, modname: Optional[str] = None,
-              visit_stack: Tuple[int, ...] = (),
+              visit_stack: Collection[int] = (),
               cache: Optional[Dict[Tuple[int, int], Any]] = None,
               assume_type: Optional[type] = None,
               heed_hook: bool = True) -> Any:
@@ -176,6 +184,11 @@ def livepatch(old: Any, new: Any, modname: Optional[str] = None,
 
     If ``old`` can't be livepatched, then return ``new``.
 
+    The object graph is traversed with an explicit stack rather than by
+    recursing through Python frames, so deeply nested objects don't hit the
+    recursion limit.  (``__livepatch__`` hooks calling ``do_livepatch`` still
+    start a nested traversal.)
+
     :param old:
       The object to be updated
     :param new:
@@ -193,7 +206,8 @@ def livepatch(old: Any, new: Any, modname: Optional[str] = None,
       Cache of already-updated objects.  Map from (id(old), id(new)) to result.
     :param visit_stack:
       Ids of objects that are currently being updated.
-      Used to deal with reference cycles.
+      Used to deal with reference cycles.  If this is a ``set``, then it is
+      updated in place during the traversal.
       For internal use.
     :param heed_hook:
       If ``True``, heed the ``__livepatch__`` hook on ``new``, if any.
@@ -201,122 +215,198 @@ def livepatch(old: Any, new: Any, modname: Optional[str] = None,
     :return:
       Either live-patched ``old``, or ``new``.
     """
+    if cache is None:
+        cache = {}
+    in_progress = visit_stack if isinstance(visit_stack, set) else set(visit_stack)
+    return _run_livepatch(_livepatch_step(
+        old, new, modname, in_progress, cache,
+        assume_type=assume_type, heed_hook=heed_hook))
+
+
+# A step of the livepatch traversal: a generator that yields the steps for the
+# objects it contains, is sent their results, and returns its own result.
+_LivepatchStep = Generator["_LivepatchStep", Any, Any]
+
+
+def _run_livepatch(step: _LivepatchStep) -> Any:
+    """
+    Run a livepatch step to completion, running the steps it yields on an
+    explicit stack instead of recursing.
+    """
+    stack = [step]
+    value: Any = None
+    error: Optional[BaseException] = None
+    while True:
+        top = stack[-1]
+        try:
+            if error is not None:
+                exc, error = error, None
+                child = top.throw(exc)
+            else:
+                child = top.send(value)
+        except StopIteration as e:
+            stack.pop()
+            if not stack:
+                return e.value
+            value = e.value
+            continue
+        except BaseException as e:
+            stack.pop()
+            if not stack:
+                raise
+            error = e
+            continue
+        stack.append(child)
+        value = None
+
+
+def _livepatch_step(old: Any, new: Any, modname: Optional[str],
+                    in_progress: Set[int],
+                    cache: Dict[Tuple[int, int], Any],
+                    assume_type: Optional[type] = None,
+                    heed_hook: bool = True) -> _LivepatchStep:
+    """
+    Livepatch ``old`` with contents of ``new``.  See `livepatch`.
+    """
     if old is new:
         return new
     # If we're already visiting this object (due to a reference cycle), then
     # don't recurse again.
-    if id(old) in visit_stack:
+    if id(old) in in_progress:
         return old
-    if cache is None:
-        cache = {}
     cachekey = (id(old), id(new))
     try:
         return cache[cachekey]
     except KeyError:
         pass
-    visit_stack += (id(old),)
-    def do_livepatch() -> Any:
-        new_modname = _get_definition_module(new)
-        if modname and new_modname and new_modname != modname:
-            # Ignore objects that have been imported from another module.
-            # Just update their references.
-            return new
-        if assume_type is not None:
-            use_type = assume_type
+    in_progress.add(id(old))
+    try:
+        if heed_hook:
+            hook = (getattr(new, "__livepatch__", None) or
+                    getattr(new, "__reload_update__", None))
+            # XXX if unbound method or a descriptor, then we should ignore it.
+            # XXX test for that.
         else:
-            oldtype = type(old)
-            newtype = type(new)
-            if oldtype is newtype:
-                # Easy, common case: Type didn't change.
-                use_type = oldtype
-            elif (oldtype.__name__ == newtype.__name__ and
-                  oldtype.__module__ == newtype.__module__ == modname and
-                  getattr(sys.modules[modname],
-                          newtype.__name__, None) is newtype and
-                  oldtype is livepatch(
-                      oldtype, newtype, modname=modname,
-                      visit_stack=visit_stack, cache=cache)):
-                # Type of this object was defined in this module.  This
-                # includes metaclasses defined in the same module.
-                use_type = oldtype
-            else:
-                # If the type changed, then give up.
-                return new
-        try:
-            mro = type.mro(use_type)
-        except TypeError:
-            mro = [use_type, object] # old-style class
-        # Dispatch on type.  Include parent classes (in C3 linearized
-        # method resolution order), in particular so that this works on
-        # classes with custom metaclasses that subclass ``type``.
-        for t in mro:
-            try:
-                update = _LIVEPATCH_DISPATCH_TABLE[t]
-                break
-            except KeyError:
-                pass
+            hook = None
+        if hook is None:
+            # No hook is defined or the caller instructed us to ignore it.
+            # Do the standard livepatch.
+            result = yield _do_livepatch_step(
+                old, new, modname, in_progress, cache, assume_type)
         else:
-            # We should have found at least ``object``
-            raise AssertionError("unreachable")
-        # Dispatch.
-        return update(old, new, modname=modname,
-                      cache=cache, visit_stack=visit_stack)
-    if heed_hook:
-        hook = (getattr(new, "__livepatch__", None) or
-                getattr(new, "__reload_update__", None))
-        # XXX if unbound method or a descriptor, then we should ignore it.
-        # XXX test for that.
-    else:
-        hook = None
-    if hook is None:
-        # No hook is defined or the caller instructed us to ignore it.
-        # Do the standard livepatch.
-        result = do_livepatch()
-    else:
-        # Call a hook for updating.
-        # Build dict of optional kwargs.
-        avail_kwargs = dict(
-            old=old,
-            new=new,
-            do_livepatch=do_livepatch,
-            modname=modname,
-            cache=cache,
-            visit_stack=visit_stack)
-        # Find out which optional kwargs the hook wants.
-        kwargs: Dict[str, Any] = {}
-        argspec = inspect.getfullargspec(hook)
-        argnames = argspec.args
-        if hasattr(hook, "__func__"):
-            # Skip 'self' arg.
-            argnames = argnames[1:]
-        # Pick kwargs that are wanted and available.
-        args: List[Any] = []
-        kwargs = {}
-        for n in argnames:
-            try:
-                kwargs[n] = avail_kwargs[n]
-                if argspec.varkw:
-                    break
-            except KeyError:
-                # For compatibility, allow first argument to be 'old' with any
-                # name, as long as there's no other arg 'old'.
-                # We intentionally allow this even if the user specified
-                # **kwargs.
-                if not args and not kwargs and 'old' not in argnames:
-                    args.append(old)
-                else:
-                    # Rely on default being set.  If a default isn't set, the
-                    # user will get a TypeError.
-                    pass
-        if argspec.varkw:
-            # Use all available kwargs.
-            kwargs = avail_kwargs
-        # Call hook.
-        result = hook(*args, **kwargs)
+            result = _call_livepatch_hook(
+                hook, old, new, modname, in_progress, cache, assume_type)
+    finally:
+        in_progress.discard(id(old))
     cache[cachekey] = result
     return result
 
 
+def _do_livepatch_step(old: Any, new: Any, modname: Optional[str],
+                       in_progress: Set[int],
+                       cache: Dict[Tuple[int, int], Any],
+                       assume_type: Optional[type]) -> _LivepatchStep:
+    """
+    Do the standard livepatch of ``old`` with ``new``, ignoring hooks.
+    """
+    new_modname = _get_definition_module(new)
+    if modname and new_modname and new_modname != modname:
+        # Ignore objects that have been imported from another module.
+        # Just update their references.
+        return new
+    if assume_type is not None:
+        use_type = assume_type
+    else:
+        oldtype = type(old)
+        newtype = type(new)
+        if oldtype is newtype:
+            # Easy, common case: Type didn't change.
+            use_type = oldtype
+        elif (oldtype.__name__ == newtype.__name__ and
+              oldtype.__module__ == newtype.__module__ == modname and
+              getattr(sys.modules[modname],
+                      newtype.__name__, None) is newtype and
+              (yield _livepatch_step(oldtype, newtype, modname,
+                                     in_progress, cache)) is oldtype):
+            # Type of this object was defined in this module.  This
+            # includes metaclasses defined in the same module.
+            use_type = oldtype
+        else:
+            # If the type changed, then give up.
+            return new
+    try:
+        mro = type.mro(use_type)
+    except TypeError:
+        mro = [use_type, object] # old-style class
+    # Dispatch on type.  Include parent classes (in C3 linearized
+    # method resolution order), in particular so that this works on
+    # classes with custom metaclasses that subclass ``type``.
+    for t in mro:
+        try:
+            update = _LIVEPATCH_DISPATCH_TABLE[t]
+            break
+        except KeyError:
+            pass
+    else:
+        # We should have found at least ``object``
+        raise AssertionError("unreachable")
+    # Dispatch.
+    return (yield update(old, new, modname=modname,
+                         cache=cache, in_progress=in_progress))
+
+
+def _call_livepatch_hook(hook: Any, old: Any, new: Any,
+                         modname: Optional[str],
+                         in_progress: Set[int],
+                         cache: Dict[Tuple[int, int], Any],
+                         assume_type: Optional[type]) -> Any:
+    """
+    Call the ``__livepatch__`` hook of ``new``.
+    """
+    def do_livepatch() -> Any:
+        return _run_livepatch(_do_livepatch_step(
+            old, new, modname, in_progress, cache, assume_type))
+    # Build dict of optional kwargs.
+    avail_kwargs = dict(
+        old=old,
+        new=new,
+        do_livepatch=do_livepatch,
+        modname=modname,
+        cache=cache,
+        visit_stack=in_progress)
+    # Find out which optional kwargs the hook wants.
+    kwargs: Dict[str, Any] = {}
+    argspec = inspect.getfullargspec(hook)
+    argnames = argspec.args
+    if hasattr(hook, "__func__"):
+        # Skip 'self' arg.
+        argnames = argnames[1:]
+    # Pick kwargs that are wanted and available.
+    args: List[Any] = []
+    kwargs = {}
+    for n in argnames:
+        try:
+            kwargs[n] = avail_kwargs[n]
+            if argspec.varkw:
+                break
+        except KeyError:
+            # For compatibility, allow first argument to be 'old' with any
+            # name, as long as there's no other arg 'old'.
+            # We intentionally allow this even if the user specified
+            # **kwargs.
+            if not args and not kwargs and 'old' not in argnames:
+                args.append(old)
+            else:
+                # Rely on default being set.  If a default isn't set, the
+                # user will get a TypeError.
+                pass
+    if argspec.varkw:
+        # Use all available kwargs.
+        kwargs = avail_kwargs
+    # Call hook.
+    return hook(*args, **kwargs)
+
+
 # Sentinel cache key under which we record a mapping from
 # ``id(new_module.__dict__)`` to the corresponding live (old) module
 # ``__dict__``.  This is used to rebind the ``__globals__`` of functions that
@@ -324,11 +414,16 @@ def livepatch(old: Any, new: Any, modname: Optional[str] = None,
 # never collides with the ``(id(old), id(new))`` tuple keys used elsewhere.
 _GLOBALS_REBIND_KEY = "__pyflyby_globals_rebind__"
 
+# Sentinel cache key under which we keep the scratch namespaces of the modules
+# reloaded with a shared cache (see `xreload_all`) alive, so that the ids in
+# the cache keys aren't reused by other objects.
+_KEEPALIVE_KEY = "__pyflyby_keepalive__"
+
 
 def _livepatch__module(old_mod: types.ModuleType, new_mod: types.ModuleType,
                        modname: Optional[str],
                        cache: Dict[Tuple[int, int], Any],
-                       visit_stack: Tuple[int, ...]) -> types.ModuleType:
+                       in_progress: Set[int]) -> _LivepatchStep:
     """
     Livepatch a module.
     """
@@ -340,9 +435,8 @@ def _livepatch__module(old_mod: types.ModuleType, new_mod: types.ModuleType,
     # global references would go stale on subsequent reloads.  See GH #30.
     cache.setdefault(_GLOBALS_REBIND_KEY, {})[  # type: ignore[call-overload]
         id(new_mod.__dict__)] = old_mod.__dict__
-    result = livepatch(old_mod.__dict__, new_mod.__dict__,
-                       modname=modname,
-                       cache=cache, visit_stack=visit_stack)
+    result = yield _livepatch_step(old_mod.__dict__, new_mod.__dict__,
+                                   modname, in_progress, cache)
     assert result is old_mod.__dict__
     return old_mod
 
@@ -386,7 +480,7 @@ def _rebind_new_object(obj: Any,
 def _livepatch__dict(old_dict: Dict[Any, Any], new_dict: Dict[Any, Any],
                      modname: Optional[str],
                      cache: Dict[Tuple[int, int], Any],
-                     visit_stack: Tuple[int, ...]) -> Dict[Any, Any]:
+                     in_progress: Set[int]) -> _LivepatchStep:
     """
     Livepatch a dict.
     """
@@ -402,9 +496,8 @@ def _livepatch__dict(old_dict: Dict[Any, Any], new_dict: Dict[Any, Any],
     updated_names = sorted(oldnames & newnames, key=str)
     for name in updated_names:
         old = old_dict[name]
-        updated = livepatch(old, new_dict[name],
-                            modname=modname,
-                            cache=cache, visit_stack=visit_stack)
+        updated = yield _livepatch_step(old, new_dict[name],
+                                        modname, in_progress, cache)
         if updated is not old:
             old_dict[name] = updated
     return old_dict
@@ -413,7 +506,7 @@ def _livepatch__dict(old_dict: Dict[Any, Any], new_dict: Dict[Any, Any],
 def _livepatch__function(old_func: Any, new_func: Any,
                          modname: Optional[str],
                          cache: Dict[Tuple[int, int], Any],
-                         visit_stack: Tuple[int, ...]) -> Any:
+                         in_progress: Set[int]) -> _LivepatchStep:
     """
     Livepatch a function.
     """
@@ -451,35 +544,34 @@ def _livepatch__function(old_func: Any, new_func: Any,
     old_func.__defaults__ = new_func.__defaults__
     old_func.__doc__ = new_func.__doc__
     # Update dict.
-    livepatch(old_func.__dict__, new_func.__dict__,
-              modname=modname, cache=cache, visit_stack=visit_stack)
+    yield _livepatch_step(old_func.__dict__, new_func.__dict__,
+                          modname, in_progress, cache)
     # Update the __closure__.  We can't set __closure__ because it's a
     # read-only attribute; we can only livepatch its cells' values.
     for oldcell, newcell in zip(old_closure, new_closure):
         oldcellv = oldcell.cell_contents
         newcellv = newcell.cell_contents
-        livepatch(oldcellv, newcellv,
-                  modname=modname, cache=cache, visit_stack=visit_stack)
+        yield _livepatch_step(oldcellv, newcellv, modname, in_progress, cache)
     return old_func
 
 
 def _livepatch__method(old_method: Any, new_method: Any,
                        modname: Optional[str],
                        cache: Dict[Tuple[int, int], Any],
-                       visit_stack: Tuple[int, ...]) -> Any:
+                       in_progress: Set[int]) -> _LivepatchStep:
     """
     Livepatch a method.
     """
-    _livepatch__function(old_method.__func__, new_method.__func__,
-                         modname=modname,
-                         cache=cache, visit_stack=visit_stack)
+    yield _livepatch__function(old_method.__func__, new_method.__func__,
+                               modname=modname,
+                               cache=cache, in_progress=in_progress)
     return old_method
 
 
 def _livepatch__setattr(oldobj: Any, newobj: Any, name: str,
                         modname: Optional[str],
                         cache: Dict[Tuple[int, int], Any],
-                        visit_stack: Tuple[int, ...]) -> None:
+                        in_progress: Set[int]) -> _LivepatchStep:
     """
     Livepatch something via setattr, i.e.::
 
@@ -501,8 +593,7 @@ def _livepatch__setattr(oldobj: Any, newobj: Any, name: str,
     if newval is oldval:
         return
     # Livepatch the member object.
-    newval = livepatch(
-        oldval, newval, modname=modname, cache=cache, visit_stack=visit_stack)
+    newval = yield _livepatch_step(oldval, newval, modname, in_progress, cache)
     # If the livepatch succeeded then we don't need to setattr.  It should be
     # a no-op but we avoid it just to minimize any chance of setattr causing
     # problems in corner cases.
@@ -516,7 +607,7 @@ def _livepatch__setattr(oldobj: Any, newobj: Any, name: str,
 def _livepatch__class(oldclass: type, newclass: type,
                       modname: Optional[str],
                       cache: Dict[Tuple[int, int], Any],
-                      visit_stack: Tuple[int, ...]) -> type:
+                      in_progress: Set[int]) -> _LivepatchStep:
     """
     Livepatch a class.
 
@@ -541,7 +632,22 @@ def _livepatch__class(oldclass: type, newclass: type,
         delattr(oldclass, name)
     for name in newnames - oldnames:
         setattr(oldclass, name, _rebind_new_object(newdict[name], cache))
-    oldclass.__bases__ = newclass.__bases__
+    # Livepatch the base classes that were redefined in this module, so that
+    # the class keeps deriving from their live versions.  Only set __bases__
+    # if it changed: that recomputes the MRO of all the subclasses, which is
+    # expensive for deep class hierarchies.
+    new_bases = list(newclass.__bases__)
+    if len(new_bases) == len(oldclass.__bases__):
+        for i, old_base in enumerate(oldclass.__bases__):
+            new_base = new_bases[i]
+            if (old_base is not new_base and
+                    old_base.__name__ == new_base.__name__ and
+                    old_base.__module__ == new_base.__module__ == modname):
+                new_bases[i] = yield _livepatch_step(
+                    old_base, new_base, modname, in_progress, cache)
+    if any(a is not b for a, b in zip(new_bases, oldclass.__bases__)) or \
+       len(new_bases) != len(oldclass.__bases__):
+        oldclass.__bases__ = tuple(new_bases)
     names = oldnames & newnames
     names.difference_update(olddict.get("__slots__", []))
     names.discard("__slots__")
@@ -556,15 +662,15 @@ def _livepatch__class(oldclass: type, newclass: type,
         pass
     # Loop over attributes to be updated.
     for name in sorted(names):
-        _livepatch__setattr(
-            oldclass, newclass, name, modname, cache, visit_stack)
+        yield _livepatch__setattr(
+            oldclass, newclass, name, modname, cache, in_progress)
     return oldclass
 
 
 def _livepatch__object(oldobj: Any, newobj: Any,
                        modname: Optional[str],
                        cache: Dict[Tuple[int, int], Any],
-                       visit_stack: Tuple[int, ...]) -> Any:
+                       in_progress: Set[int]) -> _LivepatchStep:
     """
     Livepatch a general object.
     """
@@ -581,8 +687,8 @@ def _livepatch__object(oldobj: Any, newobj: Any,
             hasold = hasattr(oldobj, name)
             hasnew = hasattr(newobj, name)
             if hasold and hasnew:
-                _livepatch__setattr(oldobj, newobj, name,
-                                          modname, cache, visit_stack)
+                yield _livepatch__setattr(oldobj, newobj, name,
+                                          modname, cache, in_progress)
             elif hasold and not hasnew:
                 delattr(oldobj, name)
             elif not hasold and hasnew:
@@ -593,9 +699,8 @@ def _livepatch__object(oldobj: Any, newobj: Any,
                 raise AssertionError
         return oldobj
     elif type(getattr(oldobj, "__dict__", None)) is dict:
-        livepatch(
-            oldobj.__dict__, newobj.__dict__,
-            modname=modname, cache=cache, visit_stack=visit_stack)
+        yield _livepatch_step(oldobj.__dict__, newobj.__dict__,
+                              modname, in_progress, cache)
         return oldobj
     else:
         return newobj
@@ -696,8 +801,220 @@ def _interpret_module(arg: Any) -> types.ModuleType:
                     % (type(arg).__name__))
 
 
+def _get_loaded_source(module: types.ModuleType,
+                       filename: str) -> Optional[str]:
+    """
+    Get the source that ``module`` was last loaded from, or ``None`` if
+    unknown.
+
+    This is the source last executed by xreload, or else the source in the
+    linecache, if it was read no later than the module was loaded.
+    """
+    import linecache
+    loadtime = getattr(module, "__loadtime__", None)
+    try:
+        mtime, source = _LOADED_SOURCES[filename]
+    except KeyError:
+        pass
+    else:
+        if mtime == loadtime:
+            return source
+    entry = linecache.cache.get(filename)
+    if entry is None or len(entry) != 4 or entry[1] is None:
+        return None
+    if loadtime is None:
+        loadtime = _PROCESS_START_TIME
+    if entry[1] > loadtime:
+        return None
+    return ''.join(entry[2])
+
+
+_Definition = Union[ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef]
+
+
+def _split_definitions(
+        astnode: ast.Module, lines: List[str]
+) -> Optional[Tuple[Dict[str, Tuple[_Definition, str]], List[str], Set[str]]]:
+    """
+    Split the top-level statements of a module into function and class
+    definitions and other statements.
+
+    :return:
+      A tuple ``(definitions, others, bound_names)``, where ``definitions``
+      maps the name of each top-level function and class to its AST node and
+      source text, ``others`` has the AST dump of each other statement, and
+      ``bound_names`` has the names bound by the other statements.  ``None``
+      if some name is defined more than once or if there is a star import, in
+      which case the definitions can't be told apart.
+    """
+    definitions: Dict[str, Tuple[_Definition, str]] = {}
+    others: List[str] = []
+    bound_names: Set[str] = set()
+    for stmt in astnode.body:
+        if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef,
+                             ast.ClassDef)):
+            if stmt.name in definitions:
+                return None
+            start = min([stmt.lineno] +
+                        [d.lineno for d in stmt.decorator_list])
+            text = ''.join(lines[start-1:stmt.end_lineno])
+            definitions[stmt.name] = (stmt, text)
+            continue
+        others.append(ast.dump(stmt))
+        for node in ast.walk(stmt):
+            if isinstance(node, ast.Name) and not isinstance(
+                    node.ctx, ast.Load):
+                bound_names.add(node.id)
+            elif isinstance(node, ast.alias):
+                if node.name == "*":
+                    return None
+                bound_names.add(node.asname or node.name.split(".")[0])
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef,
+                                   ast.ClassDef)):
+                bound_names.add(node.name)
+            elif isinstance(node, ast.ExceptHandler) and node.name:
+                bound_names.add(node.name)
+    if set(definitions) & bound_names:
+        return None
+    return definitions, others, bound_names
+
+
+def _shift_code_lineno(code: types.CodeType, delta: int) -> types.CodeType:
+    """
+    Return ``code`` with its line numbers, and those of the code objects
+    nested in it, shifted by ``delta``.
+    """
+    consts = tuple(_shift_code_lineno(c, delta)
+                   if isinstance(c, types.CodeType) else c
+                   for c in code.co_consts)
+    return code.replace(co_firstlineno=code.co_firstlineno + delta,
+                        co_consts=consts)
+
+
+def _shift_definition_lineno(obj: Any, delta: int, filename: str,
+                             first: int, last: int,
+                             seen: Set[int]) -> None:
+    """
+    Shift the line numbers of the functions defined between lines ``first``
+    and ``last`` of ``filename`` in ``obj`` (a function, or a class and its
+    methods) by ``delta``.
+    """
+    if id(obj) in seen:
+        return
+    seen.add(id(obj))
+    if isinstance(obj, (staticmethod, classmethod)):
+        obj = obj.__func__
+    if isinstance(obj, property):
+        for func in (obj.fget, obj.fset, obj.fdel):
+            _shift_definition_lineno(func, delta, filename, first, last, seen)
+    elif isinstance(obj, types.FunctionType):
+        code = obj.__code__
+        if (code.co_filename == filename and
+                first <= code.co_firstlineno <= last):
+            obj.__code__ = _shift_code_lineno(code, delta)
+    elif isinstance(obj, type):
+        for value in list(vars(obj).values()):
+            _shift_definition_lineno(value, delta, filename, first, last, seen)
+
+
+def _xreload_module_scoped(module: types.ModuleType, filename: str,
+                           old_source: str, source: str,
+                           astnode: ast.Module,
+                           cache: Optional[Dict[Any, Any]] = None) -> bool:
+    """
+    Reload ``module`` by only executing and livepatching the top-level
+    functions and classes that changed between ``old_source`` and ``source``.
+
+    This is only possible if all other top-level statements are unchanged and
+    the changed names aren't also bound by them (e.g. ``foo = wrap(foo)``).
+    Module-level code that uses the changed definitions is not executed
+    again.
+
+    :param cache:
+      Livepatch cache to use, e.g. shared across modules.
+    :return:
+      ``True`` if the module was reloaded, ``False`` if a full reload is
+      needed.
+    """
+    if (getattr(module, "__livepatch__", None) is not None or
+            getattr(module, "__reload_update__", None) is not None):
+        return False
+    try:
+        old_astnode = compile(old_source, filename, "exec", ast.PyCF_ONLY_AST, 1)  # type: ignore[call-overload]
+    except SyntaxError:
+        return False
+    old_lines = old_source.splitlines(True)
+    new_lines = source.splitlines(True)
+    old_split = _split_definitions(old_astnode, old_lines)
+    new_split = _split_definitions(astnode, new_lines)
+    if old_split is None or new_split is None:
+        return False
+    old_definitions, old_others, _ = old_split
+    new_definitions, new_others, _ = new_split
+    if old_others != new_others:
+        logger.debug("Module-level statements of %s changed; doing a full "
+                     "reload", module.__name__)
+        return False
+    changed = [name for name, (_, text) in new_definitions.items()
+               if old_definitions.get(name, (None, None))[1] != text]
+    removed = [name for name in old_definitions if name not in new_definitions]
+    logger.info("Reloading %s definition(s) of %s: %s",
+                len(changed) + len(removed), module.__name__,
+                ", ".join(changed + removed) or "(none)")
+    old_dict = module.__dict__
+    if changed:
+        # Execute the changed definitions in a copy of the module's namespace,
+        # so that if this fails, nothing changes.
+        # Keep the module's __future__ imports, which affect how the
+        # definitions are compiled.
+        new_body: List[ast.stmt] = [
+            stmt for stmt in astnode.body
+            if isinstance(stmt, ast.ImportFrom) and stmt.module == "__future__"]
+        new_body += [new_definitions[name][0] for name in changed]
+        code = compile(ast.Module(body=new_body, type_ignores=[]),
+                       filename, "exec", dont_inherit=True)
+        scratch = dict(old_dict)
+        exec(code, scratch)
+        if cache is None:
+            cache = {}
+        cache.setdefault(_GLOBALS_REBIND_KEY, {})[id(scratch)] = old_dict
+        cache.setdefault(_KEEPALIVE_KEY, []).append(scratch)
+        for name in changed:
+            new = scratch[name]
+            try:
+                old = old_dict[name]
+            except KeyError:
+                updated = new
+            else:
+                updated = livepatch(old, new, modname=module.__name__,
+                                    cache=cache)
+                if updated is old:
+                    continue
+            old_dict[name] = _rebind_new_object(updated, cache)
+    for name in removed:
+        old_dict.pop(name, None)
+    # Keep line numbers in tracebacks right for unchanged definitions that
+    # moved.
+    for name, (new_stmt, _) in new_definitions.items():
+        if name in changed or name not in old_dict:
+            continue
+        old_stmt = old_definitions[name][0]
+        delta = new_stmt.lineno - old_stmt.lineno
+        if delta:
+            first = min([old_stmt.lineno] +
+                        [d.lineno for d in old_stmt.decorator_list])
+            _shift_definition_lineno(old_dict[name], delta, filename, first,
+                                     old_stmt.end_lineno or old_stmt.lineno,
+                                     set())
+    return True
+
+
 def _xreload_module(module: types.ModuleType, filename: Optional[str],
-                    force: bool = False) -> Optional[types.ModuleType]:
+                    force: bool = False,
+                    scoped: bool = False,
+                    mtime: Optional[float] = None,
+                    cache: Optional[Dict[Any, Any]] = None,
+                    ) -> Optional[types.ModuleType]:
     """
     Reload a module in place, using livepatch.
 
@@ -708,6 +1025,14 @@ def _xreload_module(module: types.ModuleType, filename: Optional[str],
     :param force:
       Whether to reload even if the module has not been modified since the
       previous load.  If ``False``, then do nothing.  If ``True``, then reload.
+    :param scoped:
+      Whether to only execute and livepatch the top-level functions and
+      classes that changed since the previous load, if possible.  See
+      `_xreload_module_scoped`.
+    :param mtime:
+      The modification time of ``filename``, if already known.
+    :param cache:
+      Livepatch cache to use, e.g. shared across modules.
     """
     import linecache
     if not filename or not filename.endswith(".py"):
@@ -716,11 +1041,11 @@ def _xreload_module(module: types.ModuleType, filename: Optional[str],
         return reload_module(module)
     # Compare mtime of the file with the load time of the module.  If the file
     # wasn't touched, we don't need to do anything.
-    try:
-        mtime = os.stat(filename).st_mtime
-    except OSError:
-        logger.info("Can't find %s", filename)
-        return None
+    if mtime is None:
+        mtime = _get_mtime(filename)
+        if mtime is None:
+            logger.info("Can't find %s", filename)
+            return None
     if not force:
         try:
             old_loadtime = module.__loadtime__
@@ -740,6 +1065,7 @@ def _xreload_module(module: types.ModuleType, filename: Optional[str],
         cached_lines = linecache.cache.get(filename, (None,None,None,None))[2]  # type: ignore[misc]
     else:
         cached_lines = None
+    old_source = _get_loaded_source(module, filename) if scoped else None
     # Re-read source for module from disk, and update the linecache.
     source = ''.join(linecache.updatecache(filename))
     # Skip reload if the content didn't change.
@@ -753,6 +1079,11 @@ def _xreload_module(module: types.ModuleType, filename: Optional[str],
     # Compile into AST.  We do this as a separate step from compiling to byte
     # code so that we can get the module docstring.
     astnode = compile(source, filename, "exec", ast.PyCF_ONLY_AST, 1)  # type: ignore[call-overload]
+    if old_source is not None and _xreload_module_scoped(
+            module, filename, old_source, source, astnode, cache=cache):
+        module.__loadtime__ = mtime  # type: ignore[attr-defined]
+        _LOADED_SOURCES[filename] = (mtime, source)
+        return module
     # Get the new docstring.
     try:
         if sys.version_info > (3, 10):  # type: ignore[attr-defined]
@@ -791,8 +1122,10 @@ def _xreload_module(module: types.ModuleType, filename: Optional[str],
         # ``ModuleType``.
         assume_type = types.ModuleType
         # Livepatch the module.
+        if cache is not None:
+            cache.setdefault(_KEEPALIVE_KEY, []).append(new_mod)
         result = livepatch(module, new_mod, module.__name__,
-                           assume_type=assume_type)
+                           cache=cache, assume_type=assume_type)
         sys.modules[module.__name__] = result
     except:
         # Either the module failed executing or the livepatch failed.
@@ -809,9 +1142,65 @@ def _xreload_module(module: types.ModuleType, filename: Optional[str],
     # filer's mtime and time.time() to not be synchronized.  We will be
     # comparing to mtime next time, so if we use only mtime, we'll be fine.
     module.__loadtime__ = mtime  # type: ignore[attr-defined]
+    _LOADED_SOURCES[filename] = (mtime, source)
     return module
 
 
+def _get_mtime(filename: str) -> Optional[float]:
+    """
+    Get the modification time of ``filename``, or ``None`` if it doesn't exist.
+    """
+    try:
+        return os.stat(filename).st_mtime
+    except OSError:
+        return None
+
+
+def _get_module_references(module: types.ModuleType) -> Set[str]:
+    """
+    Get the names of the modules that ``module`` refers to in its namespace,
+    either directly or through the functions and classes imported from them.
+    """
+    names = set()
+    for value in list(vars(module).values()):
+        if isinstance(value, types.ModuleType):
+            names.add(value.__name__)
+        elif isinstance(value, (type, types.FunctionType)):
+            name = getattr(value, "__module__", None)
+            if isinstance(name, str):
+                names.add(name)
+    return names
+
+
+def _sort_by_dependencies(modules: Dict[str, types.ModuleType]) -> List[str]:
+    """
+    Sort the names of ``modules`` so that each module comes after the modules
+    it refers to.  Reference cycles are broken in alphabetical order.
+
+      >>> a, b, c = (types.ModuleType(name) for name in "abc")
+      >>> a.f = b
+      >>> b.g = c.h = types.ModuleType("x")
+      >>> _sort_by_dependencies({"a": a, "b": b, "c": c})
+      ['b', 'a', 'c']
+      >>> b.a = a
+      >>> _sort_by_dependencies({"b": b, "a": a})
+      ['b', 'a']
+    """
+    result: List[str] = []
+    visited: Set[str] = set()
+    def visit(name: str) -> None:
+        if name in visited:
+            return
+        visited.add(name)
+        for dependency in sorted(_get_module_references(modules[name])):
+            if dependency in modules:
+                visit(dependency)
+        result.append(name)
+    for name in sorted(modules):
+        visit(name)
+    return result
+
+
 def _get_module_py_file(module: Any) -> Optional[str]:
     filename = getattr(module, "__file__", None)
     if not filename:
@@ -820,7 +1209,7 @@ def _get_module_py_file(module: Any) -> Optional[str]:
     return filename
 
 
-def xreload(*args: Any) -> None:
+def xreload(*args: Any, scoped: bool = False) -> None:
     """
     Reload module(s).
 
@@ -852,15 +1241,17 @@ def xreload(*args: Any) -> None:
     :param args:
       Module(s) to reload.  If no argument is specified, then reload all
       recently modified modules.
+    :param scoped:
+      If ``True``, then only execute and livepatch the top-level functions and
+      classes that changed since the module was last loaded, instead of
+      executing the whole module and livepatching everything in it.  This is
+      much faster for large modules, but module-level code using the changed
+      definitions is not executed again.  A full reload is done instead if
+      any other module-level statement changed, or if the source that the
+      module was last loaded from is unknown.
     """
     if not args:
-        for name, module in sorted(sys.modules.items()):
-            if name == "__main__":
-                continue
-            filename = _get_module_py_file(module)
-            if not filename:
-                continue
-            _xreload_module(module, filename)
+        xreload_all(scoped=scoped)
         return
     # Treat xreload(list_of_module) like xreload(*list_of_modules).  We
     # intentionally do this after the above check so that xreload([]) does
@@ -872,4 +1263,71 @@ def xreload(*args: Any) -> None:
         # Get the *.py filename for this module.
         filename = _get_module_py_file(module)
         # Reload the module.
-        _xreload_module(module, filename)
+        _xreload_module(module, filename, scoped=scoped)
+
+
+def xreload_all(scoped: bool = False, max_workers: int = 1) -> List[str]:
+    """
+    Reload all modules whose source file was modified since they were loaded.
+
+    This scans ``sys.modules`` once and stats all the ``*.py`` source files in
+    one pass, optionally in a thread pool (useful on network file systems).
+    The modified modules are reloaded in import-dependency order, i.e. a
+    module is reloaded after the modules it imports from, using one livepatch
+    cache shared across all of them.
+
+    A module counts as modified if its file was modified after it was last
+    loaded by xreload, or after the process started if it was never
+    reloaded.
+
+    :param scoped:
+      Whether to only execute and livepatch the changed definitions of each
+      module; see `xreload`.
+    :param max_workers:
+      The number of threads used to stat the source files.  Default is 1,
+      which stats them in the calling thread.
+    :return:
+      The names of the modules that were reloaded, in the order they were
+      reloaded.
+    """
+    if not isinstance(max_workers, int) or max_workers <= 0:
+        raise ValueError(
+            "xreload_all: max_workers must be a positive integer, not %r"
+            % (max_workers,))
+    candidates = []
+    for name, module in list(sys.modules.items()):
+        if name == "__main__" or module is None:
+            continue
+        filename = _get_module_py_file(module)
+        if not filename or not filename.endswith(".py"):
+            continue
+        candidates.append((name, module, filename))
+    filenames = [filename for _, _, filename in candidates]
+    if max_workers > 1 and len(filenames) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers,
+                                thread_name_prefix="xreload") as executor:
+            mtimes = list(executor.map(_get_mtime, filenames))
+    else:
+        mtimes = [_get_mtime(filename) for filename in filenames]
+    modified: Dict[str, Tuple[types.ModuleType, str, float]] = {}
+    for (name, module, filename), mtime in zip(candidates, mtimes):
+        if mtime is None:
+            continue
+        loadtime = getattr(module, "__loadtime__", _PROCESS_START_TIME)
+        if mtime > loadtime:
+            modified[name] = (module, filename, mtime)
+    logger.debug("xreload_all: %d of %d modules modified",
+                 len(modified), len(candidates))
+    order = _sort_by_dependencies(
+        {name: module for name, (module, _, _) in modified.items()})
+    cache: Dict[Any, Any] = {}
+    reloaded = []
+    for name in order:
+        module, filename, mtime = modified[name]
+        _xreload_module(module, filename, scoped=scoped, mtime=mtime,
+                        cache=cache)
+        # Modules whose content didn't actually change (or that were loaded
+        # again meanwhile) aren't reloaded, and keep their old load time.
+        if getattr(module, "__loadtime__", None) == mtime:
+            reloaded.append(name)
+    return reloaded
@@ -29,8 +29,8 @@ import re
 import shutil
 import sys
 import types
-from   typing                   import (Any, Dict, Generator, List, Optional,
-                                        TYPE_CHECKING, Tuple, Union)
+from   typing                   import (Any, Callable, Dict, Generator, List,
+                                        Optional, TYPE_CHECKING, Tuple, Union)
 
 if TYPE_CHECKING:
     from   pyflyby._parse        import PythonBlock
@@ -180,6 +180,159 @@ def pyc_to_py(filename: str) -> str:
     return filename
 
 
+def _exports_index_file(
+    module_name: str, filename: Filename
+) -> Optional[pathlib.Path]:
+    """Return the path of the exports index entry for a module.
+
+    The exports index lives under ``<user cache dir>/pyflyby/exports/`` and
+    holds one small JSON file per module with its `ModuleHandle.exports`.
+    Entries are keyed by the module name, the path, ``st_mtime_ns`` and size
+    of its file, and the python version, so editing the module or switching
+    interpreters simply misses the stale entry.  Each entry is written
+    atomically, which makes the index safe to share between concurrent
+    processes.
+
+    Parameters
+    ----------
+    module_name : str
+        Fully qualified module name
+    filename : Filename
+        File the module is loaded from
+
+    Returns
+    -------
+    Optional[pathlib.Path]
+        Path of the entry, or ``None`` if the index is disabled (via
+        ``$PYFLYBY_DISABLE_CACHE``) or the file can't be stat'ed
+    """
+    if os.environ.get("PYFLYBY_DISABLE_CACHE", "0") == "1":
+        return None
+    try:
+        st = os.stat(str(filename))
+    except OSError:
+        return None
+    key = "\0".join([module_name, str(filename), str(st.st_mtime_ns),
+                     str(st.st_size), sys.version])
+    digest = hashlib.sha256(key.encode("utf-8", "surrogateescape")).hexdigest()
+    cache_dir = pathlib.Path(
+        platformdirs.user_cache_dir(appname='pyflyby', appauthor=False)
+    )
+    return cache_dir / "exports" / ("%s.json" % (digest,))
+
+
+def _exports_index_store(
+    module_name: str, filename: Filename, names: List[str]
+) -> None:
+    """Record ``names`` as the exports of a module in the exports index.
+
+    Failures to write are logged and otherwise ignored; the index is only a
+    cache.
+    """
+    path = _exports_index_file(module_name, filename)
+    if path is None:
+        return
+    tmp = path.with_name("%s.tmp.%s" % (path.name, os.getpid()))
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, 'w') as fp:
+            json.dump({"module": module_name, "filename": str(filename),
+                       "exports": names}, fp)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.debug("Couldn't write exports index entry %s: %s", path, e)
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+
+
+def _exports_index_lookup(
+    module_name: str,
+    filename: Filename,
+    compute: Callable[[], Tuple[List[str], bool]],
+) -> List[str]:
+    """Return the exports of a module from the exports index.
+
+    On a miss, call ``compute()``, which returns the exports and whether they
+    depend only on the module's own file, and record them if so.  Exceptions
+    from ``compute`` propagate and nothing is recorded.
+    """
+    path = _exports_index_file(module_name, filename)
+    if path is not None:
+        try:
+            with open(path) as fp:
+                entry = json.load(fp)
+            names = entry["exports"]
+            if (entry["module"] == module_name
+                and isinstance(names, list)
+                and all(isinstance(n, str) for n in names)):
+                return names
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+    names, indexable = compute()
+    if indexable:
+        _exports_index_store(module_name, filename, names)
+    return names
+
+
+def _walk_modules() -> Generator[Tuple[str, Optional[str]], None, None]:
+    """Enumerate all importable modules, including submodules of packages.
+
+    Unlike `pkgutil.walk_packages`, this doesn't import packages to find their
+    ``__path__``; subpackages are looked for in the directory next to the
+    package's ``__init__`` file, and each module's file is located with the
+    finder that found it.  Namespace packages spread over several directories
+    and modules provided by import hooks are therefore only partially
+    covered.
+
+    Returns
+    -------
+    Generator[Tuple[str, Optional[str]], None, None]
+        Tuples of (fully qualified module name, filename or ``None`` if
+        unknown), parents before their submodules
+    """
+    def origin(info: pkgutil.ModuleInfo) -> Optional[str]:
+        finder = info.module_finder
+        if not isinstance(finder, importlib.machinery.FileFinder):
+            return None
+        try:
+            spec = finder.find_spec(info.name)
+        except Exception:
+            return None
+        if spec is None or not spec.has_location:
+            return None
+        return spec.origin
+
+    def walk(
+        path: str, prefix: str
+    ) -> Generator[Tuple[str, Optional[str]], None, None]:
+        try:
+            infos = list(pkgutil.iter_modules([path], prefix))
+        except OSError:
+            return
+        for info in infos:
+            basename = info.name.rpartition(".")[2]
+            if not is_identifier(basename):
+                continue
+            yield info.name, origin(info._replace(name=basename))
+            if info.ispkg:
+                yield from walk(os.path.join(path, basename), info.name + ".")
+
+    seen = set()
+    with ExcludeImplicitCwdFromPathCtx():
+        infos = list(_fast_iter_modules())
+    for info in infos:
+        if not is_identifier(info.name) or info.name in seen:
+            continue
+        seen.add(info.name)
+        yield info.name, origin(info)
+        finder = info.module_finder
+        if info.ispkg and isinstance(finder, importlib.machinery.FileFinder):
+            yield from walk(os.path.join(finder.path, info.name),
+                            info.name + ".")
+
+
 @total_ordering
 class ModuleHandle(object):
     """
@@ -411,6 +564,10 @@ class ModuleHandle(object):
         ``__file__``.  `runtime_exports` differs in always executing the
         module itself, not in executing something this never does.
 
+        The result is kept in the on-disk exports index (see
+        `_exports_index_file`), so it is computed at most once per version of
+        the source file.
+
         :rtype:
           `ImportSet` or ``None``
         :return:
@@ -420,6 +577,22 @@ class ModuleHandle(object):
         if not filename or not filename.exists:
             # Try to load the module to get the filename
             filename = Filename(self.module.__file__)  # type: ignore[arg-type]
+        names = _exports_index_lookup(
+            str(self.name), filename,
+            lambda: self._static_export_names(filename))
+        return self._exports_from_names(names)
+
+    def _static_export_names(
+        self, filename: Filename
+    ) -> Tuple[List[str], bool]:
+        """
+        Compute the names for `exports` by parsing ``filename``.
+
+        :return:
+          ``(names, indexable)``, where ``indexable`` is false if the names
+          depend on which submodules exist (a package re-exporting names it
+          imports from its submodules), not just on ``filename``.
+        """
         text = FileText(filename)
 
         ast_mod = ast.parse(str(text), str(filename)).body
@@ -431,6 +604,7 @@ class ModuleHandle(object):
         # If __all__ is defined, try to use it
         all_is_good = False  # pun intended
         all_members = []
+        indexable = True
         if "__all__" in members:
             # Iterate through the nodes and reconstruct the
             # value of __all__
@@ -476,14 +650,20 @@ class ModuleHandle(object):
                     continue
                 for n in imp_node.names:  # type: ignore[assignment]
                     m  = n.asname or n.name  # type: ignore[attr-defined]
-                    if n.name != "*" and not ModuleHandle(from_mod + m).exists:  # type: ignore[attr-defined]
+                    if n.name == "*":  # type: ignore[attr-defined]
+                        continue
+                    indexable = False
+                    if not ModuleHandle(from_mod + m).exists:
                         members.append(m)
 
         # Filter by non-private.
         members = [n for n in members if not n.startswith("_")]
 
         # Filter out artificially added "deep" members.
-        members = tuple([(n, None) for n in members if "." not in n])  # type: ignore[assignment]
+        return [n for n in members if "." not in n], indexable
+
+    def _exports_from_names(self, names: List[str]) -> Optional["ImportSet"]:
+        members = tuple((n, None) for n in names)
         if not members:
             return None
         return ImportSet(
@@ -502,6 +682,11 @@ class ModuleHandle(object):
         process, so two modules sharing a name can't both be described in one
         run; the first imported wins.
 
+        Unlike `exports`, the answer isn't kept in the exports index: it
+        depends on every module that executing this one loads (e.g. a package
+        ``__init__`` doing ``from .impl import *``), not just on this
+        module's file.
+
         :rtype:
           `ImportSet` or ``None``
         :return:
@@ -514,11 +699,7 @@ class ModuleHandle(object):
             # __dict__, not dir(): a PEP-562 __dir__ would misreport what a
             # star import binds.
             names = [n for n in vars(module) if not n.startswith("_")]
-        members = tuple((n, None) for n in names)
-        if not members:
-            return None
-        return ImportSet(
-            [ ImportStatement.from_parts(str(self.name), members) ])  # type: ignore[arg-type]
+        return self._exports_from_names(names)
 
     def get_exports(self, *, allow_exec: bool = False) -> Optional["ImportSet"]:
         """
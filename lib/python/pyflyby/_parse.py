@@ -19,8 +19,7 @@ from __future__ import annotations, print_function
 import ast
 from   ast                      import AsyncFunctionDef, TypeIgnore
 
-from   doctest                  import DocTestParser
-from   functools                import cached_property, total_ordering
+from   functools                import cache, cached_property, total_ordering
 from   itertools                import groupby
 
 from   pyflyby._file            import FilePos, FileText, Filename
@@ -819,25 +818,20 @@ class PythonBlock:
             # The ast parsing make "comments" start at the ends of the previous node,
             # so might including starting with blank lines. We never want blocks to
             # start with new liens or that messes up the formatting code that insert/count new lines.
-            while block.text.joined.startswith("\n") and block.text.joined != "\n":
-                first, *other = block.text.lines
-                assert not first.endswith('\n')
+            # Such blocks never contain an ast node, so we split them by slicing
+            # the existing text rather than constructing (and later re-parsing)
+            # new blocks from strings.
+            text = block.text
+            while text.joined.startswith("\n") and text.joined != "\n":
+                assert not block.annotated_ast_node.body, block
+                first = FileText._from_lines(
+                    ("", ""), filename=text.filename, startpos=text.startpos)
                 no_newline_blocks.append(
-                    PythonBlock(
-                        first+'\n',
-                        filename=block.filename,
-                        startpos=block.startpos,
-                        flags=block.flags,
-                    )
-                )
-                # assert block.startpos == (0,0), (block.startpos, block.text.joined)
-                # just use lines 1: here and decrease startpos ?
-                block = PythonBlock(
-                    "\n".join(other),
-                    filename=block.filename,
-                    startpos=block.startpos,
-                    flags=block.flags,
-                )
+                    cls.__construct_from_annotated_ast([], first, self.flags))
+                text = FileText._from_lines(
+                    text.lines[1:], filename=text.filename,
+                    startpos=FilePos(text.startpos.lineno + 1, 1))
+                block = cls.__construct_from_annotated_ast([], text, self.flags)
             no_newline_blocks.append(block)
 
         # Convert to statements.
@@ -965,7 +959,7 @@ class PythonBlock:
         :rtype:
           ``list`` of `PythonStatement` s
         """
-        parser = IgnoreOptionsDocTestParser()
+        parser = _ignore_options_doctest_parser_class()()
         doctest_blocks = []
         filename = self.filename
         flags = self.flags
@@ -1038,11 +1032,19 @@ class PythonBlock:
         self.__hash__ = lambda: h  # type: ignore[method-assign]
         return h
 
-class IgnoreOptionsDocTestParser(DocTestParser):
-    def _find_options(
-        self, source: str, name: str, lineno: int
-    ) -> Dict[Any, Any]:
-        # Ignore doctest options. We don't use them, and we don't want to
-        # error on unknown options, which is what the default DocTestParser
-        # does.
-        return {}
+@cache
+def _ignore_options_doctest_parser_class() -> type:
+    # doctest imports pdb and unittest, which noticeably slows down starting
+    # e.g. ``py``, so it's only imported once we look for doctests.
+    from doctest import DocTestParser
+
+    class IgnoreOptionsDocTestParser(DocTestParser):
+        def _find_options(
+            self, source: str, name: str, lineno: int
+        ) -> Dict[Any, Any]:
+            # Ignore doctest options. We don't use them, and we don't want to
+            # error on unknown options, which is what the default
+            # DocTestParser does.
+            return {}
+
+    return IgnoreOptionsDocTestParser
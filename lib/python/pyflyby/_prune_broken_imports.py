@@ -4,7 +4,11 @@ prune-broken-imports < foo.py
 
 Removes broken imports.
 
-Note: This actually executes imports.
+Note: This actually executes imports.  Each distinct import is executed once,
+in a separate process with a timeout (--timeout); imports that time out are
+kept.  Imports across all files are probed in parallel (--jobs), and results
+are cached on disk until sys.path or the imported modules change (disable
+with --no-cache).
 
 If filenames are given on the command line, rewrites them.  Otherwise, if
 stdin is not a tty, read from stdin and write to stdout.
@@ -17,8 +21,37 @@ Only top-level import statements are touched.
 # License: MIT http://opensource.org/licenses/MIT
 
 
-from   pyflyby._cmdline         import parse_args, process_actions
-from   pyflyby._imports2s       import remove_broken_imports
+from   pyflyby._cmdline         import (filename_args, hfmt, parse_args,
+                                        process_actions)
+from   pyflyby._file            import Filename
+from   pyflyby._importprobe     import DEFAULT_TIMEOUT, ImportProber
+from   pyflyby._imports2s       import (SourceToSourceFileImportsTransformation,
+                                        remove_broken_imports)
+from   pyflyby._log             import logger
+from   pyflyby._parse           import PythonBlock
+
+
+def _prefetch(prober, args):
+    """
+    Probe the imports of all files named in ``args`` at once, so that they run
+    in parallel and each distinct import is probed once.
+
+    Files that can't be read or parsed are skipped here; they are reported
+    when they are processed.
+    """
+    imports = []
+    for filename in filename_args(args, on_error=lambda filename: None):
+        if filename == Filename.STDIN:
+            continue
+        try:
+            transformer = SourceToSourceFileImportsTransformation(
+                PythonBlock(filename))
+        except Exception as e:
+            logger.debug("%s: not prefetching imports: %s", filename, e)
+            continue
+        for block in transformer.import_blocks:
+            imports.extend(block.importset.imports)
+    prober.probe(imports)
 
 
 def main():
@@ -30,9 +63,26 @@ def main():
     if not (__main__.__doc__ or '').strip():
         __main__.__doc__ = __doc__
 
-    options, args = parse_args(modify_action_params=True)
+    def addopts(parser):
+        parser.add_option("--jobs", "-j", type="int", default=0,
+                          help=hfmt('''
+                                Number of imports to probe at once.  Default:
+                                number of CPUs.'''))
+        parser.add_option("--timeout", type="float", default=DEFAULT_TIMEOUT,
+                          help=hfmt('''
+                                Seconds to wait for each import.  Imports that
+                                take longer are kept.  Default: %default.'''))
+        parser.add_option("--no-cache", dest="cache", default=True,
+                          action='store_false',
+                          help=hfmt('''
+                                Don't use the on-disk cache of probe
+                                results.'''))
+    options, args = parse_args(addopts, modify_action_params=True)
+    prober = ImportProber(jobs=options.jobs or None, timeout=options.timeout,
+                          use_cache=options.cache)
+    _prefetch(prober, args)
     def modify(x):
-        return remove_broken_imports(x, params=options.params)
+        return remove_broken_imports(x, params=options.params, prober=prober)
     process_actions(args, options.actions, modify)
 
 
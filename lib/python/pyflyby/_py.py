@@ -18,6 +18,11 @@ Invocation summary
   py [--module] modname arg1 arg2       Run a module
 
   py  --map     function arg1 arg2      Call function(arg1); function(arg2)
+  py  --jobs=N --map function arg1 arg2 ...
+                                        Same, N calls at a time in parallel
+
+  py  --server [name ...]               Serve py commands from warm workers
+  py  --client  ...                     Run a py command in the server
 
   py  -i       'function(arg1, arg2)'   Run file/code/etc, then run IPython
   py  --debug  'function(arg1, arg2)'   Debug file/code/etc
@@ -124,6 +129,35 @@ Options
                        do, since the code is about to import it anyway; without
                        it, a star import means we give up on auto-importing
                        anything else in that code.
+      --jobs=N         With --map, make up to N calls at once, in worker
+                       processes.  --jobs=0 means one per CPU.  Each call's
+                       output is printed in the order of the arguments; an
+                       error in one call doesn't stop the others, and py exits
+                       with status 1 at the end if any failed.  Ignored (calls
+                       are made one at a time) with --debug.
+      --unordered      With --jobs, print each call's output as soon as it
+                       finishes instead of in the order of the arguments.
+      --client         Run the command in the ``py --server`` listening on
+                       $PYFLYBY_PY_SOCKET (default: py-server.sock in the user
+                       cache directory), which has already imported pyflyby,
+                       loaded the import database and imported the names given
+                       to it, instead of starting from scratch.  Setting
+                       $PYFLYBY_PY_CLIENT=1 does the same for every py command
+                       while a server is running, and runs commands locally
+                       otherwise.  Commands run with --debug, -i, or no
+                       arguments always run locally.  Served commands don't
+                       start the postmortem debugger unless given
+                       --postmortem=yes.
+
+    Actions:
+
+      --server [name ...]
+                       Auto-import each name (e.g. ``np``, ``pandas``), then
+                       serve --client commands on the socket until
+                       interrupted.  Each command runs in its own freshly
+                       forked copy of the server, so commands can't affect
+                       each other.  --jobs=N sets the number of idle workers
+                       kept ready (default: one per CPU).
 
     Pseudo-actions valid before, after, or without code argument:
 
@@ -235,6 +269,16 @@ Examples
     [PYFLYBY] (lambda x: x \**2)(5)
     25
 
+  Process files in parallel, 8 at a time::
+
+    $ py --jobs=8 --map mypackage.process_file data/*.csv
+
+  Keep numpy and pandas imported for a shell loop::
+
+    $ py --server numpy pandas &
+    $ export PYFLYBY_PY_CLIENT=1
+    $ for f in *.csv; do py 'read_csv(sys.argv[1]).shape' "$f"; done
+
   Find length of string (using "-" for stdin)::
 
     $ echo hello | py len -
@@ -288,17 +332,21 @@ from __future__ import print_function
 
 import ast
 import builtins
+import contextlib
 from   contextlib               import contextmanager
+import hashlib
 import inspect
+import json
 import logging
 import os
 from   pathlib                  import Path
+import platformdirs
 import re
 from   shlex                    import quote as shquote
 import sys
 import types
 from   types                    import FunctionType, MethodType, ModuleType
-from   typing                   import Any
+from   typing                   import Any, Dict, List, Optional
 import warnings
 
 from   pyflyby._autoimp         import auto_import, find_missing_imports
@@ -312,10 +360,7 @@ from   pyflyby._dbg             import (add_debug_functions_to_builtins,
 from   pyflyby._file            import Filename, UnsafeFilenameError, which
 from   pyflyby._flags           import CompilerFlags
 from   pyflyby._idents          import is_identifier
-from   pyflyby._interactive     import (AutoImporter,
-                                        get_ipython_terminal_app_with_autoimporter,
-                                        run_ipython_line_magic,
-                                        start_ipython_with_autoimporter)
+from   pyflyby._importdb        import ImportDB
 from   pyflyby._log             import logger
 from   pyflyby._modules         import ModuleHandle
 from   pyflyby._parse           import PythonBlock
@@ -1060,6 +1105,76 @@ def auto_apply(function, commandline_args, namespace, arg_mode=None,
         _handle_user_exception()
 
 
+# State of a `py --jobs=N --map` worker process; see `_map_worker_init`.
+_map_worker = None
+
+
+def _map_worker_init(function_name, imports, arg_mode, output_mode, path,
+                     exec_star_imports, log_level):
+    """
+    Set up a worker process for `_PyMain.parallel_map`.
+
+    :param imports:
+      Import statements to execute first; the ones the parent process
+      already found it needs.
+    """
+    global _map_worker, _enable_postmortem_debugger
+    # There's no terminal to debug in.
+    _enable_postmortem_debugger = False
+    logger.setLevel(log_level)
+    namespace = _Namespace()
+    namespace.exec_star_imports = exec_star_imports
+    sys.path[:] = path
+    for imp in imports:
+        try:
+            exec(imp, namespace.globals)
+        except Exception as e:
+            # Leave it to auto-importing.
+            logger.debug("%s: %s: %s", imp, type(e).__name__, e)
+    function = UserExpr(function_name, namespace, "eval")
+    function.value
+    _map_worker = (namespace, function, arg_mode, output_mode)
+
+
+def _map_worker_call(commandline_args):
+    """
+    Call the function of this `_map_worker_init`-ed worker process on
+    ``commandline_args``, like `auto_apply` and `print_result`.
+
+    :return:
+      ``(output, error)``, where ``output`` is what was printed to stdout and
+      ``error`` is ``None`` or the formatted exception.
+    """
+    import io
+    import traceback
+    assert _map_worker is not None
+    namespace, function, arg_mode, output_mode = _map_worker
+    output = io.StringIO()
+    error = None
+    try:
+        with contextlib.redirect_stdout(output):
+            argspec = _get_argspec(function.value)
+            args, kwargs = _parse_auto_apply_args(
+                argspec, commandline_args, namespace, arg_mode=arg_mode)
+            logger.info("%s", _format_call(str(function.source), argspec,
+                                           args, kwargs))
+            result = function.value(*args, **kwargs)
+            print_result(result, output_mode)
+    except ParseError as e:
+        error = "%s: %s" % (type(e).__name__, e)
+    except SystemExit as e:
+        # As for the interpreter, only a nonzero exit status is a failure.
+        if e.code is not None and (not isinstance(e.code, int) or
+                                   e.code & 0xff):
+            error = "SystemExit: %s" % (e.code,)
+    except BaseException:
+        exc_type, exc_value, tb = sys.exc_info()
+        # Skip this frame.
+        error = "".join(traceback.format_exception(exc_type, exc_value,
+                                                   tb.tb_next))
+    return output.getvalue(), error
+
+
 class LoggedList(list):
     """
     A `list` that additionally tracks which items have not yet been accessed.
@@ -1345,6 +1460,140 @@ def _as_filename_if_seems_like_filename(arg):
     return None
 
 
+_MODULE_PROBE_CACHE_MAX_ENTRIES = 256
+
+
+def _module_probe_cache_file(name: str) -> Optional[Path]:
+    """
+    Return the path of the on-disk cache entry recording whether ``name`` is
+    a module with a source file, or ``None`` if ``$PYFLYBY_DISABLE_CACHE`` is
+    set.
+
+    Entries are keyed by the name, the working directory, ``sys.path`` and the
+    python version.  Each entry also records the ``st_mtime_ns`` of the
+    directories that were searched for the module (see
+    `_module_probe_cache_store`), and is only used while those are unchanged,
+    so creating or removing a module re-probes it.  At most
+    `_MODULE_PROBE_CACHE_MAX_ENTRIES` entries are kept.
+    """
+    if os.environ.get("PYFLYBY_DISABLE_CACHE", "0") == "1":
+        return None
+    key = "\0".join([name, os.getcwd(), sys.version] + sys.path)
+    digest = hashlib.sha256(key.encode("utf-8", "surrogateescape")).hexdigest()
+    cache_dir = Path(
+        platformdirs.user_cache_dir(appname='pyflyby', appauthor=False)
+    )
+    return cache_dir / "module_probes" / ("%s.json" % (digest,))
+
+
+def _dir_mtimes(dirs: List[str]) -> Dict[str, Optional[int]]:
+    result: Dict[str, Optional[int]] = {}
+    for d in dirs:
+        try:
+            result[d] = os.stat(d).st_mtime_ns
+        except OSError:
+            result[d] = None
+    return result
+
+
+def _module_probe_cache_lookup(name: str) -> Optional[bool]:
+    """
+    Return whether ``name`` is a module with a source file according to the
+    on-disk cache, or ``None`` if there's no valid entry.
+    """
+    path = _module_probe_cache_file(name)
+    if path is None:
+        return None
+    try:
+        with open(path) as fp:
+            entry = json.load(fp)
+        if entry["name"] != name:
+            return None
+        dirs = entry["dirs"]
+        filename = entry["filename"]
+        if _dir_mtimes(list(dirs)) != dirs:
+            return None
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+    if filename is not None and not os.path.exists(filename):
+        return None
+    return filename is not None
+
+
+def _module_probe_cache_store(module: ModuleHandle,
+                              filename: Optional[Filename]) -> None:
+    """
+    Record in the on-disk cache whether ``module`` has a source file.
+
+    The parent package must already be imported.  Failures to write are
+    logged and otherwise ignored.
+    """
+    name = str(module.name)
+    path = _module_probe_cache_file(name)
+    if path is None:
+        return
+    dirs = [d or "." for d in sys.path]
+    if module.parent:
+        parent = sys.modules.get(str(module.parent.name))
+        parent_dirs = list(getattr(parent, "__path__", None) or [])
+        parent_file = getattr(parent, "__file__", None)
+        if not parent_dirs and parent_file:
+            parent_dirs = [os.path.dirname(parent_file)]
+        if not parent_dirs:
+            # Nothing to check the entry against later.
+            return
+        # A package of the same name appearing earlier on sys.path would
+        # shadow the one we searched.  That changes the mtime of the sys.path
+        # directory, or of the top-level package directory in it if there
+        # already was one (e.g. a namespace package portion).
+        top = name.split(".", 1)[0]
+        dirs += [os.path.join(d, top) for d in dirs] + parent_dirs
+    entry = {"name": name,
+             "filename": str(filename) if filename else None,
+             "dirs": _dir_mtimes(dirs)}
+    tmp = path.with_name("%s.tmp.%s" % (path.name, os.getpid()))
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, 'w') as fp:
+            json.dump(entry, fp)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.debug("Couldn't write module probe cache entry %s: %s", path, e)
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        return
+    _prune_module_probe_cache(path.parent)
+
+
+def _prune_module_probe_cache(cache_dir: Path) -> None:
+    """
+    Remove the least recently written entries beyond
+    `_MODULE_PROBE_CACHE_MAX_ENTRIES` from ``cache_dir``.
+    """
+    entries = []
+    try:
+        with os.scandir(cache_dir) as it:
+            for e in it:
+                if not e.name.endswith(".json"):
+                    continue
+                try:
+                    entries.append((e.stat().st_mtime_ns, e.path))
+                except OSError:
+                    pass
+    except OSError:
+        return
+    if len(entries) <= _MODULE_PROBE_CACHE_MAX_ENTRIES:
+        return
+    entries.sort()
+    for _, filename in entries[:-_MODULE_PROBE_CACHE_MAX_ENTRIES]:
+        try:
+            os.unlink(filename)
+        except OSError:
+            pass
+
+
 def _has_python_shebang(filename):
     """
     Return whether the first line contains #!...python...
@@ -1544,9 +1793,12 @@ class _Namespace(object):
         self.fake_main.__dict__.setdefault("__builtins__", builtins)
         self.globals = self.fake_main.__dict__
         self.autoimported = {}
+        # Imports done so far, in order; see `_map_worker_init`.
+        self.imports = []
 
     def auto_import(self, arg):
         return auto_import(arg, [self.globals], autoimported=self.autoimported,
+                           post_import_hook=self.imports.append,
                            exec_star_imports=self.exec_star_imports)
 
     def auto_eval(self, block, mode=None, info=False, auto_import=True,
@@ -1677,6 +1929,66 @@ class _PyMain(object):
         print_result(result, output_mode)
         self.result = result
 
+    def parallel_map(self, function_name, function, cmd_args_list):
+        """
+        Call ``function`` on each of ``cmd_args_list`` in `self.jobs` worker
+        processes, like calling `apply` on each.
+
+        Workers can't be sent the function itself (it may be a lambda), so
+        each evaluates ``function_name`` on its own, after doing the imports
+        we've already done here, so that it needn't work them out again.
+        The output of each call is captured and printed here, in the order
+        of the arguments (or as they finish, if `self.unordered`).  A failed
+        call doesn't stop the others; its error is printed in its place, and
+        we exit with status 1 at the end.
+        """
+        from   concurrent.futures       import (ProcessPoolExecutor,
+                                                as_completed)
+        import traceback
+        # Evaluate the function here first, both to fail early and to
+        # collect the imports it needs.
+        if not callable(function.value):
+            raise NotAFunctionError("Not a function", function.value)
+        arg_mode = _interpret_arg_mode(self.arg_mode, default="auto")
+        output_mode = _interpret_output_mode(self.output_mode)
+        if output_mode == "exit":
+            raise ValueError("--output=exit isn't supported with --jobs")
+        imports = [str(imp) for imp in self.namespace.imports]
+        jobs = min(self.jobs, len(cmd_args_list))
+        logger.debug("Calling %s on %d arguments in %d processes",
+                     function_name, len(cmd_args_list), jobs)
+        failed = []
+        executor = ProcessPoolExecutor(
+            max_workers=jobs, initializer=_map_worker_init,
+            initargs=(function_name, imports, arg_mode, output_mode,
+                      list(sys.path), self.namespace.exec_star_imports,
+                      logger.level))
+        with executor:
+            futures = {
+                executor.submit(_map_worker_call, cmd_args): cmd_args
+                for cmd_args in cmd_args_list}
+            if self.unordered:
+                done = as_completed(futures)
+            else:
+                done = iter(futures)
+            for future in done:
+                cmd_args = futures[future]
+                try:
+                    output, error = future.result()
+                except Exception:
+                    output = ""
+                    error = traceback.format_exc()
+                sys.stdout.write(output)
+                sys.stdout.flush()
+                if error is not None:
+                    failed.append(cmd_args[-1])
+                    logger.error("Failed on %s:\n%s", cmd_args[-1],
+                                 error.rstrip())
+        if failed:
+            logger.error("%d of %d calls failed: %s", len(failed),
+                         len(cmd_args_list), " ".join(failed))
+            raise SystemExit(1)
+
     def _seems_like_runnable_module(self, arg):
         if not is_identifier(arg, dotted=True):
             # It's not a single (dotted) identifier.
@@ -1685,6 +1997,15 @@ class _PyMain(object):
             # It's off of a builtin, e.g. "str.upper"
             return False
         m = ModuleHandle(arg)
+        # Looking for the module means searching the directories on sys.path
+        # (or its parent package's), so remember the answer across runs.
+        # Whether a file named ``arg`` exists is checked by the caller on
+        # every run.
+        cached = _module_probe_cache_lookup(arg)
+        if cached is False:
+            logger.debug("Module %s doesn't have a source filename (cached)",
+                         m)
+            return False
         if m.parent:
             # Auto-import the parent, which is necessary in order to get the
             # filename of the module.  ``ModuleHandle.filename`` does this
@@ -1692,7 +2013,11 @@ class _PyMain(object):
             # the import of the parent module.
             if not self.namespace.auto_import(str(m.parent.name)):
                 return False
-        if not m.filename:
+        if cached:
+            return True
+        filename = m.filename
+        _module_probe_cache_store(m, filename)
+        if not filename:
             logger.debug("Module %s doesn't have a source filename", m)
             return False
         # TODO: check that the source accesses __main__ (ast traversal?)
@@ -1818,17 +2143,32 @@ class _PyMain(object):
         usage = _get_help(expr, verbosity)
         print(usage)
 
+    def _interactive(self):
+        """
+        Import and return `pyflyby._interactive`.
+
+        It's imported only by the actions that run IPython, since importing
+        it takes longer than a simple ``py`` command takes to run.
+        """
+        from pyflyby import _interactive
+        # Also applies to any IPython session we start; set on the class
+        # since the app may not exist yet.
+        _interactive.AutoImporter.exec_star_imports = (
+            self.namespace.exec_star_imports)
+        return _interactive
+
     def create_ipython_app(self):
         """
         Create an IPython application and initialize it, but don't start it.
         """
         assert self.ipython_app is None
-        self.ipython_app = get_ipython_terminal_app_with_autoimporter()
+        self.ipython_app = (
+            self._interactive().get_ipython_terminal_app_with_autoimporter())
 
     def start_ipython(self, args=[]):
         user_ns = self.namespace.globals
-        start_ipython_with_autoimporter(args, _user_ns=user_ns,
-                                        app=self.ipython_app)
+        self._interactive().start_ipython_with_autoimporter(
+            args, _user_ns=user_ns, app=self.ipython_app)
         # Don't need to do another interactive session after this one
         # (i.e. make 'py --interactive' the same as 'py').
         self.interactive = False
@@ -1841,6 +2181,12 @@ class _PyMain(object):
         self.verbosity   = 1
         self.arg_mode    = None
         self.output_mode = None
+        self.jobs        = None
+        self.unordered   = False
+        # `_pyserver.CLIENT_ENV`; importing _pyserver here would slow down
+        # every run.
+        self.client      = os.environ.get("PYFLYBY_PY_CLIENT") == "1"
+        self.client_explicit = False
         postmortem = 'auto'
         while args:
             arg = args[0]
@@ -1947,16 +2293,102 @@ class _PyMain(object):
                 novalue()
                 self.namespace.exec_star_imports = not argname.startswith("no")
                 continue
+            if argname in ["client"]:
+                del args[0]
+                novalue()
+                self.client = self.client_explicit = True
+                continue
+            if self._parse_map_opt(args):
+                continue
             break
         self.args = args
-        # Also applies to any IPython session we start; set on the class
-        # since the app may not exist yet.
-        AutoImporter.exec_star_imports = self.namespace.exec_star_imports
         if postmortem == "auto":
             postmortem = os.isatty(1)
         global _enable_postmortem_debugger
         _enable_postmortem_debugger = postmortem
 
+    def _parse_map_opt(self, args):
+        """
+        If ``args[0]`` is one of the options for --map (--jobs, --unordered),
+        then remove it (and its value) from ``args`` and return ``True``.
+        """
+        if not args[0].startswith("-"):
+            return False
+        argname, equalsign, value = args[0].lstrip("-").partition("=")
+        if argname in ["jobs"]:
+            del args[0]
+            if not equalsign:
+                try:
+                    value = args.pop(0)
+                except IndexError:
+                    raise ValueError("expected argument to --%s" % (argname,))
+            try:
+                jobs = int(value)
+            except ValueError:
+                raise ValueError("--%s: expected a number of jobs, got %r"
+                                 % (argname, value))
+            if jobs < 0:
+                raise ValueError("--%s: expected a number of jobs, got %r"
+                                 % (argname, value))
+            self.jobs = jobs or os.cpu_count() or 1
+            return True
+        if argname in ["unordered"]:
+            if equalsign:
+                raise ValueError("unexpected argument %s" % (args[0],))
+            del args[0]
+            self.unordered = True
+            return True
+        return False
+
+    def run_client(self):
+        """
+        Run the command in a ``py --server`` and exit with its status.  Return
+        if it should run here instead: with --debug, -i or no arguments, and,
+        unless --client was given, when no server is running.
+        """
+        runs_here = (not self.args or self.debug or self.interactive
+                     or self.args[0] in ["--server", "-server"])
+        if runs_here:
+            if self.client_explicit:
+                raise ValueError(
+                    "--client can't be used with --debug, -i, --server, "
+                    "or no command")
+            return
+        from   pyflyby._pyserver        import (ServerUnavailableError,
+                                                run_in_server)
+        # Pass on the global options, except --client itself.
+        n_global_opts = len(self.main_args) - len(self.args)
+        args = [a for a in self.main_args[:n_global_opts]
+                if a not in ["--client", "-client"]] + self.args
+        try:
+            status = run_in_server(args)
+        except ServerUnavailableError as e:
+            if self.client_explicit:
+                logger.error("--client: %s", e)
+                raise SystemExit(1)
+            logger.debug("%s; running locally", e)
+            return
+        raise SystemExit(status)
+
+    def run_server(self, names):
+        """
+        Auto-import ``names``, then serve ``py --client`` commands.
+        """
+        from   pyflyby._pyserver        import ServerAlreadyRunningError, serve
+        def warm():
+            ImportDB.get_default(".")
+            if names:
+                self.namespace.auto_import("\n".join(names))
+        def main(args):
+            # The postmortem debugger would use the server's terminal, not
+            # the client's.
+            _PyMain(["--postmortem=no"] + args).run()
+        try:
+            serve(main, workers=self.jobs, warm=warm)
+        except ServerAlreadyRunningError as e:
+            logger.error("--server: %s", e)
+            raise SystemExit(1)
+
     def _enable_debug_tools(self, *, add_deprecated: bool):
         # Enable a bunch of debugging tools.
         enable_faulthandler()
@@ -1968,6 +2400,8 @@ class _PyMain(object):
         # Parse global options.
         sys.orig_argv = list(sys.argv)
         self._parse_global_opts()
+        if self.client:
+            self.run_client()
         self._enable_debug_tools(add_deprecated=self.add_deprecated_builtins)
         self._run_action()
         self._pre_exit()
@@ -2048,14 +2482,28 @@ class _PyMain(object):
             #      py --map '_**2' 3 4 5
             # when using heuristic mode, "lock in" the action mode on the
             # first argument.
+            if not equalsign:
+                # Also accept --jobs etc. right after --map.
+                while args and self._parse_map_opt(args):
+                    pass
             function_name = popcmdarg()
             function = UserExpr(function_name, self.namespace, "eval")
             if args and args[0] == '--':
-                for arg in args[1:]:
-                    self.apply(function, ['--', arg])
+                cmd_args_list = [['--', arg] for arg in args[1:]]
+            else:
+                cmd_args_list = [[arg] for arg in args]
+            if self.jobs is not None and self.jobs > 1 and self.debug:
+                logger.info("Ignoring --jobs=%d since --debug is on",
+                            self.jobs)
+            if (self.jobs is None or self.jobs <= 1 or self.debug
+                or len(cmd_args_list) <= 1):
+                for cmd_args in cmd_args_list:
+                    self.apply(function, cmd_args)
             else:
-                for arg in args:
-                    self.apply(function, [arg])
+                self.parallel_map(function_name, function, cmd_args_list)
+        elif action in ["server"]:
+            nocmdarg()
+            self.run_server(args)
         elif action in ["xargs"]:
             # TODO: read lines from stdin and map.  default arg_mode=string
             raise NotImplementedError("TODO: xargs")
@@ -2107,21 +2555,24 @@ class _PyMain(object):
             # Start IPython nbconvert.  (autoimporter is irrelevant.)
             if equalsign:
                 args.insert(0, cmdarg)
-            start_ipython_with_autoimporter(["nbconvert"] + args)
+            self._interactive().start_ipython_with_autoimporter(
+                ["nbconvert"] + args)
         elif action in ["timeit"]:
             # TODO: make --timeit and --time flags which work with any mode
             # and heuristic, instead of only eval.
             # TODO: fallback if IPython isn't available.  above todo probably
             # requires not using IPython anyway.
             nocmdarg()
-            run_ipython_line_magic("%timeit " + ' '.join(args))
+            self._interactive().run_ipython_line_magic(
+                "%timeit " + ' '.join(args))
         elif action in ["time"]:
             # TODO: make --timeit and --time flags which work with any mode
             # and heuristic, instead of only eval.
             # TODO: fallback if IPython isn't available.  above todo probably
             # requires not using IPython anyway.
             nocmdarg()
-            run_ipython_line_magic("%time " + ' '.join(args))
+            self._interactive().run_ipython_line_magic(
+                "%time " + ' '.join(args))
         elif action in ["version"]:
             if equalsign:
                 args.insert(0, cmdarg)
@@ -2159,7 +2610,8 @@ class _PyMain(object):
             self.print_help(arg0[:-1], verbosity=1)
 
         elif arg0.startswith("%"):
-            run_ipython_line_magic(' '.join([arg0]+args))
+            self._interactive().run_ipython_line_magic(
+                ' '.join([arg0]+args))
 
         # Heuristically choose the behavior automatically based on what the
         # argument looks like.
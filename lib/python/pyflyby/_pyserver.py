@@ -0,0 +1,321 @@
+# pyflyby/_pyserver.py.
+# License: MIT http://opensource.org/licenses/MIT
+
+"""
+Serve ``py`` commands from warm, preforked worker processes.
+
+``py --server`` does the expensive parts of starting ``py`` once -- importing
+pyflyby, loading the import database, and auto-importing whatever heavy
+libraries it's told to -- and then listens on a unix socket.  ``py --client``
+(or any ``py`` with ``$PYFLYBY_PY_CLIENT=1``) sends its arguments, working
+directory, environment, ``sys.path`` and stdin/stdout/stderr file descriptors
+to the server instead of running them itself, and exits with the command's
+status.  Modules the server had already imported are used as they are, even
+if the client's ``sys.path`` would find a different version.
+
+The server keeps a pool of forked worker processes waiting in ``accept()``.
+Each worker runs exactly one command and then exits, so commands are isolated
+from each other and from the server: they start from a copy-on-write copy of
+the warm server, and nothing they import or change leaks into the next one.
+The server forks a replacement whenever a worker exits.
+
+The socket is ``$PYFLYBY_PY_SOCKET``, by default ``py-server.sock`` in the
+user cache directory.  It is only accessible to the user running the server.
+"""
+
+from __future__ import annotations
+
+import atexit
+import io
+import json
+import os
+import platformdirs
+import signal
+import socket
+import struct
+import sys
+import traceback
+from   typing                   import Any, Callable, Dict, List, Optional, Set
+
+from   pyflyby._log             import logger
+
+
+CLIENT_ENV = "PYFLYBY_PY_CLIENT"
+"""
+Environment variable which, if set to ``1``, makes ``py`` commands run in a
+``py --server`` when one is running.
+"""
+
+SOCKET_ENV = "PYFLYBY_PY_SOCKET"
+"""
+Environment variable which overrides the server socket path.
+"""
+
+# Signals that the client passes on to the worker running its command.
+_FORWARDED_SIGNALS = [signal.SIGINT, signal.SIGTERM, signal.SIGHUP]
+
+
+class ServerUnavailableError(Exception):
+    """
+    No ``py --server`` is listening on the socket.
+    """
+
+
+class ServerAlreadyRunningError(Exception):
+    """
+    Another ``py --server`` is already listening on the socket.
+    """
+
+
+def default_socket_path() -> str:
+    """
+    Return the path of the server socket: ``$PYFLYBY_PY_SOCKET``, or
+    ``py-server.sock`` in the user cache directory.
+    """
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    return os.path.join(
+        platformdirs.user_cache_dir(appname='pyflyby', appauthor=False),
+        "py-server.sock")
+
+
+def _send_message(conn: socket.socket, message: Dict[str, Any]) -> None:
+    conn.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+def _exit_status(code: Any) -> int:
+    """
+    Turn a ``SystemExit.code`` into an exit status the way the interpreter
+    does, printing non-integer codes to stderr.
+    """
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code & 0xff
+    print(code, file=sys.stderr)
+    return 1
+
+
+def run_in_server(args: List[str], socket_path: Optional[str] = None) -> int:
+    """
+    Run the ``py`` command with arguments ``args`` in the server listening on
+    ``socket_path``, with this process's working directory, environment and
+    standard file descriptors.  Signals sent to this process while the
+    command runs are passed on to it.
+
+    :return:
+      The exit status of the command.
+    :raise ServerUnavailableError:
+      No server is listening on ``socket_path``.
+    """
+    if socket_path is None:
+        socket_path = default_socket_path()
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+    except OSError as e:
+        conn.close()
+        raise ServerUnavailableError(
+            "no py server at %s: %s" % (socket_path, e.strerror)) from None
+    sys.stdout.flush()
+    sys.stderr.flush()
+    old_handlers: Dict[signal.Signals, Any] = {}
+    try:
+        with conn, conn.makefile("rb") as rfile:
+            socket.send_fds(conn, [b"\0"], [0, 1, 2])
+            _send_message(conn, {
+                "args"     : list(args),
+                "orig_argv": list(getattr(sys, "orig_argv", sys.argv)),
+                "cwd"      : os.getcwd(),
+                "env"      : dict(os.environ),
+                "path"     : list(sys.path),
+            })
+            for line in rfile:
+                message = json.loads(line)
+                if "pid" in message:
+                    pid = message["pid"]
+                    def forward(signum, frame, pid=pid):
+                        try:
+                            os.kill(pid, signum)
+                        except ProcessLookupError:
+                            pass
+                    for signum in _FORWARDED_SIGNALS:
+                        old_handlers[signum] = signal.signal(signum, forward)
+                elif "exit" in message:
+                    return message["exit"]
+    finally:
+        for signum, handler in old_handlers.items():
+            signal.signal(signum, handler)
+    logger.error("py server worker exited without finishing the command")
+    return 1
+
+
+def _listen(socket_path: str) -> socket.socket:
+    """
+    Create the server socket, replacing a stale one left by a server that
+    died.
+    """
+    os.makedirs(os.path.dirname(socket_path) or ".", mode=0o700,
+                exist_ok=True)
+    if os.path.exists(socket_path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            os.unlink(socket_path)
+        else:
+            raise ServerAlreadyRunningError(
+                "a py server is already running at %s" % (socket_path,))
+        finally:
+            probe.close()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        sock.bind(socket_path)
+    finally:
+        os.umask(old_umask)
+    sock.listen(128)
+    return sock
+
+
+def _peer_is_us(conn: socket.socket) -> bool:
+    if not hasattr(socket, "SO_PEERCRED"):
+        # The socket's permissions are all we have.
+        return True
+    fmt = "3i"
+    _, uid, _ = struct.unpack(
+        fmt, conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                             struct.calcsize(fmt)))
+    return uid == os.getuid()
+
+
+def _run_worker(sock: socket.socket, main: Callable[[List[str]], Any]) -> int:
+    """
+    In a freshly forked worker: wait for one command, run it, and report its
+    exit status to the client.
+
+    :return:
+      Our exit status.
+    """
+    os.setsid()
+    # Handlers the server registered (e.g. while warming up) are its own.
+    atexit._clear()
+    for signum in [signal.SIGTERM, signal.SIGHUP, signal.SIGCHLD]:
+        signal.signal(signum, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    conn, _ = sock.accept()
+    sock.close()
+    if not _peer_is_us(conn):
+        return 1
+    _, fds, _, _ = socket.recv_fds(conn, 1, 3)
+    with conn.makefile("rb") as rfile:
+        line = rfile.readline()
+    if len(fds) != 3 or not line:
+        return 1
+    message = json.loads(line)
+    _send_message(conn, {"pid": os.getpid()})
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    if isinstance(sys.stdout, io.TextIOWrapper):
+        sys.stdout.reconfigure(line_buffering=sys.stdout.isatty())
+    os.chdir(message["cwd"])
+    os.environ.clear()
+    os.environ.update(message["env"])
+    # The command is already running in the server.
+    os.environ.pop(CLIENT_ENV, None)
+    logger.setLevel((os.getenv("PYFLYBY_LOG_LEVEL") or "INFO").upper())
+    # The client's sys.path reflects its $PYTHONPATH, virtualenv etc.
+    sys.path[:] = message["path"]
+    sys.orig_argv = message["orig_argv"]
+    sys.argv = message["orig_argv"][:1] + message["args"]
+    try:
+        main(message["args"])
+        status = 0
+    except SystemExit as e:
+        status = _exit_status(e.code)
+    except KeyboardInterrupt:
+        traceback.print_exc()
+        status = 128 + signal.SIGINT
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    try:
+        atexit._run_exitfuncs()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        _send_message(conn, {"exit": status})
+    return status
+
+
+def serve(main: Callable[[List[str]], Any], socket_path: Optional[str] = None,
+          workers: Optional[int] = None,
+          warm: Optional[Callable[[], Any]] = None) -> None:
+    """
+    Run a ``py`` server until it's interrupted or terminated.
+
+    :param main:
+      Function that runs a ``py`` command given its arguments.  Called in a
+      worker process, with the client's working directory, environment and
+      standard file descriptors.
+    :param socket_path:
+      Where to listen.  Defaults to `default_socket_path`.
+    :param workers:
+      Number of idle workers to keep waiting for commands.  Defaults to the
+      number of CPUs.
+    :param warm:
+      Function called once before the first worker is forked, to do work
+      (e.g. imports) that every command should find already done.
+    :raise ServerAlreadyRunningError:
+      Another server is listening on ``socket_path``.
+    """
+    if socket_path is None:
+        socket_path = default_socket_path()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    sock = _listen(socket_path)
+    inode = os.stat(socket_path).st_ino
+    def terminate(signum, frame):
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, terminate)
+    signal.signal(signal.SIGHUP, terminate)
+    pids: Set[int] = set()
+    try:
+        # Clients that connect meanwhile wait for the first workers.
+        if warm is not None:
+            warm()
+        logger.info("Serving py commands at %s with %d workers",
+                    socket_path, workers)
+        while True:
+            while len(pids) < workers:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                pid = os.fork()
+                if pid == 0:
+                    status = 1
+                    try:
+                        status = _run_worker(sock, main)
+                    except BaseException:
+                        traceback.print_exc()
+                    finally:
+                        os._exit(status)
+                pids.add(pid)
+            pid, _ = os.wait()
+            pids.discard(pid)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        sock.close()
+        try:
+            # Don't remove a socket that a newer server has replaced ours with.
+            if os.stat(socket_path).st_ino == inode:
+                os.unlink(socket_path)
+        except OSError:
+            pass
@@ -7,22 +7,34 @@ Checkout the doc of the `saveframe` function for more info.
 
 from __future__ import annotations, print_function
 
-from   contextlib               import contextmanager
-from   dataclasses              import dataclass
+from   collections              import deque
+from   concurrent.futures       import Future, ThreadPoolExecutor
+from   contextlib               import contextmanager, nullcontext
+from   dataclasses              import dataclass, replace
 from   enum                     import Enum
+from   functools                import partial
+import gzip
+import hashlib
 import inspect
+import io
+import itertools
+import json
 import keyword
 import linecache
 import logging
+import lzma
 import os
 import pickle
 import re
 import stat
+import struct
 import sys
+import time
 import traceback
 import types
-from   typing                   import (Any, Dict, Iterator, List, Optional,
-                                        Tuple, Union)
+from   typing                   import (Any, Callable, Deque, Dict, Iterator,
+                                        List, Optional, Tuple, Union)
+import zlib
 
 """
 The protocol used while pickling the frame's data.
@@ -41,6 +53,52 @@ provide one.
 """
 DEFAULT_FILENAME = 'saveframe.pkl'
 
+"""
+Magic bytes at the start and at the end of a file in the indexed saveframe
+format (see `_SaveframeWriter`). Files written by older versions of pyflyby are
+a single pickle, which can't start with these bytes.
+"""
+SAVEFRAME_MAGIC = b"\x89PYFLYBY-SAVEFRAME\n"
+
+"""
+The version of the indexed saveframe format written by this module.
+Version 2 added out-of-band buffers, version 3 compression and skipped
+variables, version 4 snapshot series.
+"""
+SAVEFRAME_FORMAT_VERSION = 4
+
+"""
+The trailer of a file in the indexed saveframe format: the offset and the length
+of the index, followed by `SAVEFRAME_MAGIC`.
+"""
+SAVEFRAME_TRAILER = struct.Struct("<QQ")
+
+"""
+Contiguous buffers of at least this many bytes (e.g. the data of large NumPy
+arrays) are pickled out-of-band: they are written to the file as they are,
+without being copied into the pickle byte stream.
+"""
+OUT_OF_BAND_BUFFER_MIN_SIZE = 64 * 1024
+
+"""
+The alignment, in bytes, of out-of-band buffers in the file, so that arrays
+memory-mapped by `SaveframeReader` are suitably aligned for any dtype.
+"""
+OUT_OF_BAND_BUFFER_ALIGNMENT = 64
+
+"""
+The compression algorithms supported for the data saved by the 'saveframe'
+utility. 'gzip' and 'lzma' use the standard library, 'zstd' requires Python
+3.14+ or the 'zstandard' package, and 'lz4' requires the 'lz4' package.
+"""
+COMPRESSION_ALGORITHMS = ('gzip', 'lzma', 'zstd', 'lz4')
+
+"""
+The size of the chunks fed to the compressor, so that compressing a large
+value never needs more than one chunk of compressed output in memory.
+"""
+_COMPRESSION_CHUNK_SIZE = 1 << 20
+
 
 @dataclass
 class ExceptionInfo:
@@ -55,6 +113,175 @@ class ExceptionInfo:
     traceback: Union[List[str], str]
 
 
+class _LZ4Compressor:
+    """
+    Adapter giving ``lz4.frame.LZ4FrameCompressor`` the ``compress`` / ``flush``
+    interface of the standard library compressors.
+    """
+
+    def __init__(self) -> None:
+        import lz4.frame  # type: ignore[import-not-found]
+        self._compressor = lz4.frame.LZ4FrameCompressor()
+        self._header = self._compressor.begin()
+
+    def compress(self, data: Any) -> bytes:
+        header, self._header = self._header, b""
+        return header + self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        header, self._header = self._header, b""
+        return header + self._compressor.flush()
+
+
+def _get_compressor(compression: str) -> Any:
+    """
+    Get a new incremental compressor for ``compression``.
+
+    :param compression:
+      One of `COMPRESSION_ALGORITHMS`.
+    :return:
+      An object with ``compress(data)`` and ``flush()`` methods returning the
+      compressed bytes.
+    """
+    if compression == 'gzip':
+        return zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    if compression == 'lzma':
+        return lzma.LZMACompressor()
+    if compression == 'zstd':
+        try:
+            from compression import zstd  # type: ignore[import-not-found]
+            return zstd.ZstdCompressor()
+        except ImportError:
+            import zstandard  # type: ignore[import-not-found]
+            return zstandard.ZstdCompressor().compressobj()
+    if compression == 'lz4':
+        return _LZ4Compressor()
+    raise ValueError(f"Unsupported compression: {compression!a}")
+
+
+def _decompress(compression: str, data: Any) -> bytes:
+    """
+    Decompress ``data`` compressed with a compressor from `_get_compressor`.
+    """
+    if compression == 'gzip':
+        return gzip.decompress(data)
+    if compression == 'lzma':
+        return lzma.decompress(data)
+    if compression == 'zstd':
+        try:
+            from compression import zstd  # type: ignore[import-not-found]
+            return zstd.decompress(data)
+        except ImportError:
+            import zstandard  # type: ignore[import-not-found]
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    if compression == 'lz4':
+        import lz4.frame  # type: ignore[import-not-found]
+        return lz4.frame.decompress(data)
+    raise ValueError(f"Unsupported compression: {compression!a}")
+
+
+class _PickleSizeLimitExceeded(Exception):
+    """
+    Raised when the pickled size of a value exceeds the allowed size.
+    """
+
+
+class _SizeLimitedBytesIO(io.BytesIO):
+    """
+    A ``BytesIO`` which reports the size of each write to a callback, which may
+    raise `_PickleSizeLimitExceeded` to stop the pickling early.
+    """
+
+    def __init__(self, add_size: Any) -> None:
+        super().__init__()
+        self._add_size = add_size
+
+    def write(self, data: Any) -> int:
+        self._add_size(memoryview(data).nbytes)
+        return super().write(data)
+
+
+@dataclass
+class PickledValue:
+    """
+    A dataclass to store a pickled value: the pickle byte stream and the
+    out-of-band buffers it refers to.
+    """
+    data: bytes
+    buffers: List[pickle.PickleBuffer]
+    # The size of the pickle byte stream and the out-of-band buffers, before
+    # compression.
+    nbytes: int
+    # Whether ``data`` and ``buffers`` are already compressed.
+    compressed: bool = False
+    # The content hash of the pickled value (before compression), if computed.
+    sha256: Optional[str] = None
+
+
+def _hash_pickled_value(value: PickledValue) -> str:
+    """
+    Compute the content hash of the pickle byte stream and the out-of-band
+    buffers of ``value``, before compression.
+    """
+    assert not value.compressed
+    digest = hashlib.sha256()
+    for part in [value.data] + [buffer.raw() for buffer in value.buffers]:
+        with memoryview(part) as view:
+            digest.update(struct.pack("<Q", view.nbytes))
+            digest.update(view)
+    return digest.hexdigest()
+
+
+def _read_trailer(read: Callable[[int, int], bytes],
+                  file_size: int) -> Tuple[int, int]:
+    """
+    Read the trailer of a file in the indexed saveframe format.
+
+    :param read:
+      A function returning the bytes of the file at an offset and length.
+    :param file_size:
+      The size of the file.
+    :raise ValueError:
+      If the file doesn't end with a valid trailer.
+    :return:
+      The offset and length of the latest index.
+    """
+    trailer_size = SAVEFRAME_TRAILER.size + len(SAVEFRAME_MAGIC)
+    if (file_size < len(SAVEFRAME_MAGIC) + trailer_size or
+            read(file_size - len(SAVEFRAME_MAGIC), len(SAVEFRAME_MAGIC))
+            != SAVEFRAME_MAGIC):
+        raise ValueError("missing trailer")
+    index_offset, index_length = SAVEFRAME_TRAILER.unpack(
+        read(file_size - trailer_size, SAVEFRAME_TRAILER.size))
+    if index_offset + index_length > file_size - trailer_size:
+        raise ValueError("invalid index range")
+    return index_offset, index_length
+
+
+def _read_indexes(read: Callable[[int, int], bytes],
+                  file_size: int) -> Iterator[Dict[str, Any]]:
+    """
+    Read the indexes of the snapshots of a file in the indexed saveframe format,
+    from the latest to the first one.
+
+    :param read:
+      A function returning the bytes of the file at an offset and length.
+    :param file_size:
+      The size of the file.
+    :raise ValueError:
+      If the file is truncated or corrupt.
+    """
+    index_offset, index_length = _read_trailer(read, file_size)
+    while True:
+        index = json.loads(read(index_offset, index_length))
+        yield index
+        previous_index = index.get('previous_index')
+        if previous_index is None:
+            return
+        index_offset = previous_index['offset']
+        index_length = previous_index['length']
+
+
 @dataclass
 class FrameMetadata:
     """
@@ -116,13 +343,16 @@ def _open_file(filename: str, mode: str) -> Iterator[Any]:
     :param filename:
       The file to open.
     :param mode:
-      Mode in which to open the file.
+      Mode in which to open the file. With '+', the file is opened for reading
+      and writing, and is not truncated.
     """
     old_umask = os.umask(0)
     fd = None
     file_obj = None
+    flags = (os.O_RDWR | os.O_CREAT if '+' in mode
+             else os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
     try:
-        fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, FILE_PERMISSION)
+        fd = os.open(filename, flags, FILE_PERMISSION)
         file_obj = os.fdopen(fd, mode)
         yield file_obj
     finally:
@@ -133,6 +363,238 @@ def _open_file(filename: str, mode: str) -> Iterator[Any]:
         os.umask(old_umask)
 
 
+@contextmanager
+def _append_guard(file_obj: Any) -> Iterator[None]:
+    """
+    A context manager to append a snapshot to the series in ``file_obj``.
+
+    It locks the file (where ``fcntl`` is available) so that concurrent
+    ``saveframe`` calls, e.g. in background processes, append one at a time,
+    and truncates the file back to its original size on error so that the
+    earlier snapshots remain readable.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None  # type: ignore[assignment]
+    if fcntl is not None:
+        fcntl.flock(file_obj.fileno(), fcntl.LOCK_EX)
+    try:
+        file_size = file_obj.seek(0, os.SEEK_END)
+        try:
+            yield
+        except BaseException:
+            file_obj.truncate(file_size)
+            raise
+    finally:
+        if fcntl is not None:
+            file_obj.flush()
+            fcntl.flock(file_obj.fileno(), fcntl.LOCK_UN)
+
+
+class _SaveframeWriter:
+    """
+    Writer for the indexed saveframe file format.
+
+    The file consists of:
+      1. `SAVEFRAME_MAGIC`.
+      2. Blobs: the pickled local variables, function objects and exception
+         object, back to back. The out-of-band buffers of a pickled local
+         variable follow its pickle byte stream, each aligned to
+         `OUT_OF_BAND_BUFFER_ALIGNMENT` bytes.
+      3. The index: a JSON document holding the frames' metadata, the exception
+         info, and the byte range of each blob as
+         ``{'offset': <int>, 'length': <int>}``, plus for a variable with
+         out-of-band buffers, ``'buffers'``: the list of their byte ranges.
+         The index also records the ``'compression'`` used for the blobs.
+      4. The trailer: `SAVEFRAME_TRAILER` (the offset and length of the index)
+         followed by `SAVEFRAME_MAGIC`.
+
+    A snapshot series appends more snapshots (blobs, index and trailer) to the
+    file. The index of each snapshot records its number (``'snapshot'``) and
+    the byte range of the previous snapshot's index (``'previous_index'``),
+    and may refer to the blobs of earlier snapshots: the pickled local
+    variables are stored once per distinct content, identified by their
+    ``'sha256'`` hash.
+
+    The index is found from the end of the file, so readers can list frames,
+    variables and metadata without reading any blob, and unpickle each value
+    on its own.
+    """
+
+    def __init__(self, file_obj: Any, compression: Optional[str] = None,
+                 series: bool = False) -> None:
+        """
+        :param file_obj:
+          A file object opened for writing in binary mode. With ``series``, it
+          must also be readable and seekable, and may already contain snapshots.
+        :param compression:
+          The algorithm (one of `COMPRESSION_ALGORITHMS`) used to compress each
+          blob, or None to not compress them. The index is never compressed.
+        :param series:
+          Whether to append a snapshot to the series in the file, storing each
+          distinct pickled local variable only once (see `write_pickled_value`).
+        """
+        self._file_obj = file_obj
+        self._compression = compression
+        # For a snapshot series, the byte ranges of the pickled local variables
+        # stored in the file, by content hash.
+        self._blobs_by_hash: Optional[Dict[str, Dict[str, Any]]] = (
+            {} if series else None)
+        self._previous_index: Optional[Dict[str, Any]] = None
+        self._snapshot = 0
+        file_size = file_obj.seek(0, os.SEEK_END) if series else 0
+        if file_size == 0:
+            self._offset = 0
+            self._write(SAVEFRAME_MAGIC)
+            return
+        self._offset = file_size
+        self._read_series(file_size)
+
+    def _read(self, offset: int, length: int) -> bytes:
+        self._file_obj.seek(offset)
+        return self._file_obj.read(length)
+
+    def _read_series(self, file_size: int) -> None:
+        """
+        Read the indexes of the snapshots already in the file.
+        """
+        if self._read(0, len(SAVEFRAME_MAGIC)) != SAVEFRAME_MAGIC:
+            raise ValueError(
+                "The file is not in the indexed saveframe format, so a snapshot "
+                "can't be appended to it. Use a new file for the series.")
+        index_range = _read_trailer(self._read, file_size)
+        assert self._blobs_by_hash is not None
+        for i, index in enumerate(_read_indexes(self._read, file_size)):
+            if i == 0:
+                if index.get('compression') != self._compression:
+                    raise ValueError(
+                        f"The snapshot series uses compression "
+                        f"{index.get('compression')!a}, not "
+                        f"{self._compression!a}.")
+                self._snapshot = index.get('snapshot', 0) + 1
+                self._previous_index = {
+                    'offset': index_range[0], 'length': index_range[1]}
+            for frame in index['frames']:
+                for blob_range in frame['variables'].values():
+                    if 'sha256' in blob_range:
+                        self._blobs_by_hash.setdefault(
+                            blob_range['sha256'], blob_range)
+        self._file_obj.seek(file_size)
+
+    def _write(self, data: Union[bytes, memoryview]) -> None:
+        self._file_obj.write(data)
+        self._offset += len(data)
+
+    def _compress(self, data: Union[bytes, memoryview]) -> Iterator[bytes]:
+        """
+        Compress ``data`` in chunks, yielding the compressed chunks.
+        """
+        assert self._compression is not None
+        compressor = _get_compressor(self._compression)
+        with memoryview(data) as view:
+            for start in range(0, len(view), _COMPRESSION_CHUNK_SIZE):
+                yield compressor.compress(
+                    view[start:start + _COMPRESSION_CHUNK_SIZE])
+        yield compressor.flush()
+
+    def write_blob(self, data: Union[bytes, memoryview],
+                   compressed: bool = False) -> Dict[str, int]:
+        """
+        Write ``data`` (bytes or a contiguous byte ``memoryview``) to the file,
+        compressed in chunks if compression is enabled.
+
+        :param compressed:
+          Whether ``data`` is already compressed (see `prepare_pickled_value`).
+        :return:
+          The byte range of ``data`` in the file, to be stored in the index.
+        """
+        offset = self._offset
+        if self._compression is None or compressed:
+            self._write(data)
+        else:
+            for chunk in self._compress(data):
+                self._write(chunk)
+        return {'offset': offset, 'length': self._offset - offset}
+
+    def prepare_pickled_value(self, value: PickledValue) -> PickledValue:
+        """
+        Hash (for a snapshot series) and compress the pickle byte stream and
+        the out-of-band buffers of ``value`` ahead of `write_pickled_value`,
+        e.g. in a worker thread. Values already stored in the series are not
+        compressed.
+
+        This doesn't write anything to the file, so it is thread-safe.
+
+        :return:
+          The prepared `PickledValue`.
+        """
+        if self._blobs_by_hash is not None and value.sha256 is None:
+            value = replace(value, sha256=_hash_pickled_value(value))
+            if value.sha256 in self._blobs_by_hash:
+                return value
+        if self._compression is None or value.compressed:
+            return value
+        return replace(
+            value,
+            data=b"".join(self._compress(value.data)),
+            buffers=[pickle.PickleBuffer(b"".join(self._compress(buffer.raw())))
+                     for buffer in value.buffers],
+            compressed=True)
+
+    def write_pickled_value(self, value: PickledValue) -> Dict[str, Any]:
+        """
+        Write the pickle byte stream of ``value`` and its out-of-band buffers to
+        the file. The buffers are written straight from the memory of the
+        pickled object, without any intermediate copy.
+
+        For a snapshot series, a value whose content hash matches a value
+        already stored in the file (by this or an earlier snapshot) isn't
+        written again.
+
+        :return:
+          The byte range of the pickle byte stream in the file, with the byte
+          ranges of the buffers under ``'buffers'`` if there are any, and the
+          content hash under ``'sha256'`` for a snapshot series.
+        """
+        digest = None
+        if self._blobs_by_hash is not None:
+            digest = value.sha256 or _hash_pickled_value(value)
+            if digest in self._blobs_by_hash:
+                return dict(self._blobs_by_hash[digest])
+        blob_range: Dict[str, Any] = self.write_blob(
+            value.data, compressed=value.compressed)
+        if digest is not None:
+            assert self._blobs_by_hash is not None
+            blob_range['sha256'] = digest
+            self._blobs_by_hash[digest] = blob_range
+        if not value.buffers:
+            return blob_range
+        buffer_ranges = []
+        for buffer in value.buffers:
+            if self._compression is None:
+                padding = -self._offset % OUT_OF_BAND_BUFFER_ALIGNMENT
+                self._write(b"\0" * padding)
+            with buffer.raw() as raw:
+                buffer_ranges.append(
+                    self.write_blob(raw, compressed=value.compressed))
+        blob_range['buffers'] = buffer_ranges
+        return blob_range
+
+    def write_index(self, index: Dict[str, Any]) -> None:
+        """
+        Write the ``index`` and the trailer. This must be called last.
+        """
+        index = dict(index, compression=self._compression,
+                     snapshot=self._snapshot,
+                     previous_index=self._previous_index)
+        payload = json.dumps(index).encode('ascii')
+        index_offset = self._offset
+        self._write(payload)
+        self._write(SAVEFRAME_TRAILER.pack(index_offset, len(payload)))
+        self._write(SAVEFRAME_MAGIC)
+
+
 def _get_exception_info(exception_obj: BaseException) -> ExceptionInfo:
     """
     Get the metadata information for the ``exception_obj``.
@@ -184,12 +646,114 @@ def _get_frame_repr(frame: types.FrameType) -> str:
             f"Function: {_get_qualname(frame)}'")
 
 
-def _get_frame_local_variables_data(
+def _pickle_value(value: Any, max_bytes: Optional[int] = None) -> PickledValue:
+    """
+    Pickle ``value``, keeping large contiguous buffers out-of-band.
+
+    :param value:
+      The value to pickle.
+    :param max_bytes:
+      The maximum size of the pickled value (including the out-of-band
+      buffers). Pickling stops as soon as it is exceeded, so at most
+      ``max_bytes`` are held in memory.
+    :raise _PickleSizeLimitExceeded:
+      If the pickled value is larger than ``max_bytes``.
+    :return:
+      A `PickledValue` object. Its buffers refer to the memory of ``value``, so
+      ``value`` must not be mutated until they are written.
+    """
+    buffers: List[pickle.PickleBuffer] = []
+    size = 0
+    def add_size(nbytes: int) -> None:
+        nonlocal size
+        size += nbytes
+        if max_bytes is not None and size > max_bytes:
+            raise _PickleSizeLimitExceeded
+    def buffer_callback(buffer: pickle.PickleBuffer) -> bool:
+        # Returning a true value pickles the buffer in-band.
+        with buffer.raw() as raw:
+            nbytes = raw.nbytes
+        if nbytes < OUT_OF_BAND_BUFFER_MIN_SIZE:
+            return True
+        add_size(nbytes)
+        buffers.append(buffer)
+        return False
+    stream = _SizeLimitedBytesIO(add_size)
+    pickle.Pickler(stream, protocol=PICKLE_PROTOCOL,
+                   buffer_callback=buffer_callback).dump(value)
+    return PickledValue(data=stream.getvalue(), buffers=buffers, nbytes=size)
+
+
+@dataclass
+class _SizeBudget:
+    """
+    The size limits for the pickled local variables, and the total size of the
+    local variables saved so far.
+    """
+    max_variable_bytes: Optional[int] = None
+    max_total_bytes: Optional[int] = None
+    total_bytes: int = 0
+
+    def _remaining_bytes(self) -> Optional[int]:
+        if self.max_total_bytes is None:
+            return None
+        return max(self.max_total_bytes - self.total_bytes, 0)
+
+    def _total_bytes_exceeded(self, remaining_bytes: Optional[int]) -> str:
+        return (f"The pickled value is larger than the remaining "
+                f"{remaining_bytes} bytes of max_total_bytes "
+                f"({self.max_total_bytes}).")
+
+    def pickle_value(self, value: Any, count: bool = True) -> PickledValue:
+        """
+        Pickle ``value`` within the limits, and count it towards the total.
+
+        :param count:
+          Whether to check the value against the remaining total budget and
+          count it towards the total. Pass False to pickle values concurrently,
+          and `count` them afterwards in a deterministic order.
+        :raise _PickleSizeLimitExceeded:
+          If the pickled value doesn't fit in the limits. The message is the
+          reason the value is skipped.
+        """
+        remaining_bytes = self._remaining_bytes() if count else None
+        limits = [limit for limit in (self.max_variable_bytes, remaining_bytes)
+                  if limit is not None]
+        max_bytes = min(limits) if limits else None
+        try:
+            pickled_value = _pickle_value(value, max_bytes)
+        except _PickleSizeLimitExceeded:
+            if max_bytes == self.max_variable_bytes:
+                reason = (f"The pickled value is larger than max_variable_bytes "
+                          f"({self.max_variable_bytes}).")
+            else:
+                reason = self._total_bytes_exceeded(remaining_bytes)
+            raise _PickleSizeLimitExceeded(reason) from None
+        if count:
+            self.total_bytes += pickled_value.nbytes
+        return pickled_value
+
+    def count(self, pickled_value: PickledValue) -> None:
+        """
+        Count a value pickled with ``pickle_value(value, count=False)`` towards
+        the total.
+
+        :raise _PickleSizeLimitExceeded:
+          If the pickled value doesn't fit in the remaining total budget.
+        """
+        remaining_bytes = self._remaining_bytes()
+        if remaining_bytes is not None and pickled_value.nbytes > remaining_bytes:
+            raise _PickleSizeLimitExceeded(
+                self._total_bytes_exceeded(remaining_bytes))
+        self.total_bytes += pickled_value.nbytes
+
+
+def _get_frame_local_variables(
         frame: types.FrameType,
         variables: Optional[Tuple[str, ...]],
-        exclude_variables: Optional[Tuple[str, ...]]) -> Dict[str, bytes]:
+        exclude_variables: Optional[Tuple[str, ...]]) -> Dict[str, Any]:
     """
-    Get the local variables data of the ``frame``.
+    Get the local variables of the ``frame`` to save.
 
     :param frame:
       The frame object
@@ -198,11 +762,10 @@ def _get_frame_local_variables_data(
     :param exclude_variables:
       Local variables to be excluded.
     :return:
-      A dict containing the local variables data, with the key as the variable
-      name and the value as the pickled local variable value.
+      A dict with the key as the variable name and the value as the local
+      variable value.
     """
-    # A dict to store the local variables to be saved.
-    local_variables_to_save: Dict[str, bytes] = {}
+    local_variables: Dict[str, Any] = {}
     all_local_variables = frame.f_locals
     for variable in all_local_variables:
         # Discard the variables that starts with '__' like '__eq__', etc., to
@@ -213,17 +776,114 @@ def _get_frame_local_variables_data(
             continue
         if exclude_variables and variable in exclude_variables:
             continue
-        try:
-            pickled_value = pickle.dumps(
-                all_local_variables[variable], protocol=PICKLE_PROTOCOL)
-        except Exception as err:
-            _SAVEFRAME_LOGGER.warning(
-                "Cannot pickle variable: %a for frame: %s. Error: %a. Skipping "
-                "this variable and continuing.",
-                variable, _get_frame_repr(frame), err)
-        else:
-            local_variables_to_save[variable] = pickled_value
-    return local_variables_to_save
+        local_variables[variable] = all_local_variables[variable]
+    return local_variables
+
+
+def _skip_variable(
+        frame: types.FrameType, variable: str, err: Exception,
+        skipped_variables: Dict[str, str]) -> None:
+    """
+    Log and record in ``skipped_variables`` that the local variable
+    ``variable`` of the ``frame`` can't be saved because of ``err``.
+    """
+    if isinstance(err, _PickleSizeLimitExceeded):
+        _SAVEFRAME_LOGGER.warning(
+            "Skipping variable: %a for frame: %s. %s",
+            variable, _get_frame_repr(frame), err)
+        skipped_variables[variable] = str(err)
+    else:
+        _SAVEFRAME_LOGGER.warning(
+            "Cannot pickle variable: %a for frame: %s. Error: %a. Skipping "
+            "this variable and continuing.",
+            variable, _get_frame_repr(frame), err)
+        skipped_variables[variable] = f"Cannot pickle the value. Error: {err!a}"
+
+
+def _get_frames_local_variables_data(
+        frames: List[types.FrameType],
+        variables: Optional[Tuple[str, ...]],
+        exclude_variables: Optional[Tuple[str, ...]],
+        budget: _SizeBudget,
+        skipped_variables: List[Dict[str, str]],
+        max_workers: Optional[int] = None,
+        prepare: Callable[[PickledValue], PickledValue] = lambda value: value,
+) -> Iterator[Tuple[int, str, PickledValue]]:
+    """
+    Get the local variables data of the ``frames``.
+
+    By default, the local variables are pickled one at a time as the iterator
+    is consumed, so that each can be written before the next one is pickled.
+
+    With ``max_workers``, the references to the local variables of all the
+    ``frames`` are snapshotted first, and the values are then pickled (and
+    passed to ``prepare``) concurrently in a thread pool. This helps for values
+    whose pickling or compression releases the GIL, such as NumPy arrays. At
+    most ``2 * max_workers`` pickled values are held in memory at a time. The
+    size budget is applied as the values are consumed, so the output is the
+    same for any number of workers.
+
+    :param frames:
+      The frame objects.
+    :param variables:
+      Local variables to be included.
+    :param exclude_variables:
+      Local variables to be excluded.
+    :param budget:
+      The size limits for the pickled local variables.
+    :param skipped_variables:
+      For each frame, a dict in which to record the local variables that can't
+      be saved, with the key as the variable name and the value as the reason.
+    :param max_workers:
+      The number of threads used to pickle the local variables. None or 1 to
+      pickle them on the calling thread.
+    :param prepare:
+      A function to apply to each pickled value in the worker threads, e.g.
+      `_SaveframeWriter.prepare_pickled_value`. Not used without
+      ``max_workers``.
+    :return:
+      An iterator of tuples of the position of the frame in ``frames``, the
+      variable name and the pickled local variable value, in the order of the
+      frames and of their local variables.
+    """
+    if not max_workers or max_workers == 1:
+        for i, frame in enumerate(frames):
+            for variable, value in _get_frame_local_variables(
+                    frame, variables, exclude_variables).items():
+                try:
+                    pickled_value = budget.pickle_value(value)
+                except Exception as err:
+                    _skip_variable(frame, variable, err, skipped_variables[i])
+                else:
+                    yield i, variable, pickled_value
+        return
+    # Snapshot the references to the local variables of all the frames.
+    local_variables = [
+        (i, variable, value)
+        for i, frame in enumerate(frames)
+        for variable, value in _get_frame_local_variables(
+            frame, variables, exclude_variables).items()]
+    def pickle_value(value: Any) -> PickledValue:
+        return prepare(budget.pickle_value(value, count=False))
+    with ThreadPoolExecutor(max_workers=max_workers,
+                            thread_name_prefix="saveframe") as executor:
+        pending: Deque[Tuple[int, str, Future]] = deque()
+        def submit(n: int) -> None:
+            for i, variable, value in itertools.islice(local_variables_iter, n):
+                pending.append(
+                    (i, variable, executor.submit(pickle_value, value)))
+        local_variables_iter = iter(local_variables)
+        submit(2 * max_workers)
+        while pending:
+            i, variable, future = pending.popleft()
+            submit(1)
+            try:
+                pickled_value = future.result()
+                budget.count(pickled_value)
+            except Exception as err:
+                _skip_variable(frames[i], variable, err, skipped_variables[i])
+            else:
+                yield i, variable, pickled_value
 
 
 def _get_frame_function_object(frame: types.FrameType) -> Any:
@@ -529,15 +1189,23 @@ def _save_frames_and_exception_info_to_file(
         variables: Optional[Tuple[str, ...]],
         exclude_variables: Optional[Tuple[str, ...]], *,
         exception_obj: Optional[BaseException] = None,
-        current_frame: Optional[types.FrameType] = None) -> None:
+        current_frame: Optional[types.FrameType] = None,
+        compression: Optional[str] = None,
+        max_variable_bytes: Optional[int] = None,
+        max_total_bytes: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        series: bool = False) -> None:
     """
     Save the frames and exception information in the file ``filename``.
 
-    The data structure that gets saved is a dictionary. It stores each frame
-    info in a separate entry with the key as the frame index (from the bottom of
-    the stack trace). It also stores some useful exception information. The data
-    gets dumped in the ``filename`` in pickled form. Following is the same
-    structure of the info saved:
+    The data is saved in the indexed format written by `_SaveframeWriter`. Each
+    local variable is pickled individually and written to the file as soon as
+    it's ready, so at most one pickled value is held in memory at a time (at
+    most ``2 * max_workers`` with ``max_workers``). Reading the file with
+    `SaveframeReader` gives the following structure (see
+    `SaveframeReader.data`). It stores each frame info in a separate entry
+    with the key as the frame index (from the bottom of the stack trace), and
+    some useful exception information:
       {
           # 5th frame from the bottom
           5: {
@@ -551,6 +1219,7 @@ def _save_frames_and_exception_info_to_file(
                 'frame_identifier': '/path/to/file.py,3423,func1',
                 'code': '... python code line ...'
                 'variables': {'local_variable1': <pickled value>, 'local_variable2': <pickled value>, ...}
+                'skipped_variables': {'local_variable3': '<reason it is not saved>', ...}
             },
           # 17th frame from the bottom
           17: {
@@ -584,9 +1253,23 @@ def _save_frames_and_exception_info_to_file(
     :param current_frame:
       The current frame if the user is in a debugger. This is used to extract all
       the required info; the traceback, all the frame objects, etc.
+    :param compression:
+      The algorithm used to compress the saved values (one of
+      `COMPRESSION_ALGORITHMS`), or None to not compress them.
+    :param max_variable_bytes:
+      The maximum pickled size of a local variable. Larger local variables are
+      skipped, with the reason recorded in 'skipped_variables'.
+    :param max_total_bytes:
+      The maximum total pickled size of the local variables of all the frames.
+      Local variables that don't fit in the remaining budget are skipped, with
+      the reason recorded in 'skipped_variables'.
+    :param max_workers:
+      The number of threads used to pickle (and compress) the local variables
+      concurrently. None to pickle them on the calling thread.
+    :param series:
+      Whether to append a snapshot to the series in the file ``filename``
+      (creating it if it doesn't exist) rather than overwrite it.
     """
-    # Mapping that stores all the information to save.
-    frames_and_exception_info: Dict[Any, Any] = {}
     if exception_obj:
         # Get the list of frame objects from the exception object.
         all_frames = _get_all_frames_from_exception_obj(
@@ -600,21 +1283,56 @@ def _save_frames_and_exception_info_to_file(
     _SAVEFRAME_LOGGER.info(
         "Number of frames that'll be saved: %s", len(frames_to_save))
 
-    for frame_idx, frame_obj in frames_to_save:
-        _SAVEFRAME_LOGGER.info(
-            "Getting required info for the frame: %s", _get_frame_repr(frame_obj))
-        frames_and_exception_info[frame_idx] = _get_frame_metadata(
-            frame_idx, frame_obj).__dict__
-        frames_and_exception_info[frame_idx]['variables'] = (
-            _get_frame_local_variables_data(frame_obj, variables, exclude_variables))
-
-    if exception_obj:
-        _SAVEFRAME_LOGGER.info("Getting exception metadata info.")
-        frames_and_exception_info.update(_get_exception_info(
-            exception_obj).__dict__)
-    _SAVEFRAME_LOGGER.info("Saving the complete data in the file: %a", filename)
-    with _open_file(filename, 'wb') as f:
-        pickle.dump(frames_and_exception_info, f, protocol=PICKLE_PROTOCOL)
+    _SAVEFRAME_LOGGER.info("Saving the data in the file: %a", filename)
+    with (_open_file(filename, 'r+b' if series else 'wb') as f,
+          _append_guard(f) if series else nullcontext()):
+        writer = _SaveframeWriter(f, compression=compression, series=series)
+        budget = _SizeBudget(max_variable_bytes=max_variable_bytes,
+                             max_total_bytes=max_total_bytes)
+        frames_index: List[Dict[str, Any]] = []
+        for frame_idx, frame_obj in frames_to_save:
+            _SAVEFRAME_LOGGER.info(
+                "Getting required info for the frame: %s",
+                _get_frame_repr(frame_obj))
+            frame_info = _get_frame_metadata(frame_idx, frame_obj).__dict__
+            if not isinstance(frame_info['function_object'], str):
+                frame_info['function_object'] = writer.write_blob(
+                    frame_info['function_object'])
+            frame_info['variables'] = {}
+            frame_info['skipped_variables'] = {}
+            frames_index.append(frame_info)
+
+        _SAVEFRAME_LOGGER.info("Saving the local variables of the frames.")
+        for i, variable, pickled_value in _get_frames_local_variables_data(
+                [frame_obj for _, frame_obj in frames_to_save], variables,
+                exclude_variables, budget,
+                [frame_info['skipped_variables'] for frame_info in frames_index],
+                max_workers=max_workers,
+                prepare=writer.prepare_pickled_value):
+            frames_index[i]['variables'][variable] = (
+                writer.write_pickled_value(pickled_value))
+
+        exception_index: Optional[Dict[str, Any]] = None
+        if exception_obj:
+            _SAVEFRAME_LOGGER.info("Getting exception metadata info.")
+            exception_index = _get_exception_info(exception_obj).__dict__
+            try:
+                pickled_exception = pickle.dumps(
+                    exception_obj, protocol=PICKLE_PROTOCOL)
+            except Exception as err:
+                _SAVEFRAME_LOGGER.warning(
+                    "Cannot pickle the exception object: %a. Error: %a",
+                    exception_obj, err)
+                exception_index['exception_object'] = (
+                    "Exception object not pickleable")
+            else:
+                exception_index['exception_object'] = writer.write_blob(
+                    pickled_exception)
+        writer.write_index({
+            'version': SAVEFRAME_FORMAT_VERSION,
+            'frames': frames_index,
+            'exception': exception_index,
+        })
     _SAVEFRAME_LOGGER.info("Done!!")
 
 
@@ -866,6 +1584,48 @@ def _validate_variables(
     return all_variables
 
 
+def _validate_save_options(
+        compression: Optional[str],
+        max_variable_bytes: Optional[int],
+        max_total_bytes: Optional[int],
+        max_workers: Optional[int],
+        utility: str = 'function') -> None:
+    """
+    Validate the values of ``compression``, ``max_variable_bytes``,
+    ``max_total_bytes`` and ``max_workers``.
+
+    :param utility:
+      Indicates whether this helper is invoked by the ``pyflyby.saveframe`` function
+      or the ``pyflyby/bin/saveframe`` script. See `_validate_saveframe_arguments`
+      for more info.
+    """
+    def name(param: str) -> str:
+        return f"`{param}`" if utility == 'function' else f"--{param}"
+    if compression is not None:
+        if compression not in COMPRESSION_ALGORITHMS:
+            raise ValueError(
+                f"Invalid value for {name('compression')}: {compression!a}. "
+                f"Allowed values are: {list(COMPRESSION_ALGORITHMS)}")
+        try:
+            _get_compressor(compression)
+        except ImportError as err:
+            raise ValueError(
+                f"Compression {compression!a} is not available: {err}") from None
+    for param, value in [('max_variable_bytes', max_variable_bytes),
+                         ('max_total_bytes', max_total_bytes),
+                         ('max_workers', max_workers)]:
+        if value is None:
+            continue
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise TypeError(
+                f"{name(param)} must be of type 'int', not "
+                f"'{type(value).__name__}'.")
+        if value <= 0:
+            raise ValueError(
+                f"Invalid value for {name(param)}: {value}. It must be a "
+                "positive integer.")
+
+
 def _validate_saveframe_arguments(
         filename: Optional[str],
         frames: Union[None, int, str, List[str], Tuple[str, ...]],
@@ -922,11 +1682,140 @@ def _validate_saveframe_arguments(
     return filename, frames, variables, exclude_variables  # type: ignore[return-value]
 
 
+class SaveframeProcess:
+    """
+    A handle on the child process of ``saveframe(background=True)``.
+
+    The child writes the data to a temporary file and renames it to
+    ``filename`` once it's complete, so ``filename`` never contains partial
+    data (a snapshot series is appended to in place instead). Call `wait` (or
+    `poll` until it's not None) to reap the child process.
+    """
+
+    def __init__(self, filename: str, pid: int) -> None:
+        """
+        :param filename:
+          The file path in which the frame info is saved.
+        :param pid:
+          The process ID of the child process.
+        """
+        self.filename = filename
+        self.pid = pid
+        self._exitcode: Optional[int] = None
+
+    def poll(self) -> Optional[int]:
+        """
+        Check whether the child process has exited, without blocking.
+
+        :return:
+          The exit code of the child process (0 on success), or None if it's
+          still running.
+        """
+        if self._exitcode is None:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+            if pid == 0:
+                return None
+            self._exitcode = os.waitstatus_to_exitcode(status)
+        return self._exitcode
+
+    def wait(self, timeout: Optional[float] = None) -> str:
+        """
+        Wait for the child process to finish saving the frames.
+
+        :param timeout:
+          Maximum number of seconds to wait. None to wait indefinitely.
+        :raise TimeoutError:
+          If the child process is still running after ``timeout`` seconds.
+        :raise RuntimeError:
+          If the child process failed to save the frames.
+        :return:
+          The file path in which the frame info is saved.
+        """
+        if timeout is None:
+            if self._exitcode is None:
+                _, status = os.waitpid(self.pid, 0)
+                self._exitcode = os.waitstatus_to_exitcode(status)
+        else:
+            deadline = time.monotonic() + timeout
+            while self.poll() is None:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(
+                        f"The saveframe process {self.pid} is still running "
+                        f"after {timeout} seconds.")
+                time.sleep(0.01)
+        if self._exitcode != 0:
+            raise RuntimeError(
+                f"The saveframe process {self.pid} failed with exit code "
+                f"{self._exitcode}. Check its output for the error.")
+        return self.filename
+
+    def __repr__(self) -> str:
+        return (f"{self.__class__.__name__}(filename={self.filename!r}, "
+                f"pid={self.pid})")
+
+
+def _save_in_background(
+        filename: str, save: Callable[[str], None],
+        use_temporary_file: bool = True) -> SaveframeProcess:
+    """
+    Fork a child process which calls ``save`` with a temporary file path, and
+    then renames the temporary file to ``filename``. The child works on a
+    copy-on-write snapshot of the parent's memory, so the parent can continue
+    immediately.
+
+    :param filename:
+      The file path in which to save the frame info.
+    :param save:
+      The function saving the frame info to the file path passed to it.
+    :param use_temporary_file:
+      If False, call ``save`` with ``filename`` itself, e.g. to append to a
+      snapshot series.
+    :return:
+      A `SaveframeProcess` object to wait on the child process.
+    """
+    if not hasattr(os, 'fork'):
+        raise RuntimeError(
+            "Saving the frames in the background requires os.fork, which is "
+            "not available on this platform.")
+    pid = os.fork()
+    if pid != 0:
+        _SAVEFRAME_LOGGER.info(
+            "Saving the frames in the background in process: %s", pid)
+        return SaveframeProcess(filename, pid)
+    exitcode = 1
+    try:
+        if use_temporary_file:
+            tmp_filename = f"{filename}.tmp.{os.getpid()}"
+            try:
+                save(tmp_filename)
+                os.replace(tmp_filename, filename)
+            finally:
+                if os.path.exists(tmp_filename):
+                    os.unlink(tmp_filename)
+        else:
+            save(filename)
+        exitcode = 0
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        # Exit without running any cleanup actions (finally clauses, atexit
+        # functions) of the parent process, like `_dbg` does for
+        # ``wait_for_debugger_to_attach(background=True)``.
+        sys.stderr.flush()
+        os._exit(exitcode)
+
+
 def saveframe(filename: Optional[str] = None,
               frames: Union[None, int, str, List[str], Tuple[str, ...]] = None,
               variables: Union[None, str, List[str], Tuple[str, ...]] = None,
               exclude_variables: Union[None, str, List[str], Tuple[str, ...]] = None,
-              current_frame: bool = False) -> str:
+              current_frame: bool = False,
+              compression: Optional[str] = None,
+              max_variable_bytes: Optional[int] = None,
+              max_total_bytes: Optional[int] = None,
+              max_workers: Optional[int] = None,
+              background: bool = False,
+              series: bool = False) -> Union[str, SaveframeProcess]:
     """
     Utility to save information for debugging / reproducing an issue.
 
@@ -977,6 +1866,7 @@ def saveframe(filename: Optional[str] = None,
                 'frame_identifier': '/path/to/file.py,3423,func1',
                 'code': '... python code line ...'
                 'variables': {'local_variable1': <pickled value>, 'local_variable2': <pickled value>, ...}
+                'skipped_variables': {'local_variable3': '<reason it is not saved>', ...}
             },
           # 17th frame from the bottom
           17: {
@@ -993,7 +1883,11 @@ def saveframe(filename: Optional[str] = None,
       }
 
     .. note::
-      - The above data gets saved in the file in pickled form.
+      - The above data gets saved in an indexed file format where each value is
+        pickled separately; use `SaveframeReader` to read it. Listing frames,
+        variables and metadata doesn't unpickle any value, and only the
+        requested variables are unpickled. The raw structure above is available
+        as ``SaveframeReader(filename).data``.
       - In the above data, the key of each frame's entry is the index of that frame
         from the bottom of the error stack trace. So the first frame from the bottom
         (the error frame) has index 1, and so on.
@@ -1064,6 +1958,21 @@ def saveframe(filename: Optional[str] = None,
       # To exclude local variables 'var1' and 'var2' from the frames, use:
       >> saveframe(frames=<frames_to_save>, exclude_variables=['var1', 'var2'])
 
+      # To compress the data and skip local variables larger than 100 MB, use:
+      >> saveframe(compression='gzip', max_variable_bytes=100 * 2**20)
+
+      # To save the current call stack in a forked child process and continue
+      # immediately, use:
+      >> handle = saveframe(current_frame=True, background=True)
+      >> ...
+      >> handle.wait() # Returns the file path once the data is saved
+
+      # To capture the frames periodically in a snapshot series, use:
+      >> for i in range(num_iterations):
+      ..     ...
+      ..     if i % 1000 == 0:
+      ..         saveframe(filename='/path/to/file', current_frame=True, series=True)
+
     For non-interactive use cases (e.g., a failing script or command), checkout
     `pyflyby/bin/saveframe` script.
 
@@ -1147,8 +2056,66 @@ def saveframe(filename: Optional[str] = None,
 
       Default is False.
 
+    :param compression:
+      Compress the saved values with this algorithm: 'gzip' or 'lzma', or
+      'zstd' (requires Python 3.14+ or the 'zstandard' package) or 'lz4'
+      (requires the 'lz4' package). `SaveframeReader` decompresses them
+      transparently.
+
+      If this parameter is not passed, the values are not compressed.
+
+    :param max_variable_bytes:
+      The maximum pickled size, in bytes, of a local variable. Larger local
+      variables are not saved; the reason is recorded in the frame's
+      'skipped_variables' entry instead. This bounds the memory used to save
+      each variable.
+
+      If this parameter is not passed, there is no limit.
+
+    :param max_total_bytes:
+      The maximum total pickled size, in bytes, of the local variables of all
+      the saved frames. Once the budget is used up, the remaining local
+      variables that don't fit are not saved; the reason is recorded in the
+      frame's 'skipped_variables' entry instead.
+
+      If this parameter is not passed, there is no limit.
+
+    :param max_workers:
+      Pickle (and compress) the local variables concurrently in a pool of this
+      many threads. This shortens the time the process is blocked when saving
+      many large values whose pickling releases the GIL (e.g. NumPy arrays), or
+      with compression. The saved data is the same as without this option.
+
+      If this parameter is not passed, the local variables are pickled one at a
+      time on the calling thread.
+
+    :param background:
+      If True, fork a child process which saves the frame info from its
+      copy-on-write snapshot of the process memory, and return immediately with
+      a `SaveframeProcess` handle (with the ``filename`` attribute and a
+      ``wait()`` method) instead of the file path. Use this to capture the state
+      of latency-sensitive processes. The file only appears once it's complete
+      (a snapshot series is appended to in place, under a file lock). Not
+      available on platforms without ``os.fork``.
+
+      Default is False.
+
+    :param series:
+      If True, append a snapshot to the snapshot series in ``filename`` instead
+      of overwriting it (the file is created if it doesn't exist). Each distinct
+      pickled local variable is stored only once in the series: a local
+      variable whose pickled value is unchanged since an earlier snapshot is
+      not written again, so repeated captures (e.g. every N iterations of a
+      loop) only grow the file by what changed. Use
+      ``SaveframeReader(filename, snapshot=i)`` to read any snapshot.
+
+      The snapshots of a series must use the same ``compression``.
+
+      Default is False.
+
     :return:
-      The file path in which the frame info is saved.
+      The file path in which the frame info is saved, or a `SaveframeProcess`
+      handle if ``background`` is True.
     """
     save_current_frame = current_frame
     _current_frame: Optional[types.FrameType] = None
@@ -1204,11 +2171,21 @@ def saveframe(filename: Optional[str] = None,
     _SAVEFRAME_LOGGER.info("Validating arguments passed.")
     filename, frames, variables, exclude_variables = _validate_saveframe_arguments(  # type: ignore[assignment]
         filename, frames, variables, exclude_variables)
+    _validate_save_options(
+        compression, max_variable_bytes, max_total_bytes, max_workers)
     if exception_raised and exception_obj:
         _SAVEFRAME_LOGGER.info(
             "Saving frames and metadata for the exception: %a", exception_obj)
-    _save_frames_and_exception_info_to_file(
-        filename=filename, frames=frames, variables=variables,  # type: ignore[arg-type]
+    save = partial(
+        _save_frames_and_exception_info_to_file,
+        frames=frames, variables=variables,  # type: ignore[arg-type]
         exclude_variables=exclude_variables,
-        exception_obj=exception_obj, current_frame=_current_frame)
+        exception_obj=exception_obj, current_frame=_current_frame,
+        compression=compression, max_variable_bytes=max_variable_bytes,
+        max_total_bytes=max_total_bytes, max_workers=max_workers,
+        series=series)
+    if background:
+        return _save_in_background(
+            filename, save, use_temporary_file=not series)
+    save(filename)
     return filename
@@ -28,6 +28,7 @@ sample structure of the info saved in the file:
             'frame_identifier': '/path/to/file.py,3423,func1',
             'code': '... python code line ...'
             'variables': {'local_variable1': <pickled value>, 'local_variable2': <pickled value>, ...}
+            'skipped_variables': {'local_variable3': '<reason it is not saved>', ...}
         },
     # 17th frame from the bottom
     17: {
@@ -44,7 +45,9 @@ sample structure of the info saved in the file:
 }
 
 NOTE:
-    - The above data gets saved in the file in pickled form.
+    - The above data gets saved in an indexed file format where each value is
+      pickled separately; use `pyflyby.SaveframeReader` to read it. The raw
+      structure above is available as ``SaveframeReader(filename).data``.
     - In the above data, the key of each frame's entry is the index of that frame
       from the bottom of the error stack trace. So the first frame from the bottom
       (the error frame) has index 1, and so on.
@@ -92,6 +95,13 @@ Example Usage:
     => To exclude local variables 'var1' and 'var2' from the frames, use:
     $ saveframe --frames=frames_to_save --exclude_variables=var1,var2 <script_or_command_to_run>
 
+    => To compress the data and skip local variables larger than 100 MB, use:
+    $ saveframe --compression=gzip --max_variable_bytes=104857600 <script_or_command_to_run>
+
+    => To count the saved exceptions in a directory of saveframe files by
+       exception class and error frame, use:
+    $ saveframe query --group_by=exception_class_qualname,frame_identifier /path/to/dir
+
 For interactive use cases, checkout pyflyby.saveframe function.
 """
 from __future__ import annotations
@@ -100,12 +110,18 @@ from __future__ import annotations
 globals_cpy = globals().copy()
 
 import argparse
+import json
 import os
 import sys
 
-from   pyflyby._saveframe       import (_SAVEFRAME_LOGGER,
+from   pyflyby._saveframe       import (COMPRESSION_ALGORITHMS,
+                                        _SAVEFRAME_LOGGER,
                                         _save_frames_and_exception_info_to_file,
+                                        _validate_save_options,
                                         _validate_saveframe_arguments)
+from   pyflyby._saveframe_reader \
+                                import (QUERY_FIELDS, group_saveframes,
+                                        query_saveframes)
 
 
 def getargs():
@@ -180,6 +196,39 @@ def getargs():
              "Default behavior: If --exclude_variables is not passed, save all "
              "the local variables of the included frames as per --variables."
     )
+    parser.add_argument(
+        "--compression", default=None, choices=COMPRESSION_ALGORITHMS,
+        help="Compress the saved values with this algorithm. 'zstd' requires "
+             "Python 3.14+ or the 'zstandard' package and 'lz4' requires the "
+             "'lz4' package.\n\n"
+             "Default behavior: If --compression is not passed, the values are "
+             "not compressed."
+    )
+    parser.add_argument(
+        "--max_variable_bytes", default=None, type=int,
+        help="The maximum pickled size, in bytes, of a local variable. Larger "
+             "local variables are not saved; the reason is recorded in the "
+             "frame's 'skipped_variables' entry instead.\n\n"
+             "Default behavior: If --max_variable_bytes is not passed, there is "
+             "no limit."
+    )
+    parser.add_argument(
+        "--max_total_bytes", default=None, type=int,
+        help="The maximum total pickled size, in bytes, of the local variables "
+             "of all the saved frames. Local variables that don't fit in the "
+             "remaining budget are not saved; the reason is recorded in the "
+             "frame's 'skipped_variables' entry instead.\n\n"
+             "Default behavior: If --max_total_bytes is not passed, there is no "
+             "limit."
+    )
+    parser.add_argument(
+        "--max_workers", default=None, type=int,
+        help="Pickle (and compress) the local variables concurrently in a pool "
+             "of this many threads. The saved data is the same as without this "
+             "option.\n\n"
+             "Default behavior: If --max_workers is not passed, the local "
+             "variables are pickled one at a time."
+    )
     parser.add_argument(
         "command", default=argparse.SUPPRESS, nargs=argparse.REMAINDER,
         help="User's script / command to execute.")
@@ -187,6 +236,151 @@ def getargs():
     return args
 
 
+QUERY_USAGE = """
+Read the metadata of many saveframe files, in parallel, and print it as a table
+or as JSON lines. Only the index of each file is read; the saved local variables
+and exception objects are not unpickled unless --unpickle is passed.
+
+Example Usage:
+
+    => To list the exception and error frame of each saveframe file in a
+       directory, use:
+    $ saveframe query /path/to/dir
+
+    => To count the files by exception class and error frame, use:
+    $ saveframe query --group_by=exception_class_qualname,frame_identifier /path/to/dir
+
+    => To print all the metadata of each file as JSON lines, use:
+    $ saveframe query --format=jsonl /path/to/dir
+"""
+
+DEFAULT_QUERY_COLUMNS = ('path', 'exception_class_qualname', 'frame_identifier')
+
+
+def get_query_args(argv):
+    """
+    Parse the command-line arguments of the ``query`` subcommand.
+    """
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawTextHelpFormatter,
+        description=QUERY_USAGE,
+        prog=f"{os.path.basename(sys.argv[0])} query")
+    parser.add_argument(
+        "--pattern", default="*.pkl",
+        help="Glob pattern of the file names to read when scanning "
+             "directories.\nDefault: '*.pkl'."
+    )
+    parser.add_argument(
+        "--group_by", default=None,
+        help="Count the files grouped by these comma-separated fields, largest "
+             "group first. Allowed fields:\n"
+             f"{', '.join(QUERY_FIELDS)}.\n"
+             "The frame fields describe the first saved frame from the bottom "
+             "of the stack trace (usually the error frame).\n\n"
+             "Default behavior: If --group_by is not passed, one row is printed "
+             "per file."
+    )
+    parser.add_argument(
+        "--fields", default=None,
+        help="Comma-separated fields to print for each file, when not using "
+             "--group_by.\n"
+             "Default behavior: For --format=table, print "
+             f"{','.join(DEFAULT_QUERY_COLUMNS)}. For --format=jsonl, print all "
+             "the metadata of the file, including its 'frames'."
+    )
+    parser.add_argument(
+        "--format", default="table", choices=("table", "jsonl"),
+        help="Output format.\nDefault: 'table'."
+    )
+    parser.add_argument(
+        "--max_workers", default=None, type=int,
+        help="The number of threads reading the files.\n"
+             "Default behavior: If --max_workers is not passed, the default "
+             "number of threads of concurrent.futures.ThreadPoolExecutor is "
+             "used."
+    )
+    parser.add_argument(
+        "--unpickle", action="store_true",
+        help="Also read files written by older versions of saveframe (which "
+             "can only be read by unpickling them) and include the repr of the "
+             "unpickled exception object. Only pass this for trusted files."
+    )
+    parser.add_argument(
+        "paths", nargs="+",
+        help="Saveframe files, or directories to scan recursively for them.")
+    return parser.parse_args(argv)
+
+
+def format_table(rows, columns):
+    """
+    Format ``rows`` as a table with a header line and a column per field in
+    ``columns``.
+
+      >>> print(format_table([{'a': 'x', 'b': 10}, {'a': 'yy', 'b': None}],
+      ...                    ['a', 'b']))
+      a   b
+      x   10
+      yy
+    """
+    table = [list(columns)] + [
+        ['' if row.get(column) is None else str(row[column])
+         for column in columns] for row in rows]
+    widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+    return '\n'.join(
+        '  '.join(cell.ljust(width)
+                  for cell, width in zip(line, widths)).rstrip()
+        for line in table)
+
+
+def query_main(argv):
+    """
+    Main body of the ``query`` subcommand.
+    """
+    args = get_query_args(argv)
+    group_by = args.group_by.split(',') if args.group_by else None
+    fields = args.fields.split(',') if args.fields else None
+    for field in group_by or []:
+        if field not in QUERY_FIELDS:
+            raise SystemExit(
+                f"Error: Invalid field for --group_by: {field!a}. Allowed "
+                f"fields are: {', '.join(QUERY_FIELDS)}.")
+    for field in fields or []:
+        if field not in QUERY_FIELDS + ('frames', 'exception_object'):
+            raise SystemExit(
+                f"Error: Invalid field for --fields: {field!a}. Allowed "
+                f"fields are: {', '.join(QUERY_FIELDS)}, frames, "
+                "exception_object.")
+    if args.max_workers is not None and args.max_workers <= 0:
+        raise SystemExit("Error: Value of --max_workers must be a positive "
+                         f"integer. Got: {args.max_workers}.")
+    records = []
+    for record in query_saveframes(args.paths, pattern=args.pattern,
+                                   max_workers=args.max_workers,
+                                   unpickle=args.unpickle):
+        if 'error' in record:
+            _SAVEFRAME_LOGGER.warning(
+                "Can't read the saveframe file %a: %s", record['path'],
+                record['error'])
+            continue
+        if 'exception_object' in record:
+            record['exception_object'] = repr(record['exception_object'])
+        records.append(record)
+    if group_by:
+        rows = group_saveframes(records, by=group_by)
+        columns = group_by + ['count']
+    else:
+        rows = records
+        columns = fields or list(DEFAULT_QUERY_COLUMNS)
+        if fields or args.format == 'table':
+            rows = [{column: row.get(column) for column in columns}
+                    for row in rows]
+    if args.format == 'table':
+        print(format_table(rows, columns))
+    else:
+        for row in rows:
+            print(json.dumps(row, default=repr))
+
+
 def which(program):
     """
     Find the complete path of the ``program``.
@@ -261,11 +455,17 @@ def main():
     """
     Main body of the script.
     """
+    if sys.argv[1:2] == ['query']:
+        query_main(sys.argv[2:])
+        return
     args = getargs()
     # Validate the arguments.
     filename, frames, variables, exclude_variables = _validate_saveframe_arguments(
         filename=args.filename, frames=args.frames, variables=args.variables,
         exclude_variables=args.exclude_variables, utility='script')
+    _validate_save_options(
+        args.compression, args.max_variable_bytes, args.max_total_bytes,
+        args.max_workers, utility='script')
     command = args.command
     command_string = ' '.join(command)
 
@@ -288,7 +488,10 @@ def main():
         _save_frames_and_exception_info_to_file(
             filename=filename, frames=frames, variables=variables,
             exclude_variables=exclude_variables,
-            exception_obj=err)
+            exception_obj=err, compression=args.compression,
+            max_variable_bytes=args.max_variable_bytes,
+            max_total_bytes=args.max_total_bytes,
+            max_workers=args.max_workers)
     else:
         raise SystemExit(
             f"Error: No exception is raised by the program: {command_string!a}")
@@ -7,20 +7,40 @@ saved by the ``saveframe`` utility.
 
 from __future__ import annotations, print_function
 
+from   concurrent.futures       import ThreadPoolExecutor
+import fnmatch
 import logging
+import mmap
+import os
 import pickle
 
-from   typing                   import Any, Dict, List, Optional, Tuple, Union
+from   typing                   import (Any, Dict, Iterator, List, Optional,
+                                        Sequence, Tuple, Union)
 
-from   pyflyby._saveframe       import ExceptionInfo, FrameMetadata
+from   pyflyby._saveframe       import (COMPRESSION_ALGORITHMS, ExceptionInfo,
+                                        FrameMetadata, PICKLE_PROTOCOL,
+                                        SAVEFRAME_FORMAT_VERSION,
+                                        SAVEFRAME_MAGIC, _decompress,
+                                        _read_indexes)
 
 class SaveframeReader:
     """
     A class for reading data saved by the ``saveframe`` utility.
 
-    The ``saveframe`` utility saves data as a pickled Python dictionary.
-    Reading this raw data and extracting values of specific variables or metadata
-    fields can be complex.
+    The ``saveframe`` utility saves data in an indexed file format, where each
+    local variable is pickled separately and an index describes the frames, their
+    metadata and where each value is stored. Files written by older versions of
+    ``saveframe`` (a single pickled Python dictionary) are also supported.
+
+    For the indexed format, only the index is read when the reader is created.
+    ``metadata``, ``variables`` and ``get_metadata`` (except for the pickled
+    'function_object' and 'exception_object' fields) don't unpickle anything,
+    and ``get_variables`` only unpickles the requested values, read through a
+    read-only memory map of the file. Large arrays saved as out-of-band buffers
+    are returned as read-only arrays backed by that memory map.
+
+    For a snapshot series written with ``saveframe(series=True)``, the reader
+    reads the latest snapshot by default; pass ``snapshot`` to read any other.
 
     The ``SaveframeReader`` class provides an easy and efficient way to read this
     raw data and extract specific items. This class has a user-friendly ``repr``
@@ -108,22 +128,156 @@ class SaveframeReader:
     Raw data can be extracted using ``SaveframeReader.data`` property.
     """
 
-    def __init__(self, filename: str) -> None:
+    def __init__(self, filename: str, snapshot: Optional[int] = None) -> None:
         """
         Initializes the ``SaveframeReader`` class.
 
         :param filename:
           The file path where the ``saveframe`` data is stored.
+        :param snapshot:
+          For a snapshot series (see the ``series`` parameter of
+          ``saveframe``), the number of the snapshot to read, starting at 0.
+          Negative numbers count from the latest snapshot. If this parameter is
+          not passed, the latest snapshot is read.
         """
         self._filename = filename
-        self._data: Dict[Any, Any]
+        self._snapshot = 0
+        self._num_snapshots = 1
+        # For the indexed format, the memory map of the file.
+        self._mmap: Optional[mmap.mmap] = None
+        # For the legacy format, the unpickled data.
+        self._legacy_data: Optional[Dict[Any, Any]] = None
+        # The compression algorithm of the pickled values, if any.
+        self._compression: Optional[str] = None
+        # Mapping from frame index to the frame's metadata. The 'variables'
+        # entry maps each variable name to its pickled value (legacy format)
+        # or to the byte range of the pickled value (indexed format).
+        self._frames: Dict[int, Dict[str, Any]]
+        # The exception metadata, or None if no exception info was saved.
+        self._exception: Optional[Dict[str, Any]]
         with open(filename, 'rb') as f:
-            self._data = pickle.load(f)
-        if not isinstance(self._data, dict):
+            if f.read(len(SAVEFRAME_MAGIC)) == SAVEFRAME_MAGIC:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                f.seek(0)
+                self._legacy_data = pickle.load(f)
+        if self._mmap is not None:
+            self._load_index(snapshot)
+            return
+        if snapshot not in (None, 0, -1):
+            raise ValueError(
+                f"Invalid value for 'snapshot': {snapshot}. The file "
+                f"'{filename}' has a single snapshot.")
+        data = self._legacy_data
+        if not isinstance(data, dict):
             raise ValueError(
                 f"The data in the file '{filename}' is of type "
-                f"'{type(self._data).__name__}', which is not valid saveframe "
+                f"'{type(data).__name__}', which is not valid saveframe "
                 "data.")
+        self._frames = {key: value for key, value in data.items()
+                        if isinstance(key, int)}
+        exception_metadata = ExceptionInfo.__dataclass_fields__
+        self._exception = (
+            {key: value for key, value in data.items()
+             if key in exception_metadata}
+            if any(key in data for key in exception_metadata) else None)
+
+
+    def _load_index(self, snapshot: Optional[int]) -> None:
+        """
+        Read the index of the ``snapshot`` of a file in the indexed saveframe
+        format.
+        """
+        mm = self._mmap
+        assert mm is not None
+        def read(offset: int, length: int) -> bytes:
+            return mm[offset:offset + length]
+        try:
+            indexes = _read_indexes(read, len(mm))
+            latest_index = next(indexes)
+            self._num_snapshots = latest_index.get('snapshot', 0) + 1
+            if snapshot is None:
+                snapshot = self._num_snapshots - 1
+            elif snapshot < 0:
+                snapshot += self._num_snapshots
+            if not 0 <= snapshot < self._num_snapshots:
+                raise IndexError
+            index = latest_index
+            for _ in range(self._num_snapshots - 1 - snapshot):
+                index = next(indexes)
+        except ValueError as err:
+            raise ValueError(
+                f"The file '{self._filename}' is truncated or corrupt, and "
+                f"is not valid saveframe data: {err}") from None
+        except IndexError:
+            raise ValueError(
+                f"Invalid value for 'snapshot': {snapshot}. The file "
+                f"'{self._filename}' has {self._num_snapshots} snapshots.") from None
+        self._snapshot = snapshot
+        if index.get('version', 0) > SAVEFRAME_FORMAT_VERSION:
+            raise ValueError(
+                f"The file '{self._filename}' was written by a newer version "
+                f"of saveframe (format version {index['version']}).")
+        self._compression = index.get('compression')
+        if (self._compression is not None and
+                self._compression not in COMPRESSION_ALGORITHMS):
+            raise ValueError(
+                f"The file '{self._filename}' uses an unsupported compression: "
+                f"{self._compression!a}.")
+        self._frames = {frame['frame_index']: frame
+                        for frame in index['frames']}
+        self._exception = index['exception']
+
+
+    def _read_blob(self, blob: Any) -> Any:
+        """
+        Return the pickled data for a value stored in the frames or exception
+        info: either the pickled data itself (legacy format) or a memoryview of
+        the byte range where it is stored (indexed format), decompressed if the
+        file is compressed.
+        """
+        if isinstance(blob, dict):
+            assert self._mmap is not None
+            offset = blob['offset']
+            data = memoryview(self._mmap)[offset:offset + blob['length']]
+            if self._compression is None:
+                return data
+            with data:
+                return _decompress(self._compression, data)
+        return blob
+
+
+    def _unpickle(self, blob: Any) -> Any:
+        """
+        Unpickle a value stored in the frames or exception info.
+
+        Out-of-band buffers are passed to the unpickler as read-only
+        memoryviews of the memory-mapped file, so e.g. NumPy arrays are
+        reconstructed as read-only arrays backed by the file, without copying
+        their data.
+        """
+        data = self._read_blob(blob)
+        buffers = [self._read_blob(buffer)
+                   for buffer in (blob.get('buffers', ())
+                                  if isinstance(blob, dict) else ())]
+        try:
+            return pickle.loads(data, buffers=buffers)
+        finally:
+            if isinstance(data, memoryview):
+                data.release()
+
+
+    def _read_pickled_bytes(self, blob: Any) -> bytes:
+        """
+        Return the pickled data for a value stored in the frames or exception
+        info as bytes that can be unpickled on their own.
+
+        Values with out-of-band buffers are unpickled and pickled again with
+        their buffers in-band.
+        """
+        if isinstance(blob, dict) and blob.get('buffers'):
+            return pickle.dumps(self._unpickle(blob), protocol=PICKLE_PROTOCOL)
+        return bytes(self._read_blob(blob))
 
 
     @property
@@ -134,12 +288,59 @@ class SaveframeReader:
         return self._filename
 
 
+    @property
+    def snapshot(self) -> int:
+        """
+        The number of the snapshot read from the file, starting at 0.
+        """
+        return self._snapshot
+
+
+    @property
+    def num_snapshots(self) -> int:
+        """
+        The number of snapshots in the file. Files not written as a snapshot
+        series have a single snapshot.
+        """
+        return self._num_snapshots
+
+
     @property
     def data(self) -> Dict[Any, Any]:
         """
         Returns the raw ``saveframe`` data as a Python dictionary.
+
+        For files in the indexed format, this reads all the pickled values
+        (copying the out-of-band buffers into them) and unpickles the exception
+        object, so prefer the other accessors for large files.
+        """
+        if self._legacy_data is not None:
+            return self._legacy_data
+        data: Dict[Any, Any] = {}
+        for frame_idx, frame in self._frames.items():
+            frame_data = dict(frame)
+            if not isinstance(frame_data['function_object'], str):
+                frame_data['function_object'] = bytes(
+                    self._read_blob(frame_data['function_object']))
+            frame_data['variables'] = {
+                variable: self._read_pickled_bytes(blob)
+                for variable, blob in frame['variables'].items()}
+            data[frame_idx] = frame_data
+        if self._exception is not None:
+            data.update(self._exception)
+            data['exception_object'] = self._get_exception_object()
+        return data
+
+
+    def _get_exception_object(self) -> Any:
         """
-        return self._data
+        Returns the exception object.
+        """
+        assert self._exception is not None
+        exception_object = self._exception['exception_object']
+        if self._legacy_data is not None or isinstance(exception_object, str):
+            return exception_object
+        return self._unpickle(exception_object)
 
 
     @property
@@ -160,6 +361,21 @@ class SaveframeReader:
         return metadata
 
 
+    @property
+    def skipped_variables(self) -> Dict[int, Dict[str, str]]:
+        """
+        Returns a dict mapping each frame index to the local variables that
+        were not saved for that frame, with the reason why.
+
+        Local variables are not saved when they can't be pickled, or don't fit
+        in the ``max_variable_bytes`` / ``max_total_bytes`` limits passed to
+        ``saveframe``. Files written by older versions of ``saveframe`` don't
+        record them, so an empty dict is returned for each of their frames.
+        """
+        return {frame_idx: dict(frame.get('skipped_variables', {}))
+                for frame_idx, frame in self._frames.items()}
+
+
     @property
     def variables(self) -> Dict[int, List[str]]:
         """
@@ -180,11 +396,9 @@ class SaveframeReader:
         `SaveframeReader.get_variables` method.
         """
         frame_idx_to_variables_map: Dict[int, List[str]] = {}
-        for key_item in self._data:
-            if not isinstance(key_item, int):
-                continue
-            frame_idx_to_variables_map[key_item] = list(
-                self._data[key_item]['variables'].keys())
+        for frame_idx, frame in self._frames.items():
+            frame_idx_to_variables_map[frame_idx] = list(
+                frame['variables'].keys())
         return frame_idx_to_variables_map
 
 
@@ -238,19 +452,21 @@ class SaveframeReader:
                 raise ValueError(
                     "'frame_idx' is not supported for querying exception "
                     f"metadata: {metadata!a}.")
-            return self._data[metadata]
+            if self._exception is None:
+                raise KeyError(metadata)
+            if metadata == "exception_object":
+                return self._get_exception_object()
+            return self._exception[metadata]
         # frame_idx is not passed.
         if frame_idx is None:
             frame_idx_to_metadata_value_map: Dict[Any, Any] = {}
-            for key_item in self._data:
-                if key_item in exception_metadata:
-                    continue
-                metadata_value = self._data[key_item][metadata]
+            for key_item, frame in self._frames.items():
+                metadata_value = frame[metadata]
                 # Unpickle the 'function_object' metadata value.
                 if metadata == "function_object":
                     try:
                         if not isinstance(metadata_value, str):
-                            metadata_value = pickle.loads(metadata_value)
+                            metadata_value = self._unpickle(metadata_value)
                     except Exception as err:
                         logging.warning("Can't unpickle the 'function_object' "
                                         "value for frame: %a. Error: %s",
@@ -266,19 +482,18 @@ class SaveframeReader:
                 "'frame_idx' must be of type 'int', not "
                 f"'{type(frame_idx).__name__}'.")
         try:
-            metadata_value = self._data[frame_idx][metadata]
+            metadata_value = self._frames[frame_idx][metadata]
             if metadata == "function_object":
                 try:
                     if not isinstance(metadata_value, str):
-                        metadata_value = pickle.loads(metadata_value)
+                        metadata_value = self._unpickle(metadata_value)
                 except Exception as err:
                     logging.warning("Can't unpickle the 'function_object' "
                                     "value for frame: %a. Error: %s",
                                     frame_idx, err)
             return metadata_value
         except KeyError:
-            allowed_frame_idx = list(
-                set(self._data.keys()) - set(exception_metadata))
+            allowed_frame_idx = sorted(self._frames)
             raise ValueError(
                 f"Invalid value for 'frame_idx': '{frame_idx}'.  Allowed values "
                 f"are: {allowed_frame_idx}.")
@@ -375,17 +590,15 @@ class SaveframeReader:
         # frame_idx is not passed.
         if frame_idx is None:
             frame_idx_to_variables_map: Dict[int, Any] = {}
-            for key_item in self._data:
-                if not isinstance(key_item, int):
-                    continue
-                variables_map = self._data[key_item]['variables']
+            for key_item, frame in self._frames.items():
+                variables_map = frame['variables']
                 for variable in variables:
                     try:
                         variable_value = variables_map[variable]
                     except KeyError:
                         continue
                     try:
-                        variable_value = pickle.loads(variable_value)
+                        variable_value = self._unpickle(variable_value)
                     except Exception as err:
                         logging.warning(
                             "Can't un-pickle the value of variable %a for frame "
@@ -416,10 +629,9 @@ class SaveframeReader:
                 "'frame_idx' must be of type 'int', not "
                 f"'{type(frame_idx).__name__}'.")
         try:
-            variables_map = self._data[frame_idx]['variables']
+            variables_map = self._frames[frame_idx]['variables']
         except KeyError:
-            allowed_frame_idx = list(
-                set(self._data.keys()) - set(self.metadata))
+            allowed_frame_idx = sorted(self._frames)
             raise ValueError(
                 f"Invalid value for 'frame_idx': '{frame_idx}'. Allowed values "
                 f"are: {allowed_frame_idx}.")
@@ -430,7 +642,7 @@ class SaveframeReader:
             except KeyError:
                 continue
             try:
-                variable_value = pickle.loads(variable_value)
+                variable_value = self._unpickle(variable_value)
             except Exception as err:
                 logging.warning(
                     "Can't un-pickle the value of variable %a for frame "
@@ -449,7 +661,7 @@ class SaveframeReader:
 
     def __str__(self) -> str:
         frames_info: List[str] = []
-        for frame_idx, frame_data in self._data.items():
+        for frame_idx, frame_data in self._frames.items():
             if isinstance(frame_idx, int):
                 frame_info = (
                     f"Frame {frame_idx}:\n"
@@ -463,15 +675,176 @@ class SaveframeReader:
                 )
                 frames_info.append(frame_info)
 
+        exception_data = self._exception or {}
         exception_info = (
             f"Exception:\n"
-            f"  Full String: {self._data.get('exception_full_string')}\n"
-            f"  String: {self._data.get('exception_string')}\n"
-            f"  Class Name: {self._data.get('exception_class_name')}\n"
-            f"  Qualified Name: {self._data.get('exception_class_qualname')}\n"
+            f"  Full String: {exception_data.get('exception_full_string')}\n"
+            f"  String: {exception_data.get('exception_string')}\n"
+            f"  Class Name: {exception_data.get('exception_class_name')}\n"
+            f"  Qualified Name: {exception_data.get('exception_class_qualname')}\n"
         )
 
         return "Frames:\n" + "\n".join(frames_info) + "\n" + exception_info
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(\nfilename: {self._filename!a} \n\n{str(self)})"
+
+
+_QUERY_FRAME_FIELDS = tuple(field for field in FrameMetadata.__dataclass_fields__
+                            if field != 'function_object')
+_QUERY_EXCEPTION_FIELDS = tuple(field for field in ExceptionInfo.__dataclass_fields__
+                                if field != 'exception_object')
+
+QUERY_FIELDS = ('path', 'snapshot', 'num_snapshots') + _QUERY_EXCEPTION_FIELDS + \
+    _QUERY_FRAME_FIELDS
+"""
+The fields of the records returned by `query_saveframes` that can be used to
+group them with `group_saveframes`. The frame fields describe the first saved
+frame from the bottom of the stack trace (usually the error frame).
+"""
+
+
+def _iter_saveframe_files(paths: Sequence[str], pattern: str) -> Iterator[str]:
+    """
+    Yield the files in ``paths``, walking directories recursively for files
+    whose name matches ``pattern``.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(fnmatch.filter(filenames, pattern)):
+                yield os.path.join(dirpath, filename)
+
+
+def _read_saveframe_record(path: str, unpickle: bool) -> Dict[str, Any]:
+    """
+    Read the metadata saved in the file ``path`` into a flat record. See
+    `query_saveframes`.
+    """
+    record: Dict[str, Any] = {'path': path}
+    try:
+        if not unpickle:
+            with open(path, 'rb') as f:
+                if f.read(len(SAVEFRAME_MAGIC)) != SAVEFRAME_MAGIC:
+                    raise ValueError(
+                        "The file is not in the indexed saveframe format, so "
+                        "it can only be read by unpickling it. Pass "
+                        "unpickle=True to read it.")
+        reader = SaveframeReader(path)
+        frames: List[Dict[str, Any]] = []
+        for _, frame in sorted(reader._frames.items()):
+            frame_record = {field: frame[field] for field in _QUERY_FRAME_FIELDS}
+            frame_record['variables'] = list(frame['variables'])
+            frame_record['skipped_variables'] = dict(
+                frame.get('skipped_variables', {}))
+            frames.append(frame_record)
+        exception = dict(reader._exception or {})
+        if unpickle and reader._exception is not None:
+            exception['exception_object'] = reader._get_exception_object()
+    except Exception as err:
+        return {'path': path, 'error': f"{type(err).__name__}: {err}"}
+    record['snapshot'] = reader.snapshot
+    record['num_snapshots'] = reader.num_snapshots
+    for field in _QUERY_EXCEPTION_FIELDS:
+        record[field] = exception.get(field)
+    for field in _QUERY_FRAME_FIELDS:
+        record[field] = frames[0][field] if frames else None
+    if 'exception_object' in exception and unpickle:
+        record['exception_object'] = exception['exception_object']
+    record['frames'] = frames
+    return record
+
+
+def query_saveframes(paths: Union[str, Sequence[str]], *,
+                     pattern: str = '*.pkl',
+                     max_workers: Optional[int] = None,
+                     unpickle: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Read the metadata of many ``saveframe`` files in parallel.
+
+    Only the index of each file is read: local variables, function objects and
+    exception objects are not unpickled, unless ``unpickle`` is True. Yields one
+    flat record per file, in the order of ``paths``, with the fields in
+    `QUERY_FIELDS` and a ``'frames'`` list holding the metadata, variable names
+    and skipped variables of each saved frame. Files that can't be read yield
+    ``{'path': path, 'error': message}`` instead.
+
+    **Example usage:**
+
+    ::
+
+      >> for record in query_saveframes('/path/to/dumps'):
+      ..     print(record['path'], record['exception_full_string'])
+
+    :param paths:
+      Saveframe files, or directories to scan recursively for them.
+    :param pattern:
+      Glob pattern of the file names to read when scanning directories.
+    :param max_workers:
+      The number of threads reading the files. Default is None, which uses the
+      default number of threads of ``concurrent.futures.ThreadPoolExecutor``.
+    :param unpickle:
+      Also read files written by older versions of ``saveframe`` (which can
+      only be read by unpickling them) and add the unpickled exception object
+      to the records as ``'exception_object'``. Only pass this for trusted
+      files.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    if max_workers is not None and (
+            not isinstance(max_workers, int) or max_workers <= 0):
+        raise ValueError(
+            "Value of 'max_workers' must be a positive integer. Got: "
+            f"{max_workers!a}.")
+    filenames = list(_iter_saveframe_files(paths, pattern))
+    if max_workers == 1:
+        for filename in filenames:
+            yield _read_saveframe_record(filename, unpickle)
+        return
+    with ThreadPoolExecutor(max_workers=max_workers,
+                            thread_name_prefix="saveframe-query") as executor:
+        yield from executor.map(
+            lambda filename: _read_saveframe_record(filename, unpickle),
+            filenames)
+
+
+def group_saveframes(records: Any,
+                     by: Sequence[str] = ('exception_class_qualname',
+                                          'frame_identifier'),
+                     ) -> List[Dict[str, Any]]:
+    """
+    Group the records returned by `query_saveframes` by the values of the
+    fields ``by``.
+
+    Returns a list with a dict per group holding the values of the ``by``
+    fields, the ``'count'`` of records and their ``'paths'``, largest group
+    first. Records of files that couldn't be read are ignored.
+
+      >>> records = [
+      ...     {'path': 'a.pkl', 'exception_class_qualname': 'KeyError'},
+      ...     {'path': 'b.pkl', 'exception_class_qualname': 'ValueError'},
+      ...     {'path': 'c.pkl', 'exception_class_qualname': 'ValueError'},
+      ...     {'path': 'd.pkl', 'error': 'OSError: ...'}]
+      >>> for group in group_saveframes(records, by=['exception_class_qualname']):
+      ...     print(group)
+      {'exception_class_qualname': 'ValueError', 'count': 2, 'paths': ['b.pkl', 'c.pkl']}
+      {'exception_class_qualname': 'KeyError', 'count': 1, 'paths': ['a.pkl']}
+    """
+    if isinstance(by, str):
+        by = (by,)
+    for field in by:
+        if field not in QUERY_FIELDS:
+            raise ValueError(
+                f"Invalid field to group by: {field!a}. Allowed fields are: "
+                f"{list(QUERY_FIELDS)}.")
+    groups: Dict[Tuple[Any, ...], List[str]] = {}
+    for record in records:
+        if 'error' in record:
+            continue
+        key = tuple(record.get(field) for field in by)
+        groups.setdefault(key, []).append(record['path'])
+    return [dict(zip(by, key), count=len(paths), paths=paths)
+            for key, paths in sorted(groups.items(), key=lambda item: -len(item[1]))]
@@ -0,0 +1,237 @@
+# pyflyby/_symbolindex.py.
+# License: MIT http://opensource.org/licenses/MIT
+
+"""
+Reverse index from symbol names to the modules that export them.
+
+The index is built offline (``collect-exports --all --symbol-index=FILE``)
+from `ModuleHandle.exports` across the installed environment, and stored as a
+small sqlite database.  It is opt-in: it is only consulted when
+``$PYFLYBY_SYMBOL_INDEX`` names the index file.  find-import, tidy-imports and
+the auto-importer then fall back to it for names that have no entry in the
+known-imports database.
+
+When several modules export a name, candidates are ranked by a policy chosen
+with ``$PYFLYBY_SYMBOL_INDEX_POLICY``; see `RANKING_POLICIES`.
+"""
+
+from __future__ import annotations, print_function
+
+import os
+from   typing                   import (Any, Callable, Dict, Iterable, List,
+                                        Optional, Sequence, TYPE_CHECKING,
+                                        Tuple)
+
+from   pyflyby._importstmt      import Import
+from   pyflyby._log             import logger
+
+if TYPE_CHECKING:
+    # sqlite3 is imported where it's used, since most processes never open
+    # an index and importing it slows down e.g. ``py``.
+    import sqlite3
+
+
+def _is_private_module(module_name: str) -> bool:
+    return any(p.startswith("_") for p in module_name.split("."))
+
+
+def _is_test_module(module_name: str) -> bool:
+    return any(p in ("test", "tests", "testing") or p.startswith("test_")
+               for p in module_name.split("."))
+
+
+def _rank_public_shallow(candidates: Sequence[str]) -> List[str]:
+    """
+    Prefer public modules, then non-test modules, then shallower ones.
+
+      >>> _rank_public_shallow(["a._b", "a.b.c", "test.b", "a.b", "_a"])
+      ['a.b', 'a.b.c', 'test.b', '_a', 'a._b']
+    """
+    return sorted(candidates,
+                  key=lambda m: (_is_private_module(m), _is_test_module(m),
+                                 m.count("."), m))
+
+
+def _rank_shallow(candidates: Sequence[str]) -> List[str]:
+    """
+    Prefer shallower modules.
+
+      >>> _rank_shallow(["a._b", "a.b.c", "a.b", "_a"])
+      ['_a', 'a._b', 'a.b', 'a.b.c']
+    """
+    return sorted(candidates, key=lambda m: (m.count("."), m))
+
+
+def _rank_unique(candidates: Sequence[str]) -> List[str]:
+    """
+    Only accept a name exported by exactly one module.
+
+      >>> _rank_unique(["a.b"])
+      ['a.b']
+      >>> _rank_unique(["a.b", "a.c"])
+      []
+    """
+    return list(candidates) if len(candidates) == 1 else []
+
+
+RANKING_POLICIES: Dict[str, Callable[[Sequence[str]], List[str]]] = {
+    "public-shallow": _rank_public_shallow,
+    "shallow"       : _rank_shallow,
+    "unique"        : _rank_unique,
+}
+"""
+Ways to rank the modules exporting a symbol, best first.  A policy may also
+drop candidates (``"unique"`` drops all of them if there is more than one).
+"""
+
+DEFAULT_POLICY = "public-shallow"
+
+
+_SCHEMA = """
+    CREATE TABLE modules (
+        id   INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    );
+    CREATE TABLE symbols (
+        name      TEXT    NOT NULL,
+        module_id INTEGER NOT NULL REFERENCES modules(id),
+        PRIMARY KEY (name, module_id)
+    ) WITHOUT ROWID;
+"""
+
+
+class SymbolIndex:
+    """
+    A reverse index from symbol name to the modules that export it.
+    """
+
+    filename: str
+    policy: str
+
+    _default_cache: Dict[Tuple[str, str], Optional["SymbolIndex"]] = {}
+
+    def __init__(self, filename: str, policy: str = DEFAULT_POLICY):
+        if policy not in RANKING_POLICIES:
+            raise ValueError(
+                "SymbolIndex: unknown ranking policy %r; expected one of %s"
+                % (policy, ", ".join(sorted(RANKING_POLICIES))))
+        self.filename = str(filename)
+        self.policy = policy
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def get_default(cls) -> Optional["SymbolIndex"]:
+        """
+        Return the index named by ``$PYFLYBY_SYMBOL_INDEX``, ranked by
+        ``$PYFLYBY_SYMBOL_INDEX_POLICY``, or ``None`` if not configured.
+
+        Memoized.
+        """
+        filename = os.environ.get("PYFLYBY_SYMBOL_INDEX", "")
+        if not filename:
+            return None
+        policy = os.environ.get("PYFLYBY_SYMBOL_INDEX_POLICY", "") \
+            or DEFAULT_POLICY
+        key = (filename, policy)
+        try:
+            return cls._default_cache[key]
+        except KeyError:
+            pass
+        try:
+            result: Optional[SymbolIndex] = cls(filename, policy)
+        except ValueError as e:
+            logger.warning("%s", e)
+            result = None
+        cls._default_cache[key] = result
+        return result
+
+    @classmethod
+    def build(
+        cls, filename: str, exports: Iterable[Tuple[str, Iterable[str]]]
+    ) -> int:
+        """
+        Write a new index to ``filename``, replacing any existing one.
+
+        The index is written to a temporary file first and then renamed into
+        place, so readers never see a partial index.
+
+        :param exports:
+          Iterable of ``(module_name, symbol_names)``.
+        :return:
+          Number of (symbol, module) entries written.
+        """
+        import sqlite3
+        filename = str(filename)
+        tmp = "%s.tmp.%s" % (filename, os.getpid())
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        count = 0
+        connection = sqlite3.connect(tmp)
+        try:
+            connection.executescript(_SCHEMA)
+            for module_name, names in exports:
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO modules (name) VALUES (?)",
+                    (module_name,))
+                if not cursor.rowcount:
+                    continue
+                module_id = cursor.lastrowid
+                rows = [(n, module_id) for n in set(names)]
+                connection.executemany(
+                    "INSERT INTO symbols (name, module_id) VALUES (?, ?)",
+                    rows)
+                count += len(rows)
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(tmp, filename)
+        cls._default_cache.clear()
+        return count
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            import sqlite3
+            uri = "file:%s?mode=ro" % (os.path.abspath(self.filename),)
+            self._connection = sqlite3.connect(
+                uri, uri=True, check_same_thread=False)
+        return self._connection
+
+    def modules_exporting(self, name: str) -> List[str]:
+        """
+        Return the modules exporting ``name``, best first according to the
+        ranking policy.
+
+        Returns an empty list if the index can't be read.
+        """
+        import sqlite3
+        try:
+            rows = self.connection.execute(
+                "SELECT modules.name FROM symbols JOIN modules "
+                "ON symbols.module_id = modules.id WHERE symbols.name = ?",
+                (name,)).fetchall()
+        except sqlite3.Error as e:
+            logger.debug("Couldn't read symbol index %s: %s",
+                         self.filename, e)
+            return []
+        return RANKING_POLICIES[self.policy]([r[0] for r in rows])
+
+    def find_import(self, name: str, exclude: Any = ()) -> Optional[Import]:
+        """
+        Return an import for ``name`` from the best-ranked module exporting
+        it, or ``None``.
+
+        :param exclude:
+          Imports not to return, e.g. ``ImportDB.forget_imports``.
+        """
+        for module_name in self.modules_exporting(name):
+            imp = Import.from_parts("%s.%s" % (module_name, name), name)
+            if imp in exclude:
+                continue
+            logger.debug("Symbol index %s: using %r", self.filename, str(imp))
+            return imp
+        return None
+
+    def __repr__(self) -> str:
+        return "%s(%r, policy=%r)" % (
+            type(self).__name__, self.filename, self.policy)
@@ -12,6 +12,13 @@ to::
 If filenames are given on the command line, rewrites them.  Otherwise, if
 stdin is not a tty, read from stdin and write to stdout.
 
+With --refactor (for moving a module across a whole repository), files are
+first scanned for the first component of any OLD name with a fast byte-level
+search.  Only files that mention one are transformed, in a pool of --jobs
+worker processes; other files are left alone entirely (their imports aren't
+reformatted either).  A summary of the changed files and the number of lines
+changed in each is logged at the end.
+
 """
 
 # pyflyby/_transform_imports.py
@@ -19,8 +26,133 @@ stdin is not a tty, read from stdin and write to stdout.
 # License: MIT http://opensource.org/licenses/MIT
 
 
-from   pyflyby._cmdline         import hfmt, parse_args, process_actions
+from   concurrent.futures       import ProcessPoolExecutor
+import difflib
+import mmap
+import os
+import re
+
+from   pyflyby._cmdline         import (filename_args, hfmt, parse_args,
+                                        process_actions)
+from   pyflyby._file            import FileText, Filename, read_file
 from   pyflyby._imports2s       import transform_imports
+from   pyflyby._log             import logger
+
+
+def _prefilter_regex(transformations):
+    """
+    Return a bytes regex matching the first component of any key of
+    ``transformations``, as a whole word.
+
+    A file can only be changed by a transformation if it mentions the first
+    component of its key (``from aa import bb`` mentions ``aa`` but not
+    ``aa.bb``).
+
+      >>> bool(_prefilter_regex({"aa.bb": "x"}).search(b"from aa import bb"))
+      True
+      >>> bool(_prefilter_regex({"aa.bb": "x"}).search(b"import aaa, baa"))
+      False
+    """
+    words = sorted({k.split(".")[0] for k in transformations},
+                   key=len, reverse=True)
+    alternatives = []
+    for word in words:
+        escaped = re.escape(word.encode("utf-8"))
+        if re.fullmatch(r"\w+", word):
+            escaped = rb"(?<!\w)" + escaped + rb"(?!\w)"
+        alternatives.append(escaped)
+    return re.compile(b"|".join(alternatives))
+
+
+def _mentions(filename, regex):
+    """
+    Return whether the file ``filename`` contains a match for ``regex``.
+
+    Files that can't be scanned count as matching, so that the full pipeline
+    reports the error.
+    """
+    try:
+        with open(filename, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return regex.search(data) is not None
+    except (OSError, ValueError):
+        return True
+
+
+_worker_args = None
+
+def _init_worker(*args):
+    global _worker_args
+    _worker_args = args
+
+
+def _transform_file(filename):
+    """
+    Transform ``filename`` in a worker process.
+
+    :return:
+      ``(filename, input_text, output_text, num_changed_lines)``; the texts
+      are ``None`` if the file couldn't be transformed, in which case the main
+      process transforms it again to report the error.
+    """
+    transformations, params, transform_strings = _worker_args
+    try:
+        input = read_file(Filename(filename))
+        output = FileText(transform_imports(
+            input, transformations, params=params,
+            transform_strings=transform_strings))
+    except Exception:
+        return filename, None, None, 0
+    matcher = difflib.SequenceMatcher(
+        None, input.lines, output.lines, autojunk=False)
+    num_changed_lines = sum(max(i2 - i1, j2 - j1)
+                            for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+                            if tag != 'equal')
+    return filename, input.joined, output.joined, num_changed_lines
+
+
+def _refactor(args, transformations, options):
+    """
+    Find the files among ``args`` that mention a transformation, transform
+    them in parallel, and run the actions on them.
+    """
+    filenames = [str(f) for f in filename_args(args, on_error=lambda f: None)
+                 if f != Filename.STDIN]
+    regex = _prefilter_regex(transformations)
+    candidates = [f for f in filenames if _mentions(f, regex)]
+    logger.info("Scanned %d files; %d mention a transformation",
+                len(filenames), len(candidates))
+    worker_args = (transformations, options.params, options.transform_strings)
+    jobs = options.jobs or os.cpu_count() or 1
+    if jobs <= 1 or len(candidates) <= 1:
+        _init_worker(*worker_args)
+        results = list(map(_transform_file, candidates))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=worker_args) as executor:
+            results = list(executor.map(_transform_file, candidates,
+                                        chunksize=max(1, min(16, len(
+                                            candidates) // (jobs * 4)))))
+    outputs = {filename: (input_text, output_text)
+               for filename, input_text, output_text, _ in results
+               if input_text is not None}
+    def modify(x):
+        input_text, output_text = outputs.get(str(x.filename), (None, None))
+        if input_text is not None and input_text == x.joined:
+            return output_text
+        return transform_imports(x, transformations, params=options.params,
+                                 transform_strings=options.transform_strings)
+    try:
+        process_actions(candidates, options.actions, modify)
+    finally:
+        changed = [(filename, n) for filename, input_text, output_text, n
+                   in results if input_text != output_text]
+        for filename, n in changed:
+            logger.info("%s: %d line(s) changed", filename, n)
+        logger.info("Changed %d of %d files (%d lines in total)",
+                    len(changed), len(filenames), sum(n for _, n in changed))
 
 
 def main():
@@ -49,8 +181,20 @@ def main():
                                 When using --transform, also replace matches
                                 inside string literals (including docstrings
                                 and f-string text).  Off by default.'''))
+        parser.add_option('--refactor', default=False, action='store_true',
+                          help=hfmt('''
+                                Only transform files that mention a name to
+                                transform (found by a fast scan), in parallel,
+                                and log a summary of the changes.  Files that
+                                don't mention one are left alone.'''))
+        parser.add_option("--jobs", "-j", type="int", default=0,
+                          help=hfmt('''
+                                With --refactor, number of worker processes.
+                                Default: number of CPUs.'''))
     options, args = parse_args(
         addopts, modify_action_params=True)
+    if options.refactor and args and transformations:
+        _refactor(args, transformations, options)
     def modify(x):
         return transform_imports(x, transformations, params=options.params,
                                  transform_strings=options.transform_strings)
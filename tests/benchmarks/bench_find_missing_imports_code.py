@@ -0,0 +1,79 @@
+"""
+Benchmark finding missing imports in code objects.
+
+Collects the functions and methods of some large modules and reports how long
+`find_missing_imports` takes on all of their code objects, first with an empty
+cache and then again with the results cached.
+
+Usage::
+
+  $ python tests/benchmarks/bench_find_missing_imports_code.py [--repeat=N] [MODULE...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import time
+import types
+
+from   pyflyby._autoimp         import (_loads_without_stores_cache,
+                                        find_missing_imports)
+
+
+DEFAULT_MODULES = [
+    "argparse", "ast", "difflib", "email.message", "http.client", "inspect",
+    "logging", "pydoc", "tarfile", "typing", "unittest.case",
+]
+
+
+def collect_code_objects(module_names):
+    """
+    Return the code objects of the functions and methods defined in the
+    modules named ``module_names``.
+    """
+    codes = []
+    for module_name in module_names:
+        module = importlib.import_module(module_name)
+        for value in vars(module).values():
+            if isinstance(value, types.FunctionType):
+                codes.append(value.__code__)
+            elif isinstance(value, type):
+                for attr in vars(value).values():
+                    if isinstance(attr, types.FunctionType):
+                        codes.append(attr.__code__)
+    return codes
+
+
+def bench(codes, repeat):
+    uncached_times = []
+    cached_times = []
+    for _ in range(repeat):
+        _loads_without_stores_cache.clear()
+        start = time.perf_counter()
+        for co in codes:
+            find_missing_imports(co, [{}])
+        uncached_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        for co in codes:
+            find_missing_imports(co, [{}])
+        cached_times.append(time.perf_counter() - start)
+    return min(uncached_times), min(cached_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES,
+                        help="Modules whose functions to scan.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of timed runs; the best is reported.")
+    args = parser.parse_args()
+    codes = collect_code_objects(args.modules)
+    print(f"{len(codes)} code objects from {len(args.modules)} modules")
+    uncached_time, cached_time = bench(codes, args.repeat)
+    print(f"  uncached: {uncached_time * 1000:9.1f} ms")
+    print(f"  cached:   {cached_time * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark livepatch/xreload on large modules.
+
+Generates a temporary module with many functions, a deep class hierarchy and
+deeply nested data and objects, imports it, and reports:
+
+  - how long ``livepatch`` takes to patch the module with a freshly executed
+    copy of it (excluding the time to execute the module), and
+  - how long a scoped ``xreload`` takes after editing one function.
+
+Usage::
+
+  $ python tests/benchmarks/bench_livepatch.py [--functions=N] [--class-depth=N] [--nesting=N] [--repeat=N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+from   shutil                   import rmtree
+import sys
+from   tempfile                 import mkdtemp
+import time
+import types
+
+from   pyflyby._livepatch       import livepatch, xreload
+
+
+def make_source(num_functions, class_depth, nesting, version):
+    """
+    Return the source of a module with ``num_functions`` functions, a chain of
+    ``class_depth`` subclasses, and a dict and a linked list of objects nested
+    ``nesting`` levels deep.  ``version`` changes the return value of the
+    first function.
+    """
+    lines = []
+    for i in range(num_functions):
+        value = version if i == 0 else i
+        lines.append(f"def function_{i}(x):\n    return x + {value}\n")
+    lines.append("class Class_0:\n    def method(self):\n        return 0\n")
+    for i in range(1, class_depth):
+        lines.append(f"class Class_{i}(Class_{i-1}):\n"
+                     f"    def method_{i}(self):\n        return {i}\n")
+    lines.append(
+        "class Node:\n"
+        "    def __init__(self, child):\n"
+        "        self.child = child\n"
+        "\n"
+        "def _make_data(nesting):\n"
+        "    node = None\n"
+        "    nested = inner = {}\n"
+        "    for _ in range(nesting):\n"
+        "        node = Node(node)\n"
+        "        inner['child'] = {}\n"
+        "        inner = inner['child']\n"
+        "    return node, nested\n"
+        "\n"
+        f"NODES, NESTED = _make_data({nesting})\n")
+    return "\n".join(lines)
+
+
+def execute(name, filename, source):
+    """
+    Execute ``source`` in a new module named ``name``.
+    """
+    module = types.ModuleType(name)
+    module.__file__ = filename
+    exec(compile(source, filename, "exec"), module.__dict__)
+    return module
+
+
+def bench(num_functions, class_depth, nesting, repeat):
+    directory = mkdtemp(prefix="pyflyby_bench_livepatch_")
+    sys.path.insert(0, directory)
+    name = "bench_livepatch_module"
+    filename = os.path.join(directory, f"{name}.py")
+    try:
+        with open(filename, "w") as f:
+            f.write(make_source(num_functions, class_depth, nesting, 0))
+        module = __import__(name)
+        function_0 = module.function_0
+        livepatch_times = []
+        for version in range(1, repeat + 1):
+            new_module = execute(
+                name, filename,
+                make_source(num_functions, class_depth, nesting, version))
+            start = time.perf_counter()
+            livepatch(module, new_module, name, assume_type=types.ModuleType)
+            livepatch_times.append(time.perf_counter() - start)
+            assert function_0(0) == version
+        # The first reload records the loaded source for scoped reloads.
+        xreload(module)
+        scoped_times = []
+        for version in range(repeat + 1, 2 * repeat + 1):
+            with open(filename, "w") as f:
+                f.write(make_source(num_functions, class_depth, nesting,
+                                    version))
+            start = time.perf_counter()
+            xreload(module, scoped=True)
+            scoped_times.append(time.perf_counter() - start)
+            assert function_0(0) == version
+        return min(livepatch_times), min(scoped_times)
+    finally:
+        sys.modules.pop(name, None)
+        sys.path.remove(directory)
+        rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--functions", type=int, default=5000,
+                        help="Number of functions in the module.")
+    parser.add_argument("--class-depth", type=int, default=500,
+                        help="Depth of the class hierarchy.")
+    parser.add_argument("--nesting", type=int, default=5000,
+                        help="Nesting depth of the data and objects.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of timed runs; the best is reported.")
+    args = parser.parse_args()
+    print(f"{args.functions} functions, class depth {args.class_depth}, "
+          f"nesting {args.nesting} (recursion limit "
+          f"{sys.getrecursionlimit()})")
+    livepatch_time, scoped_time = bench(
+        args.functions, args.class_depth, args.nesting, args.repeat)
+    print(f"  livepatch module: {livepatch_time * 1000:9.1f} ms")
+    print(f"  scoped xreload:   {scoped_time * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark how long importing the ``py`` command takes.
+
+Runs ``python -X importtime -c "import pyflyby._py"`` in fresh processes and
+reports the best total import time, the number of modules imported, and the
+modules that took longest.  Exits with status 1 if the import takes longer
+than ``--max-ms`` or imports any of the modules that a simple ``py`` command
+shouldn't need, so it can guard against startup regressions.
+
+Usage::
+
+  $ python tests/benchmarks/bench_py_startup.py [--repeat=N] [--top=N] [--max-ms=MS]
+"""
+
+from __future__ import annotations
+
+import argparse
+import subprocess
+import sys
+
+
+# Modules that ``py 'os.getcwd()'`` has no use for.
+FORBIDDEN_MODULES = [
+    "IPython", "doctest", "pdb", "pyflyby._imports2s", "pyflyby._interactive",
+    "pyflyby._livepatch", "pyflyby._saveframe", "pyflyby._saveframe_reader",
+]
+
+
+def importtime(module_name):
+    """
+    Import ``module_name`` in a fresh interpreter with ``-X importtime``.
+
+    :return:
+      ``(total_us, {module: self_us})``.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import %s" % module_name],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        check=True)
+    self_times = {}
+    total = None
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        self_times[name] = int(self_us)
+        if name == module_name:
+            total = int(cumulative_us)
+    assert total is not None, proc.stderr
+    return total, self_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default="pyflyby._py",
+                        help="Module to import.")
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="Number of runs; the best is reported.")
+    parser.add_argument("--top", type=int, default=15,
+                        help="Number of slowest modules to list.")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="Fail if the best import time exceeds this.")
+    args = parser.parse_args()
+    runs = [importtime(args.module) for _ in range(args.repeat)]
+    total, self_times = min(runs, key=lambda run: run[0])
+    print(f"import {args.module}: {total / 1000:.1f} ms, "
+          f"{len(self_times)} modules (best of {args.repeat})")
+    for name, us in sorted(self_times.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"  {us / 1000:7.1f} ms  {name}")
+    failed = False
+    forbidden = sorted(set(self_times) & set(FORBIDDEN_MODULES))
+    if forbidden:
+        print("Imports modules it shouldn't need: %s" % ", ".join(forbidden))
+        failed = True
+    if args.max_ms is not None and total / 1000 > args.max_ms:
+        print(f"Slower than --max-ms={args.max_ms}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,8 +15,9 @@ from   textwrap                 import dedent
 
 from   pyflyby                  import (Filename, ImportDB, auto_eval,
                                         auto_import, find_missing_imports)
-from   pyflyby._autoimp         import (LoadSymbolError, load_symbol,
-                                        scan_for_import_issues)
+from   pyflyby._autoimp         import (LoadSymbolError,
+                                        _loads_without_stores_cache,
+                                        load_symbol, scan_for_import_issues)
 from   pyflyby._flags           import CompilerFlags
 from   pyflyby._idents          import DottedIdentifier
 from   pyflyby._importstmt      import Import
@@ -949,6 +950,25 @@ def test_find_missing_imports_code_1():
     assert expected == result
 
 
+def test_find_missing_imports_code_cached_1():
+    # Verify that results are cached per code object, and that equal code
+    # objects share a cache entry.
+    source = "def f():\n    return foo.bar(x) + (lambda: baz)()\n"
+    ns1 = {}
+    exec(compile(source, "<test>", "exec"), ns1)
+    co = ns1["f"].__code__
+    result = _dilist2strlist(find_missing_imports(co, [{}]))
+    assert result == ['baz', 'foo.bar', 'x']
+    assert co in _loads_without_stores_cache
+    ns2 = {}
+    exec(compile(source, "<test>", "exec"), ns2)
+    assert ns2["f"].__code__ is not co
+    assert _loads_without_stores_cache[ns2["f"].__code__] == frozenset(
+        ['baz', 'foo.bar', 'x'])
+    result = _dilist2strlist(find_missing_imports(co, [{"x": 1}]))
+    assert result == ['baz', 'foo.bar']
+
+
 def test_find_missing_imports_code_args_1():
     def f(x, y, *a, **k):
         return g(x, y, z, a, k) # noqa: F821
@@ -2349,6 +2369,53 @@ def test_auto_import_custom_in_pkg_1(tpp, pyflyby_log, capsys):
     assert out == "hello  there\n"
 
 
+def test_auto_import_lazy_1(tpp, pyflyby_log, capsys):
+    os.mkdir(str(tpp/"wagon61820334"))
+    writetext(tpp/"wagon61820334/__init__.py", """
+        print('loading wagon')
+    """)
+    writetext(tpp/"wagon61820334/axle.py", """
+        print('loading axle')
+        def spin():
+            return 'spun'
+    """)
+    code = "def f():\n    return wagon61820334.axle.spin()\n"
+    namespace = {}
+    assert auto_import(code, [namespace], lazy=True) is True
+    assert pyflyby_log.messages == ["import wagon61820334.axle (lazy)"]
+    out, _ = capsys.readouterr()
+    assert out == ""
+    exec(code, namespace)
+    assert namespace["f"]() == "spun"
+    out, _ = capsys.readouterr()
+    assert out == "loading wagon\nloading axle\n"
+    assert namespace["wagon61820334"] is sys.modules["wagon61820334"]
+
+
+def test_auto_import_lazy_top_level_use_1(tpp, pyflyby_log, capsys):
+    writetext(tpp/"caboose45170923.py", """
+        print('loading caboose')
+        x = y = 1
+    """)
+    # Used at the top level too, so it's needed right away.
+    code = "def f():\n    return caboose45170923.x\ncaboose45170923.y\n"
+    assert auto_import(code, [{}], lazy=True) is True
+    assert pyflyby_log.messages == ["import caboose45170923"]
+    out, _ = capsys.readouterr()
+    assert out == "loading caboose\n"
+
+
+def test_auto_import_lazy_default_off_1(tpp, pyflyby_log, capsys):
+    writetext(tpp/"tender93381655.py", """
+        print('loading tender')
+        x = 1
+    """)
+    assert auto_import("lambda: tender93381655.x", [{}]) is True
+    assert pyflyby_log.messages == ["import tender93381655"]
+    out, _ = capsys.readouterr()
+    assert out == "loading tender\n"
+
+
 def test_auto_import_unknown_1(pyflyby_log):
     # Verify that if we try to access something that doesn't appear to be a
     # module, we don't attempt to import it (or at least don't log any visible
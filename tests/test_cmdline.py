@@ -222,6 +222,71 @@ def test_reformat_imports_1():
     assert result == expected
 
 
+def test_prune_broken_imports_1():
+    # Verify that the imports of all files are probed together and that
+    # results are cached.
+    with tempfile.TemporaryDirectory() as d, \
+         tempfile.TemporaryDirectory() as cache:
+        for name in ["a.py", "b.py"]:
+            with open(os.path.join(d, name), "w") as f:
+                f.write(dedent('''
+                    import os, omgdoesntexist_73510264
+                    from json import dumps
+                ''').lstrip())
+        env = dict(os.environ, PYTHONPATH=d, XDG_CACHE_HOME=cache)
+        command = ["-m", "pyflyby._prune_broken_imports", "--jobs=2",
+                   "--print", "--debug", "a.py", "b.py"]
+        expected = dedent('''
+            from   json                     import dumps
+            import os
+        ''').lstrip()
+        # The second run finds all the results in the cache.
+        for num_probed in [3, 0]:
+            result = pipe(command, cwd=d, env=env)
+            output = "\n".join(line for line in result.splitlines()
+                               if not line.startswith("[PYFLYBY]"))
+            assert output == (expected * 2).strip()
+            probing = [line for line in result.splitlines()
+                       if "] Probing " in line]
+            if num_probed:
+                assert len(probing) == 1
+                assert "Probing %s import(s)" % num_probed in probing[0]
+            else:
+                assert probing == []
+
+
+def test_transform_imports_refactor_1():
+    # Verify that --refactor only transforms (and reformats) files that
+    # mention a name to transform, and logs a summary.
+    with tempfile.TemporaryDirectory() as d:
+        files = {
+            "a.py": "from   aa.bb  import cc\nprint(aa.bb.dd)\n",
+            "b.py": "import  os\nos\n",
+            "c.py": "def f():\n    import aa.bb\n    return aa.bb\n",
+            "d.py": "import aaa.bb\naaa.bb\n",
+        }
+        for name, content in files.items():
+            with open(os.path.join(d, name), "w") as f:
+                f.write(content)
+        result = pipe(["-m", "pyflyby._transform_imports", "--refactor",
+                       "--jobs=2", "--transform", "aa.bb=xx.yy", "-r", d])
+        expected = {
+            "a.py": ("from   xx.yy                    import cc\n"
+                     "print(xx.yy.dd)\n"),
+            "b.py": files["b.py"],
+            "c.py": "def f():\n    import xx.yy\n    return xx.yy\n",
+            "d.py": files["d.py"],
+        }
+        for name, content in expected.items():
+            with open(os.path.join(d, name)) as f:
+                assert f.read() == content
+        lines = result.splitlines()
+        assert lines[0] == "[PYFLYBY] Scanned 4 files; 2 mention a transformation"
+        assert "[PYFLYBY] %s: 2 line(s) changed" % (
+            os.path.join(d, "a.py"),) in lines
+        assert lines[-1] == "[PYFLYBY] Changed 2 of 4 files (4 lines in total)"
+
+
 def test_collect_imports_1():
     with tempfile.NamedTemporaryFile(suffix=".py", mode='w+') as f:
         f.write(dedent('''
@@ -301,6 +366,20 @@ def test_collect_exports_1():
 
     assert result == expected
 
+def test_collect_exports_jobs_1():
+    result = pipe(["-m", "pyflyby._collect_exports", "--jobs=2",
+                   "fractions", "pyflyby_no_such_module_29402", "shlex"])
+    lines = result.splitlines()
+    assert lines[0] == "from   fractions                import Fraction"
+    assert lines[1].startswith(
+        "[PYFLYBY] couldn't get exports for pyflyby_no_such_module_29402;")
+    assert lines[2:] == [
+        "from   shlex                    import join, quote, shlex, split",
+        "collect-exports: there were problems with: "
+        "pyflyby_no_such_module_29402",
+    ]
+
+
 def test_collect_exports_module_1():
     with tempfile.TemporaryDirectory() as d:
         os.mkdir(os.path.join(d, 'test_mod'))
@@ -955,6 +955,62 @@ def test_remote_print_stack_to_file_calls_inject(monkeypatch):
     assert any("traceback" in s for s in captured["statements"])
 
 
+def _inject_here(pid, statements, wait=True):
+    # Stand-in for `dbg.inject` that runs the statements in this process.
+    assert pid == os.getpid()
+    for statement in statements:
+        exec(statement, {})
+
+
+@pytest.fixture
+def waiting_thread():
+    import threading
+    event = threading.Event()
+    def bellport_waiting():
+        event.wait()
+    thread = threading.Thread(target=bellport_waiting, name="Bellport")
+    thread.start()
+    try:
+        yield thread
+    finally:
+        event.set()
+        thread.join()
+
+
+def test_remote_stacks_all_threads(monkeypatch, waiting_thread):
+    monkeypatch.setattr(dbg, "inject", _inject_here)
+    result = dbg.remote_stacks([os.getpid(), os.getpid()])
+    assert list(result) == [os.getpid()]
+    threads = {t.thread_id: t for t in result[os.getpid()]}
+    stack = threads[waiting_thread.ident]
+    assert stack.name == "Bellport"
+    assert "bellport_waiting" in [frame.name for frame in stack.stack]
+    assert [t.thread_id for t in result[os.getpid()]] == sorted(threads)
+
+
+def test_remote_stacks_error(monkeypatch):
+    def fake_inject(pid, statements, wait=True):
+        if pid == 2:
+            raise OSError(errno.ESRCH, "No such process")
+        # Succeeds, but the target never writes its stacks.
+    monkeypatch.setattr(dbg, "inject", fake_inject)
+    result = dbg.remote_stacks([1, 2], max_workers=2)
+    assert isinstance(result[1], Exception)
+    assert "didn't write its stacks" in str(result[1])
+    assert isinstance(result[2], OSError)
+
+
+def test_remote_print_stack_all_threads(monkeypatch, tmp_path, waiting_thread):
+    monkeypatch.setattr(dbg, "inject", _inject_here)
+    target = tmp_path / "stacks.txt"
+    target.write_text("")
+    dbg.remote_print_stack(os.getpid(), output=str(target), all_threads=True)
+    text = target.read_text()
+    assert "Thread %s (Bellport):\n" % (waiting_thread.ident,) in text
+    assert "in bellport_waiting" in text
+    assert "(MainThread):" in text
+
+
 # ---------------------------------------------------------------------------
 # waitpoint (deprecated wrapper)
 # ---------------------------------------------------------------------------
@@ -5,7 +5,7 @@
 
 
 
-from   pyflyby._importclns      import ImportMap, ImportSet
+from   pyflyby._importclns      import ImportMap, ImportSet, PrefixMatcher
 from   pyflyby._importstmt      import Import, ImportStatement
 
 
@@ -242,6 +242,35 @@ def test_ImportMap_1():
     importmap = ImportMap({'a.b': 'aa.bb', 'a.b.c': 'aa.bb.cc'})
     assert importmap['a.b'] == 'aa.bb'
 
+
+def test_ImportMap_prefix_matcher_cached_1():
+    importmap = ImportMap({'a.b': 'aa.bb'})
+    assert importmap.prefix_matcher is importmap.prefix_matcher
+
+
+def test_PrefixMatcher_sequential_1():
+    # Verify that PrefixMatcher gives the same results as applying each
+    # transformation in turn.
+    import random, re
+    rng = random.Random(0)
+    words = ["a", "b", "c", "ab", "x"]
+    def name():
+        return ".".join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+    for _ in range(200):
+        transformations = {name(): name() for _ in range(rng.randint(1, 6))}
+        matcher = PrefixMatcher(transformations)
+        imp = Import.from_parts(name(), rng.choice(["q", "a", "b.c"]))
+        expected_imp = imp
+        for k, v in transformations.items():
+            expected_imp = expected_imp.replace(k, v)
+        assert matcher.transform_import(imp) == expected_imp
+        text = " ".join(name() for _ in range(4))
+        expected_text = text
+        for k, v in transformations.items():
+            expected_text = re.sub(r"\b%s\b" % (re.escape(k),), v,
+                                   expected_text)
+        assert matcher.replace_words(text) == expected_text
+
 def test_ImportSet_union():
     a = ImportSet('from numpy import einsum, cos')
     b = ImportSet('from numpy import sin, cos')
@@ -12,11 +12,13 @@ from   tempfile                 import NamedTemporaryFile, mkdtemp
 from   textwrap                 import dedent
 
 from   pyflyby._importclns      import ImportMap, ImportSet
-from   pyflyby._importdb        import ImportDB
-from   pyflyby._importstmt      import Import
+from   pyflyby._importdb        import ImportDB, _scan_import_db_code
+from   pyflyby._importstmt      import Import, ImportStatement
+from   pyflyby._parse           import PythonBlock
 from   tests._test_utils        import EnvVarCtx
 
 from   contextlib               import contextmanager
+import pytest
 
 
 if sys.version_info > (3, 11):
@@ -72,6 +74,57 @@ def test_ImportDB_from_code_complex_1():
     })
 
 
+@pytest.mark.parametrize("code", [
+    "import a, b.c as d  # comment\nfrom e.f import g\n",
+    "from __future__ import division\nimport a\n",
+    "from . import a\nfrom ..b import c as d\nfrom e import *\n",
+    "from a import (b,  # x\n    c as d,\n)\n# trailing\n",
+    "from a import (\n    b,\n    c\n    )\n",
+    "from a import b, \\\n    c\n",
+    "import a\n\n\n  # indented comment\nimport b",
+    "from a import (b,\nc)\n",
+    "__mandatory_imports__ = [\n  'from a import b',  # x\n]\n"
+    "__canonical_imports__ = {'a.b': 'c.d'}\n"
+    "__forget_imports__ = 'e.f'\n",
+])
+def test_ImportDB_scan_import_db_code_matches_parser_1(code):
+    scanned = _scan_import_db_code(code)
+    assert scanned is not None
+    expected = []
+    for statement in PythonBlock(code).statements:
+        if statement.is_comment_or_blank:
+            continue
+        if statement.is_import:
+            expected.append(ImportStatement(statement))
+        else:
+            expected.append(statement.get_assignment_literal_value())
+    assert scanned == expected
+    comment = lambda s: getattr(s, "get_valid_comment", lambda: None)()
+    assert list(map(comment, scanned)) == list(map(comment, expected))
+
+
+@pytest.mark.parametrize("code", [
+    "def f(): pass\n",
+    "import a; import b\n",
+    "  import a\n",
+    "import a\nfrom __future__ import division\n",
+    "from a import (*)\n",
+    "from a import b,\n",
+    "import (a)\n",
+    "from a import class\n",
+    "x = 1\n",
+    "__forget_imports__ = [f()]\n",
+    "'''docstring'''\n",
+])
+def test_ImportDB_scan_import_db_code_fallback_1(code):
+    assert _scan_import_db_code(code) is None
+
+
+def test_ImportDB_from_code_fallback_error_1():
+    with pytest.raises(ValueError, match="Unknown assignment to 'x'"):
+        ImportDB("import a\nx = 1\n")
+
+
 def test_ImportDB_by_fullname_or_import_as_1():
     db = ImportDB('from aa.bb import cc as dd')
     result = db.by_fullname_or_import_as
@@ -8,21 +8,25 @@ import tempfile
 
 
 
+import os
 import pytest
 import sys
 from   textwrap                 import dedent
 import types
+from   unittest                 import mock
 
 from   pyflyby._file            import FileText
 from   pyflyby._format          import FormatParams
 from   pyflyby._importdb        import ImportDB
+from   pyflyby._importprobe     import ImportProber
 from   pyflyby._imports2s       import (canonicalize_imports,
                                         fix_unused_and_missing_imports,
                                         reformat_import_statements,
                                         remove_broken_imports,
                                         replace_star_imports,
                                         transform_imports)
-from   pyflyby._importstmt      import ImportFormatParams, ImportStatement
+from   pyflyby._importstmt      import (Import, ImportFormatParams,
+                                        ImportStatement)
 from   pyflyby._parse           import PythonBlock
 
 
@@ -875,6 +879,86 @@ def test_remove_broken_imports_1():
     assert output == expected
 
 
+def test_remove_broken_imports_prober_1():
+    input = PythonBlock(dedent('''
+        import sys, os, omgdoesntexist_95421787, keyword
+        from email.mime.audio import MIMEAudio, omgdoesntexist_8824165
+        code()
+        import os, omgdoesntexist_95421787
+    ''').lstrip(), filename="/foo/test_remove_broken_imports_prober_1.py")
+    prober = ImportProber(jobs=2, use_cache=False)
+    output = remove_broken_imports(input, prober=prober)
+    expected = PythonBlock(dedent('''
+        import keyword
+        import os
+        import sys
+        from email.mime.audio import MIMEAudio
+        code()
+        import os
+    ''').lstrip(), filename="/foo/test_remove_broken_imports_prober_1.py")
+    assert output == expected
+    assert prober.num_probed == 6
+    # Imports already probed aren't probed again.
+    assert remove_broken_imports(input, prober=prober) == expected
+    assert prober.num_probed == 6
+
+
+@mock.patch("platformdirs.user_cache_dir")
+def test_import_prober_cache_1(mock_user_cache_dir, tmp_path):
+    mock_user_cache_dir.return_value = str(tmp_path / "cache")
+    moddir = tmp_path / "lib"
+    moddir.mkdir()
+    modfile = moddir / "plover_51932807.py"
+    modfile.write_text("print('loading')\nx = 1\n")
+    path = [str(moddir)] + sys.path
+    imp = Import("from plover_51932807 import x")
+    prober = ImportProber(path=path)
+    assert prober.probe([imp]) == {imp: None}
+    assert prober.num_probed == 1
+    prober = ImportProber(path=path)
+    assert prober.probe([imp]) == {imp: None}
+    assert prober.num_probed == 0
+    modfile.write_text("y = 1\n")
+    os.utime(modfile, ns=(0, 0))
+    prober = ImportProber(path=path)
+    error = prober.probe([imp])[imp]
+    assert error.startswith("ImportError: cannot import name 'x'")
+    assert prober.num_probed == 1
+
+
+@mock.patch("platformdirs.user_cache_dir")
+def test_import_prober_cache_fixed_module_1(mock_user_cache_dir, tmp_path):
+    # Verify that fixing a module that raised while being imported re-probes
+    # it, even though no directory changed.
+    mock_user_cache_dir.return_value = str(tmp_path / "cache")
+    moddir = tmp_path / "lib"
+    moddir.mkdir()
+    modfile = moddir / "killdeer_62081574.py"
+    modfile.write_text("raise RuntimeError('boom')\n")
+    path = [str(moddir)] + sys.path
+    imp = Import("import killdeer_62081574")
+    prober = ImportProber(path=path)
+    assert prober.probe([imp]) == {imp: "RuntimeError: boom"}
+    dir_mtime = os.stat(moddir).st_mtime_ns
+    modfile.write_text("x = 1\n")
+    os.utime(modfile, ns=(0, 0))
+    os.utime(moddir, ns=(dir_mtime, dir_mtime))
+    prober = ImportProber(path=path)
+    assert prober.probe([imp]) == {imp: None}
+    assert prober.num_probed == 1
+
+
+def test_import_prober_timeout_1(tmp_path):
+    # Verify that imports that time out are reported, but not as broken.
+    (tmp_path / "sandpiper_73019448.py").write_text(
+        "import time\ntime.sleep(600)\n")
+    imp = Import("import sandpiper_73019448")
+    prober = ImportProber(timeout=0.5, use_cache=False,
+                          path=[str(tmp_path)] + sys.path)
+    assert prober.probe([imp]) == {imp: "timed out after 0.5 seconds"}
+    assert prober.broken([imp]) == {}
+
+
 def test_replace_star_no_imports_found(capsys):
     m = types.ModuleType("fake_test_module_345490")
     sys.modules["fake_test_module_345490"] = m
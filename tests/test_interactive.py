@@ -1527,6 +1527,40 @@ def test_reload_ext_retry_failed_imports_1(tmp):
     )
 
 
+def test_autoxreload_1(tmp):
+    # Verify that %autoxreload on reloads modified modules before each cell.
+    writetext(tmp.dir / "gazelle51928372.py", """
+        def speed():
+            return 80
+    """)
+    ipython(
+        """
+        In [1]: %load_ext pyflyby
+        In [2]: from gazelle51928372 import speed
+        In [3]: %autoxreload on
+        In [4]: with open('{tmp.dir}/gazelle51928372.py', 'w') as f:
+           ...:   f.write('def speed():\\n    return 90\\n')
+           ...:
+        In [5]: speed()
+        [PYFLYBY] Reloading gazelle51928372 (modified ...) from ...
+        Out[5]: 90
+        In [6]: %autoxreload off
+        In [7]: with open('{tmp.dir}/gazelle51928372.py', 'w') as f:
+           ...:   f.write('def speed():\\n    return 100\\n')
+           ...:
+        In [8]: speed()
+        Out[8]: 90
+        In [9]: %autoxreload
+        [PYFLYBY] Reloading gazelle51928372 (modified ...) from ...
+        In [10]: speed()
+        Out[10]: 100
+    """.format(
+            tmp=tmp
+        ),
+        PYTHONPATH=tmp.dir,
+    )
+
+
 def test_autoimport_symbol_1():
     ipython("""
         In [1]: import pyflyby; pyflyby.enable_auto_importer()
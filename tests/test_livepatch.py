@@ -7,8 +7,9 @@ from   shutil                   import rmtree
 import sys
 from   tempfile                 import mkdtemp
 from   textwrap                 import dedent
+import time
 
-from   pyflyby                  import Filename, xreload
+from   pyflyby                  import Filename, xreload, xreload_all
 from   pyflyby._livepatch       import UnknownModuleError
 
 
@@ -1976,6 +1977,54 @@ def test_xreload_object_instance_1(tpp):
     assert fascinating23465210.f is f
 
 
+def test_xreload_deep_object_graph_1(tpp):
+    # Verify that object graphs nested deeper than the recursion limit are
+    # livepatched without overflowing the stack.
+    depth = sys.getrecursionlimit() * 3
+    writetext(tpp/"plummet47620913.py", """
+        class Link41093825(object):
+            def __init__(self, child):
+                self.child = child
+            def size(self):
+                return 1
+        def make(depth):
+            link = None
+            nested = inner = {}
+            for _ in range(depth):
+                link = Link41093825(link)
+                inner['child'] = {}
+                inner = inner['child']
+            return link, nested
+        LINK, NESTED = make(%d)
+    """ % (depth,))
+    import plummet47620913
+    from plummet47620913 import LINK, NESTED
+    writetext(tpp/"plummet47620913.py", """
+        class Link41093825(object):
+            def __init__(self, child):
+                self.child = child
+            def size(self):
+                return 1 + (self.child.size() if self.child else 0)
+        def make(depth):
+            link = None
+            nested = inner = {}
+            for _ in range(depth):
+                link = Link41093825(link)
+                inner['child'] = {}
+                inner = inner['child']
+            return link, nested
+        LINK, NESTED = make(%d)
+    """ % (depth,))
+    xreload("plummet47620913")
+    assert plummet47620913.LINK is LINK
+    assert plummet47620913.NESTED is NESTED
+    link = LINK
+    for _ in range(depth - 1):
+        link = link.child
+    assert link.size() == 1
+    assert link.child is None
+
+
 def test_xreload_oldstyle_instance_1(tpp):
     # Verify that old-style instances are livepatched.
     writetext(tpp/"championship63699705.py", """
@@ -2317,3 +2366,210 @@ def test_xreload_dynamic_class_same_name_1(tpp):
 # XXX caching: check (using a hook) that we only get called once per object
 # XXX __livepatch__ on class.
 # XXX change in staticmethod/classmethod/method - what should that do?
+
+
+def test_xreload_scoped_1(tpp):
+    # Verify that xreload(scoped=True) only executes and livepatches the
+    # changed definitions.
+    sys.__counter_40719225 = 0
+    writetext(tpp/"pelican40719225.py", """
+        import sys
+        sys.__counter_40719225 += 1
+        def beak():
+            return 30386719
+        def wing():
+            return 11963244
+        class Feather:
+            def color(self):
+                return 'white'
+        def tail():
+            return 17704821
+    """)
+    import pelican40719225 as m
+    from pelican40719225 import beak, wing, Feather
+    feather = Feather()
+    # The first reload executes the whole module, since the source it was
+    # loaded from is unknown.
+    xreload(m, scoped=True)
+    assert sys.__counter_40719225 == 2
+    wing_code = wing.__code__
+    writetext(tpp/"pelican40719225.py", """
+        import sys
+        sys.__counter_40719225 += 1
+        def beak():
+            return 23166103
+        def wing():
+            return 11963244
+        class Feather:
+            def color(self):
+                return 'grey'
+        def pouch():
+            return 42817216
+    """)
+    xreload(m, scoped=True)
+    assert sys.__counter_40719225 == 2
+    assert beak() == 23166103
+    assert wing.__code__ is wing_code
+    assert feather.color() == 'grey'
+    assert m.Feather is Feather
+    assert m.pouch() == 42817216
+    assert m.pouch.__globals__ is m.__dict__
+    assert not hasattr(m, "tail")
+
+
+def test_xreload_scoped_lineno_1(tpp):
+    # Verify that xreload(scoped=True) updates the line numbers of unchanged
+    # definitions that moved.
+    sys.__counter_81562293 = 0
+    writetext(tpp/"harbor81562293.py", """
+        import sys
+        sys.__counter_81562293 += 1
+        def anchor():
+            raise ValueError
+        class Buoy:
+            def float(self):
+                raise ValueError
+    """)
+    import harbor81562293 as m
+    xreload(m)
+    writetext(tpp/"harbor81562293.py", """
+        import sys
+        sys.__counter_81562293 += 1
+        # A new comment.
+        def anchor():
+            raise ValueError
+
+        class Buoy:
+            def float(self):
+                raise ValueError
+    """)
+    xreload(m, scoped=True)
+    assert sys.__counter_81562293 == 2
+    assert m.anchor.__code__.co_firstlineno == 5
+    assert m.Buoy.float.__code__.co_firstlineno == 9
+    with pytest.raises(ValueError) as excinfo:
+        m.Buoy().float()
+    assert excinfo.tb.tb_next.tb_lineno == 10
+
+
+def test_xreload_scoped_module_level_changed_1(tpp):
+    # Verify that xreload(scoped=True) does a full reload if module-level
+    # statements changed, or if a changed definition is also bound by them.
+    sys.__counter_77310548 = 0
+    writetext(tpp/"orchard77310548.py", """
+        import sys
+        sys.__counter_77310548 += 1
+        def apple():
+            return 1
+        def pear():
+            return 2
+        pear = staticmethod(pear).__func__
+    """)
+    import orchard77310548 as m
+    xreload(m)
+    assert sys.__counter_77310548 == 2
+    writetext(tpp/"orchard77310548.py", """
+        import sys
+        sys.__counter_77310548 += 1
+        def apple():
+            return 1
+        def pear():
+            return 3
+        pear = staticmethod(pear).__func__
+    """)
+    xreload(m, scoped=True)
+    assert sys.__counter_77310548 == 3
+    assert m.pear() == 3
+    writetext(tpp/"orchard77310548.py", """
+        import sys
+        sys.__counter_77310548 += 10
+        def apple():
+            return 4
+        def pear():
+            return 3
+        pear = staticmethod(pear).__func__
+    """)
+    xreload(m, scoped=True)
+    assert sys.__counter_77310548 == 13
+    assert m.apple() == 4
+
+
+def test_xreload_scoped_future_1(tpp):
+    # Verify that xreload(scoped=True) compiles the changed definitions with
+    # the module's __future__ imports.
+    writetext(tpp/"lantern26149833.py", """
+        from __future__ import annotations
+        def wick(x: UndefinedName) -> int:
+            return 1
+    """)
+    import lantern26149833 as m
+    xreload(m)
+    writetext(tpp/"lantern26149833.py", """
+        from __future__ import annotations
+        def wick(x: UndefinedName) -> int:
+            return 2
+    """)
+    xreload(m, scoped=True)
+    assert m.wick(None) == 2
+    assert m.wick.__annotations__ == {'x': 'UndefinedName', 'return': 'int'}
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_xreload_all_1(tpp, max_workers):
+    # Verify that xreload_all() reloads the modified modules, after the
+    # modules they import from.
+    writetext(tpp/"meadow13705621.py", """
+        from river13705621 import flow
+        def bloom():
+            return flow() + 1
+    """)
+    writetext(tpp/"river13705621.py", """
+        def flow():
+            return 10
+    """)
+    writetext(tpp/"stone13705621.py", """
+        def weight():
+            return 5
+    """)
+    import meadow13705621, stone13705621
+    xreload_all()
+    assert meadow13705621.bloom() == 11
+    writetext(tpp/"meadow13705621.py", """
+        from river13705621 import flow
+        def bloom():
+            return flow() + 2
+    """)
+    writetext(tpp/"river13705621.py", """
+        def flow():
+            return 20
+    """)
+    reloaded = xreload_all(max_workers=max_workers)
+    assert reloaded == ["river13705621", "meadow13705621"]
+    assert meadow13705621.bloom() == 22
+    assert stone13705621.weight() == 5
+    assert xreload_all(max_workers=max_workers) == []
+
+
+def test_xreload_all_unchanged_content_1(tpp):
+    # Verify that xreload_all() doesn't report modules whose file was touched
+    # but whose content didn't change.
+    writetext(tpp/"harbor40718253.py", """
+        def tide():
+            return 1
+    """)
+    writetext(tpp/"quay40718253.py", """
+        def dock():
+            return 2
+    """)
+    import harbor40718253, quay40718253
+    xreload_all()
+    later = time.time() + 10
+    os.utime(str(tpp/"harbor40718253.py"), (later, later))
+    writetext(tpp/"quay40718253.py", """
+        def dock():
+            return 3
+    """)
+    os.utime(str(tpp/"quay40718253.py"), (later, later))
+    assert xreload_all() == ["quay40718253"]
+    assert harbor40718253.tide() == 1
+    assert quay40718253.dock() == 3
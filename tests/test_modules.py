@@ -12,9 +12,10 @@ from   pkgutil                  import iter_modules
 from   pyflyby._file            import Filename
 from   pyflyby._idents          import DottedIdentifier
 from   pyflyby._log             import logger
-from   pyflyby._modules         import (ModuleHandle, _fast_iter_modules,
+from   pyflyby._modules         import (ModuleHandle, _exports_index_file,
+                                        _fast_iter_modules,
                                         _iter_file_finder_modules,
-                                        rebuild_import_cache)
+                                        _walk_modules, rebuild_import_cache)
 import re
 import subprocess
 import sys
@@ -401,3 +402,91 @@ def test_runtime_exports_non_string_all_1(tmp_module):
     assert "alpha" in _exports(mh.get_exports(allow_exec=True))
 
 
+
+
+def _forget_exports(name):
+    """Drop the per-handle cached exports so the next access recomputes."""
+    mh = ModuleHandle(name)
+    mh.__dict__.pop("exports", None)
+    mh.__dict__.pop("runtime_exports", None)
+    return mh
+
+
+@mock.patch("platformdirs.user_cache_dir")
+def test_exports_index_static_1(mock_user_cache_dir, tmp_path, tmp_module):
+    """Static exports are reused across handles until the file changes."""
+    mock_user_cache_dir.return_value = tmp_path / "cache"
+    name = tmp_module("pyflyby_test_exports_index_81723301", "alpha = 1\n")
+    mh = ModuleHandle(name)
+    assert _exports(mh.exports) == {"alpha"}
+    entry = _exports_index_file(name, mh.filename)
+    assert entry.exists()
+    assert json.loads(entry.read_text())["exports"] == ["alpha"]
+    mh = _forget_exports(name)
+    with mock.patch.object(ModuleHandle, "_static_export_names",
+                           side_effect=AssertionError("not cached")):
+        assert _exports(mh.exports) == {"alpha"}
+    # A change in size/mtime invalidates the entry.
+    (tmp_module.path / (name + ".py")).write_text("alpha = 1\nbeta = 2\n")
+    mh = _forget_exports(name)
+    assert _exports(mh.exports) == {"alpha", "beta"}
+
+
+def test_runtime_exports_follow_star_imported_submodule_1(tmp_path):
+    """Runtime exports aren't persisted, so a later process sees a change to
+    a star-imported submodule."""
+    pkg = tmp_path / "pyflyby_test_runtime_star_pkg_81723301"
+    pkg.mkdir()
+    (pkg / "__init__.py").write_text("from .impl import *\n")
+    (pkg / "impl.py").write_text("foo = 1\n")
+    env = dict(os.environ, PYTHONPATH=str(tmp_path),
+               XDG_CACHE_HOME=str(tmp_path / "cache"))
+    code = ("from pyflyby._modules import ModuleHandle; "
+            "print(sorted(ModuleHandle(%r).get_exports(allow_exec=True)"
+            ".by_import_as))" % (pkg.name,))
+    def exports():
+        return subprocess.run([sys.executable, "-c", code], env=env,
+                              check=True, capture_output=True,
+                              text=True).stdout.strip()
+    assert exports() == "['foo', 'impl']"
+    (pkg / "impl.py").write_text("foo = 1\nbar = 2\n")
+    assert exports() == "['bar', 'foo', 'impl']"
+
+
+def test_exports_index_follow_submodules_1(tmp_path):
+    """Static exports that depend on which submodules exist aren't indexed,
+    so a later process sees a submodule being added."""
+    pkg = tmp_path / "pyflyby_test_static_submod_pkg_81723301"
+    pkg.mkdir()
+    (pkg / "__init__.py").write_text("from . import extra\nalpha = 1\n")
+    env = dict(os.environ, PYTHONPATH=str(tmp_path),
+               XDG_CACHE_HOME=str(tmp_path / "cache"))
+    code = ("from pyflyby._modules import ModuleHandle; "
+            "print(sorted(ModuleHandle(%r).exports.by_import_as))"
+            % (pkg.name,))
+    def exports():
+        return subprocess.run([sys.executable, "-c", code], env=env,
+                              check=True, capture_output=True,
+                              text=True).stdout.strip()
+    assert exports() == "['alpha', 'extra']"
+    # "extra" is now a submodule, not a member.
+    (pkg / "extra.py").write_text("")
+    assert exports() == "['alpha']"
+
+
+@mock.patch("platformdirs.user_cache_dir")
+def test_exports_index_disabled_1(mock_user_cache_dir, tmp_path, tmp_module,
+                                  monkeypatch):
+    mock_user_cache_dir.return_value = tmp_path / "cache"
+    monkeypatch.setenv("PYFLYBY_DISABLE_CACHE", "1")
+    name = tmp_module("pyflyby_test_exports_index_off_81723301", "alpha = 1\n")
+    assert _exports(ModuleHandle(name).exports) == {"alpha"}
+    assert not (tmp_path / "cache").exists()
+
+
+def test_walk_modules_1():
+    modules = dict(_walk_modules())
+    assert modules["email"].endswith(os.path.join("email", "__init__.py"))
+    assert modules["email.mime.text"].endswith(
+        os.path.join("email", "mime", "text.py"))
+    assert "json.decoder" in modules
@@ -160,6 +160,53 @@ def test_PythonBlock_statements_comments_1():
     assert block.statements == expected
 
 
+def test_PythonBlock_statements_leading_blank_lines_1():
+    block = PythonBlock(dedent('''
+        a
+
+
+        # b
+        c
+    ''').lstrip())
+    expected = (
+        PythonStatement('a\n'              ),
+        PythonStatement('\n', startpos=(2,1)),
+        PythonStatement('\n', startpos=(3,1)),
+        PythonStatement('# b\n', startpos=(4,1)),
+        PythonStatement('c\n', startpos=(5,1)),
+    )
+    assert block.statements == expected
+
+
+def test_PythonBlock_statements_no_reparse_1(monkeypatch):
+    import pyflyby._parse
+    block = PythonBlock(dedent('''
+        import a
+
+
+        # b
+        def c():
+            pass
+        # d
+    ''').lstrip())
+    module = block.annotated_ast_node
+    calls = []
+    orig = pyflyby._parse._parse_ast_nodes
+    def counting_parse(*args, **kwargs):
+        calls.append(args)
+        return orig(*args, **kwargs)
+    monkeypatch.setattr(pyflyby._parse, "_parse_ast_nodes", counting_parse)
+    statements = block.statements
+    nodes = [s.ast_node for s in statements if s.ast_node is not None]
+    assert nodes == module.body
+    assert all(n is m for n, m in zip(nodes, module.body))
+    for s in statements:
+        assert s.block.annotated_ast_node is not None
+    assert [s.is_comment_or_blank for s in statements] == [
+        False, True, True, True, False, True]
+    assert calls == []
+
+
 def test_PythonBlock_statements_continuation_1():
     block = PythonBlock(dedent(r'''
         a
@@ -6,6 +6,7 @@
 from __future__ import print_function
 
 import ast
+from   contextlib               import contextmanager
 import json
 import os
 import shutil
@@ -15,6 +16,7 @@ import sys
 import tempfile
 from   tempfile                 import NamedTemporaryFile, mkdtemp
 from   textwrap                 import dedent
+import time
 import venv
 
 import pytest
@@ -180,6 +182,32 @@ def test_print_version_pyflyby_1():
     assert result.strip().startswith("pyflyby %s" % (__version__,))
 
 
+def test_lazy_exports_1():
+    # Importing pyflyby doesn't import its submodules; accessing an exported
+    # name does, and promotes it to pyflyby.Foo.
+    cmd = dedent("""
+        import sys, pyflyby
+        print(sorted(m for m in sys.modules if m.startswith("pyflyby.")))
+        print(pyflyby.debugger.__module__, "pyflyby._dbg" in sys.modules)
+        print("xreload" in dir(pyflyby), hasattr(pyflyby, "nonexistent"))
+    """)
+    result, retcode = pipe((python, "-c", cmd))
+    assert retcode == 0
+    assert result == "[]\npyflyby True\nTrue False"
+
+
+def test_eval_imports_little_1():
+    # A simple 'py' evaluation doesn't import the IPython, saveframe,
+    # livepatch or import-transformation machinery (or pdb, via doctest).
+    heavy = ["IPython", "doctest", "pdb", "pyflyby._imports2s",
+             "pyflyby._interactive", "pyflyby._livepatch",
+             "pyflyby._saveframe", "sqlite3"]
+    result, retcode = py("-q", "--print",
+                         "sorted(set(sys.modules) & set(%r))" % (heavy,))
+    assert retcode == 0
+    assert result == "[]"
+
+
 def test_print_version_module_1():
     # 'py <module> --version' prints the module's __version__
     # (print_version with a module argument).
@@ -1831,6 +1859,89 @@ def test_heuristic_run_module_argstr_1(tmp):
     assert result == expected
 
 
+def test_heuristic_run_module_cache_1(tmp):
+    # Whether an argument is a module is cached across runs, but adding or
+    # removing the module is noticed.
+    cache = tmp.new_tempdir()
+    env = dict(PYTHONPATH=tmp.dir, XDG_CACHE_HOME=str(cache))
+    result, retcode = py("-q", "linden93706436", **env)
+    assert retcode == 1
+    assert "python -m" not in result
+    assert os.listdir("%s/pyflyby/module_probes" % cache)
+    writetext(tmp.dir/"linden93706436.py", """
+        print('Hemlock')
+    """)
+    for _ in range(2):
+        result, retcode = py("linden93706436", **env)
+        assert retcode == 0
+        assert result == "[PYFLYBY] python -m linden93706436\nHemlock"
+    os.unlink(str(tmp.dir/"linden93706436.py"))
+    result, retcode = py("-q", "linden93706436", **env)
+    assert retcode == 1
+    assert "python -m" not in result
+
+
+def test_heuristic_run_module_cache_under_package_1(tmp):
+    cache = tmp.new_tempdir()
+    env = dict(PYTHONPATH=tmp.dir, XDG_CACHE_HOME=str(cache))
+    os.mkdir("%s/elmhurst47390612" % tmp.dir)
+    writetext(tmp.dir/"elmhurst47390612/__init__.py", "")
+    result, retcode = py("-q", "elmhurst47390612.corona", **env)
+    assert retcode == 1
+    assert "python -m" not in result
+    writetext(tmp.dir/"elmhurst47390612/corona.py", """
+        print('Junction')
+    """)
+    result, retcode = py("elmhurst47390612.corona", **env)
+    assert retcode == 0
+    expected = dedent("""
+        [PYFLYBY] import elmhurst47390612
+        [PYFLYBY] python -m elmhurst47390612.corona
+        Junction
+    """).strip()
+    assert result == expected
+
+
+def test_heuristic_run_module_cache_shadowed_package_1(tmp):
+    # A package earlier on sys.path that starts shadowing the one a cached
+    # negative was computed against is noticed.
+    cache = tmp.new_tempdir()
+    first = tmp.new_tempdir()
+    second = tmp.new_tempdir()
+    env = dict(PYTHONPATH=[str(first), str(second)],
+               XDG_CACHE_HOME=str(cache))
+    os.mkdir("%s/bellport46201937" % second)
+    writetext(second/"bellport46201937/__init__.py", "")
+    result, retcode = py("-q", "bellport46201937.tool", **env)
+    assert retcode == 1
+    assert "python -m" not in result
+    os.mkdir("%s/bellport46201937" % first)
+    writetext(first/"bellport46201937/__init__.py", "")
+    writetext(first/"bellport46201937/tool.py", """
+        print('Shoreham')
+    """)
+    result, retcode = py("-q", "bellport46201937.tool", **env)
+    assert retcode == 0
+    assert result == "Shoreham"
+
+
+def test_module_probe_cache_pruned_1(tmp, monkeypatch):
+    from pyflyby import _py
+    from pyflyby._modules import ModuleHandle
+    cache = tmp.new_tempdir()
+    monkeypatch.setattr(_py.platformdirs, "user_cache_dir",
+                        lambda **kwargs: str(cache))
+    monkeypatch.setattr(_py, "_MODULE_PROBE_CACHE_MAX_ENTRIES", 2)
+    monkeypatch.delenv("PYFLYBY_DISABLE_CACHE", raising=False)
+    names = ["greenport60412", "orient60412", "southold60412"]
+    for name in names:
+        _py._module_probe_cache_store(ModuleHandle(name), None)
+        time.sleep(0.01)
+    assert len(os.listdir("%s/module_probes" % cache)) == 2
+    assert _py._module_probe_cache_lookup(names[0]) is None
+    assert _py._module_probe_cache_lookup(names[2]) is False
+
+
 def test_builtin_no_run_module_1(tmp):
     # Verify that builtins take precedence over modules.
     writetext(tmp.dir/"round.py", """
@@ -2039,6 +2150,166 @@ def test_map_missing_function_1():
     assert "expected argument to --map" in result
 
 
+@pytest.mark.parametrize("args", [
+    ("-q", "--jobs=3", "--map"),
+    ("-q", "--map", "--jobs", "3"),
+], ids=["before_map", "after_map"])
+def test_map_jobs_1(args):
+    result, retcode = py(*args, "lambda x: math.sqrt(x)", "1", "4", "9", "16")
+    assert retcode == 0
+    assert result == "1.0\n2.0\n3.0\n4.0"
+
+
+def test_map_jobs_errors_1():
+    # An error in one call doesn't stop the others; they're all reported and
+    # the exit status is 1.
+    result, retcode = py("-q", "--jobs=2", "--map", "lambda x: 12 // int(x)",
+                         "1", "0", "3")
+    assert retcode == 1
+    lines = result.splitlines()
+    assert lines[0] == "12"
+    assert lines[1] == "[PYFLYBY] Failed on 0:"
+    assert "[PYFLYBY] ZeroDivisionError: integer division or modulo by zero" in lines
+    assert lines[-2:] == ["4", "[PYFLYBY] 1 of 3 calls failed: 0"]
+
+
+def test_map_jobs_exit_1():
+    # Calls that exit with status 0 succeed; others fail.
+    result, retcode = py("-q", "--jobs=2", "--map", "sys.exit", "0", "0")
+    assert retcode == 0
+    assert result == ""
+    result, retcode = py("-q", "--jobs=2", "--map", "sys.exit", "0", "3")
+    assert retcode == 1
+    assert result.splitlines() == ["[PYFLYBY] Failed on 3:",
+                                   "[PYFLYBY] SystemExit: 3",
+                                   "[PYFLYBY] 1 of 2 calls failed: 3"]
+
+
+def test_map_jobs_unordered_1(tmp):
+    writetext(tmp.dir/"sleepy61337820.py", """
+        import time
+        def nap(seconds):
+            time.sleep(seconds)
+            return seconds
+    """)
+    result, retcode = py("-q", "--jobs=2", "--unordered", "--map",
+                         "sleepy61337820.nap", "1", "0",
+                         PYTHONPATH=tmp.dir)
+    assert retcode == 0
+    assert result == "0\n1"
+
+
+@contextmanager
+def _py_server(socket_path, *names, PYTHONPATH=[]):
+    """
+    Run a ``py --server`` listening on ``socket_path``, auto-importing
+    ``names`` while it warms up.  Yields the server process.
+    """
+    env = dict(os.environ,
+               PYFLYBY_PATH=str(PYFLYBY_PATH),
+               PYFLYBY_PY_SOCKET=socket_path,
+               PYTHONPATH=_build_pythonpath(PYTHONPATH))
+    proc = subprocess.Popen(
+        [shutil.which("py"), "-q", "--jobs=1", "--server"] + list(names),
+        stdout=subprocess.DEVNULL, env=env)
+    try:
+        for _ in range(300):
+            if os.path.exists(socket_path) or proc.poll() is not None:
+                break
+            time.sleep(0.1)
+        assert proc.poll() is None
+        yield proc
+    finally:
+        proc.terminate()
+        proc.wait()
+    assert not os.path.exists(socket_path)
+
+
+@pytest.fixture
+def py_server(tmp):
+    """
+    A ``py --server`` listening on a socket in ``tmp.dir``.  Yields
+    ``(process, socket_path)``.
+    """
+    socket_path = str(tmp.dir/"py.sock")
+    with _py_server(socket_path) as proc:
+        yield proc, socket_path
+
+
+def test_server_client_1(py_server):
+    proc, socket_path = py_server
+    # Commands run in a worker forked from the server.
+    result, retcode = py("--client", "os.getppid()",
+                         PYFLYBY_PY_SOCKET=socket_path)
+    assert retcode == 0
+    assert result == "[PYFLYBY] import os\n[PYFLYBY] os.getppid()\n%d" % (
+        proc.pid,)
+
+
+def test_server_client_isolated_1(py_server):
+    _, socket_path = py_server
+    # Each command gets a fresh worker, so state doesn't leak between them.
+    for _ in range(2):
+        result, retcode = py("-q", "--client",
+                             "sys.Warwick = getattr(sys, 'Warwick', 0) + 1; "
+                             "print(sys.Warwick)",
+                             PYFLYBY_PY_SOCKET=socket_path)
+        assert retcode == 0
+        assert result == "1"
+
+
+def test_server_client_env_and_status_1(py_server):
+    _, socket_path = py_server
+    result, retcode = py("--print", "sys.exit(os.environ['Pinehurst'])",
+                         PYFLYBY_PY_CLIENT="1", PYFLYBY_PY_SOCKET=socket_path,
+                         Pinehurst="Cadman")
+    assert retcode == 1
+    assert result.splitlines()[-1] == "Cadman"
+
+
+def test_server_client_pythonpath_1(tmp, py_server):
+    _, socket_path = py_server
+    # The server doesn't have the client's $PYTHONPATH.
+    moddir = tmp.new_tempdir()
+    writetext(moddir/"plover48.py", "def hello(): return 'Rutherford'\n")
+    result, retcode = py("-q", "--client", "plover48.hello()",
+                         PYTHONPATH=moddir, PYFLYBY_PY_SOCKET=socket_path)
+    assert retcode == 0
+    assert result == "'Rutherford'"
+
+
+def test_server_client_no_server_atexit_1(tmp):
+    # atexit handlers registered while the server warms up don't run in the
+    # workers.
+    moddir = tmp.new_tempdir()
+    writetext(moddir/"verona48.py",
+              "import atexit\natexit.register(print, 'Verona')\n")
+    socket_path = str(tmp.dir/"py.sock")
+    with _py_server(socket_path, "verona48", PYTHONPATH=[str(moddir)]):
+        result, retcode = py("-q", "--client",
+                             "import atexit; atexit.register(print, 'Lydia')",
+                             PYFLYBY_PY_SOCKET=socket_path)
+    assert retcode == 0
+    assert "Verona" not in result
+    assert result.splitlines()[-1] == "Lydia"
+
+
+def test_client_no_server_1(tmp):
+    socket_path = str(tmp.dir/"py.sock")
+    result, retcode = py("--client", "5+7", PYFLYBY_PY_SOCKET=socket_path)
+    assert retcode == 1
+    assert result.startswith("[PYFLYBY] --client: no py server at %s" %
+                             (socket_path,))
+
+
+def test_client_env_no_server_1(tmp):
+    # With $PYFLYBY_PY_CLIENT=1 but no server, run locally.
+    result, retcode = py("5+7", PYFLYBY_PY_CLIENT="1",
+                         PYFLYBY_PY_SOCKET=str(tmp.dir/"py.sock"))
+    assert retcode == 0
+    assert result == "[PYFLYBY] 5+7\n12"
+
+
 def test_output_exit_1():
     result, retcode = py("--output=exit", "5+7")
     assert retcode == 12
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from   contextlib               import contextmanager
+import json
 import os
 import pexpect
 import pickle
@@ -12,7 +13,7 @@ import sys
 from   tempfile                 import mkdtemp
 from   textwrap                 import dedent
 
-from   pyflyby                  import Filename, saveframe
+from   pyflyby                  import Filename, SaveframeReader, saveframe
 
 VERSION_INFO = sys.version_info
 
@@ -43,9 +44,7 @@ def tmpdir(request):
 
 
 def load_pkl(filename):
-    with open(filename, mode='rb') as f:
-        data = pickle.load(f)
-    return data
+    return SaveframeReader(str(filename)).data
 
 
 def writetext(filename, text, mode='w'):
@@ -677,6 +676,99 @@ def test_saveframe_save_current_frame_ignores_last_exception(tmpdir):
     assert data[1]["filename"] == os.path.realpath(__file__)
 
 
+def test_saveframe_background_current_frame(tmpdir):
+    if hasattr(sys, "last_value"):
+        delattr(sys, "last_value")
+    if hasattr(sys, "last_exc"):
+        delattr(sys, "last_exc")
+
+    filename = str(tmpdir / f"saveframe_{get_random()}.pkl")
+    local_var = [1, 2, 3]
+    handle = saveframe(filename=filename, current_frame=True, background=True)
+    # The parent can change its state; the child saves its own snapshot.
+    local_var.append(4)
+    assert handle.filename == filename
+    assert handle.pid != os.getpid()
+    assert handle.wait(timeout=60) == filename
+    assert handle.poll() == 0
+    data = load_pkl(filename)
+    assert set(data.keys()) == {1}
+    assert data[1]["function_name"] == "test_saveframe_background_current_frame"
+    assert pickle.loads(data[1]["variables"]["local_var"]) == [1, 2, 3]
+    assert os.listdir(str(tmpdir)) == [os.path.basename(filename)]
+
+
+def test_saveframe_background_exception(tmpdir):
+    pkg_name = create_pkg(tmpdir)
+    code = f"from {pkg_name} import init_func1; init_func1()"
+    with run_code_and_set_exception(code, ValueError):
+        handle = saveframe(
+            filename=str(tmpdir / f"saveframe_{get_random()}.pkl"), frames=5,
+            background=True)
+        filename = handle.wait()
+    frames_local_variables_checker(pkg_name, filename)
+
+
+def test_saveframe_background_failure(tmpdir, monkeypatch):
+    import pyflyby._saveframe
+    def fail(*args, **kwargs):
+        raise OSError("Disk full")
+    monkeypatch.setattr(pyflyby._saveframe,
+                        "_save_frames_and_exception_info_to_file", fail)
+    filename = str(tmpdir / f"saveframe_{get_random()}.pkl")
+    handle = saveframe(filename=filename, current_frame=True, background=True)
+    with pytest.raises(RuntimeError) as err:
+        handle.wait()
+    assert str(err.value) == (
+        f"The saveframe process {handle.pid} failed with exit code 1. Check "
+        "its output for the error.")
+    assert not os.path.exists(filename)
+
+
+@pytest.mark.parametrize("max_workers", [None, 2])
+def test_saveframe_series(tmpdir, max_workers):
+    filename = str(tmpdir / f"saveframe_{get_random()}.pkl")
+    big_value = list(range(100000))
+    sizes = []
+    for counter in range(3):
+        saveframe(filename=filename, current_frame=True, series=True,
+                  max_workers=max_workers)
+        sizes.append(os.path.getsize(filename))
+    # Only 'counter' changed, so 'big_value' is stored once.
+    big_value_size = len(pickle.dumps(big_value, protocol=5))
+    assert sizes[0] > big_value_size
+    assert sizes[2] - sizes[1] < big_value_size / 10
+
+    reader = SaveframeReader(filename)
+    assert reader.num_snapshots == 3
+    assert reader.snapshot == 2
+    assert reader.get_variables('counter') == 2
+    for snapshot in range(3):
+        reader = SaveframeReader(filename, snapshot=snapshot)
+        assert reader.snapshot == snapshot
+        assert reader.get_variables('counter') == snapshot
+        assert reader.get_variables('big_value') == big_value
+    assert SaveframeReader(filename, snapshot=-3).get_variables('counter') == 0
+    with pytest.raises(ValueError) as err:
+        SaveframeReader(filename, snapshot=3)
+    assert str(err.value) == (f"Invalid value for 'snapshot': 3. The file "
+                              f"'{filename}' has 3 snapshots.")
+
+
+def test_saveframe_series_compression_mismatch(tmpdir):
+    filename = str(tmpdir / f"saveframe_{get_random()}.pkl")
+    saveframe(filename=filename, current_frame=True, series=True,
+              compression='gzip')
+    size = os.path.getsize(filename)
+    with pytest.raises(ValueError) as err:
+        saveframe(filename=filename, current_frame=True, series=True)
+    assert str(err.value) == (
+        "The snapshot series uses compression 'gzip', not None.")
+    # The failed append leaves the series intact.
+    assert os.path.getsize(filename) == size
+    assert SaveframeReader(filename).num_snapshots == 1
+
+
 def test_saveframe_frame_format_1(tmpdir):
     pkg_name = create_pkg(tmpdir)
     code = f"from {pkg_name} import init_func1; init_func1()"
@@ -856,6 +948,111 @@ def test_saveframe_exception_info(tmpdir):
     exception_info_checker(filename)
 
 
+@pytest.mark.parametrize("compression", ["gzip", "lzma"])
+def test_saveframe_compression(tmpdir, compression):
+    pkg_name = create_pkg(tmpdir)
+    code = f"from {pkg_name} import init_func1; init_func1()"
+    with run_code_and_set_exception(code, ValueError):
+        filename = saveframe(
+            filename=str(tmpdir / f"saveframe_{get_random()}.pkl"), frames=5,
+            compression=compression)
+    frames_metadata_checker(tmpdir, pkg_name, filename)
+    frames_local_variables_checker(pkg_name, filename)
+    exception_object = load_pkl(filename)['exception_object']
+    assert isinstance(exception_object, ValueError)
+    assert str(exception_object) == "Error is raised"
+
+
+def test_saveframe_invalid_compression(tmpdir):
+    pkg_name = create_pkg(tmpdir)
+    code = f"from {pkg_name} import init_func1; init_func1()"
+    with run_code_and_set_exception(code, ValueError):
+        with pytest.raises(ValueError) as err:
+            saveframe(filename=str(tmpdir / f"saveframe_{get_random()}.pkl"),
+                      compression='zip')
+    err_msg = ("Invalid value for `compression`: 'zip'. Allowed values are: "
+               "['gzip', 'lzma', 'zstd', 'lz4']")
+    assert str(err.value) == err_msg
+
+
+def test_saveframe_max_variable_bytes(tmpdir, saveframe_log):
+    pkg_name = create_pkg(tmpdir)
+    code = f"from {pkg_name} import init_func1; init_func1()"
+    with run_code_and_set_exception(code, ValueError):
+        filename = saveframe(
+            filename=str(tmpdir / f"saveframe_{get_random()}.pkl"), frames=1,
+            max_variable_bytes=20)
+    log_messages = [record.message for record in saveframe_log.records]
+    data = load_pkl(filename)
+    assert set(data[1]["variables"].keys()) == {"var2", "func3_var3"}
+    reason = "The pickled value is larger than max_variable_bytes (20)."
+    assert data[1]["skipped_variables"] == {"var1": reason}
+    assert SaveframeReader(filename).skipped_variables == {1: {"var1": reason}}
+    assert (f"Skipping variable: 'var1' for frame: 'File: {str(tmpdir)}/"
+            f"{pkg_name}/pkg1/pkg2/mod3.py, Line: 6, Function: func3'. "
+            f"{reason}") in log_messages
+
+
+def test_saveframe_max_total_bytes(tmpdir):
+    pkg_name = create_pkg(tmpdir)
+    code = f"from {pkg_name} import init_func1; init_func1()"
+    with run_code_and_set_exception(code, ValueError):
+        filename = saveframe(
+            filename=str(tmpdir / f"saveframe_{get_random()}.pkl"), frames=1,
+            max_total_bytes=22)
+    data = load_pkl(filename)
+    # 'var1' (33 bytes) doesn't fit, 'var2' (19 bytes) does, and then
+    # 'func3_var3' (4 bytes) doesn't fit in the remaining 3 bytes.
+    assert set(data[1]["variables"].keys()) == {"var2"}
+    assert pickle.loads(data[1]["variables"]["var2"]) == 'blah'
+    assert data[1]["skipped_variables"] == {
+        "var1": ("The pickled value is larger than the remaining 22 bytes of "
+                 "max_total_bytes (22)."),
+        "func3_var3": ("The pickled value is larger than the remaining 3 bytes "
+                       "of max_total_bytes (22)."),
+    }
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_saveframe_max_workers(tmpdir, saveframe_log, compression):
+    pkg_name = create_pkg(tmpdir)
+    code = f"from {pkg_name} import init_func1; init_func1()"
+    with run_code_and_set_exception(code, ValueError):
+        filenames = [
+            saveframe(filename=str(tmpdir / f"saveframe_{get_random()}.pkl"),
+                      frames=5, compression=compression, max_total_bytes=100,
+                      max_workers=max_workers)
+            for max_workers in [None, 3]]
+    log_messages = [record.message for record in saveframe_log.records]
+    serial_data, parallel_data = [load_pkl(filename) for filename in filenames]
+    for frame_idx in range(1, 6):
+        assert (list(parallel_data[frame_idx]["variables"].items()) ==
+                list(serial_data[frame_idx]["variables"].items()))
+        assert (parallel_data[frame_idx]["skipped_variables"] ==
+                serial_data[frame_idx]["skipped_variables"])
+    assert "var3" in parallel_data[2]["skipped_variables"]
+    qualname = "func2" if VERSION_INFO < (3, 11) else "mod2_cls.func2"
+    warning_msg = (
+        f"Cannot pickle variable: 'var3' for frame: 'File: {str(tmpdir)}/{pkg_name}"
+        f"/pkg1/mod2.py, Line: 10, Function: {qualname}'.")
+    assert "\n".join(log_messages).count(warning_msg) == 2
+
+
+@pytest.mark.parametrize("value, error", [
+    (0, ValueError("Invalid value for `max_variable_bytes`: 0. It must be a "
+                   "positive integer.")),
+    ("10", TypeError("`max_variable_bytes` must be of type 'int', not 'str'.")),
+])
+def test_saveframe_invalid_max_variable_bytes(tmpdir, value, error):
+    pkg_name = create_pkg(tmpdir)
+    code = f"from {pkg_name} import init_func1; init_func1()"
+    with run_code_and_set_exception(code, ValueError):
+        with pytest.raises(type(error)) as err:
+            saveframe(filename=str(tmpdir / f"saveframe_{get_random()}.pkl"),
+                      max_variable_bytes=value)
+    assert str(err.value) == str(error)
+
+
 def test_saveframe_chained_exceptions(tmpdir):
     pkg_name = create_pkg(tmpdir)
     code = f"from {pkg_name} import init_func3; init_func3()"
@@ -1023,6 +1220,51 @@ def test_saveframe_cmdline_exclude_variables(tmpdir):
     assert set(data[5]["variables"].keys()) == set()
 
 
+def test_saveframe_cmdline_compression_and_size_limits(tmpdir):
+    pkg_name = create_pkg(tmpdir)
+    filename = str(tmpdir / f"saveframe_{get_random()}.pkl")
+    command = [
+        sys.executable, "-m", "pyflyby._saveframe_cli", "--filename", filename,
+        "--frames", "1", "--compression", "lzma", "--max_variable_bytes", "20",
+        "python", "-c",
+        f"import sys; sys.path.append('{tmpdir}'); from {pkg_name} import "
+        f"init_func1; init_func1()"]
+    run_command(command)
+
+    data = load_pkl(filename)
+    assert set(data[1]["variables"].keys()) == {"var2", "func3_var3"}
+    assert pickle.loads(data[1]["variables"]["var2"]) == 'blah'
+    assert set(data[1]["skipped_variables"].keys()) == {"var1"}
+
+
+def test_saveframe_cmdline_query(tmpdir):
+    os.mkdir(str(tmpdir / "dumps"))
+    for i, exception in enumerate(["ValueError", "KeyError", "ValueError"]):
+        code = dedent(f"""
+            def func():
+                raise {exception}("error")
+            func()
+        """)
+        with run_code_and_set_exception(code, Exception):
+            saveframe(filename=str(tmpdir / "dumps" / f"{i}.pkl"))
+    command = [sys.executable, "-m", "pyflyby._saveframe_cli", "query",
+               "--group_by", "exception_class_qualname,frame_identifier",
+               str(tmpdir / "dumps")]
+    result = subprocess.run(command, capture_output=True, check=True)
+    assert result.stdout.decode('utf-8').splitlines() == [
+        "exception_class_qualname  frame_identifier  count",
+        "ValueError                <string>,3,func   2",
+        "KeyError                  <string>,3,func   1"]
+
+    command = [sys.executable, "-m", "pyflyby._saveframe_cli", "query",
+               "--format", "jsonl", "--fields", "path,exception_string",
+               str(tmpdir / "dumps" / "1.pkl")]
+    result = subprocess.run(command, capture_output=True, check=True)
+    assert [json.loads(line) for line in result.stdout.splitlines()] == [
+        {"path": str(tmpdir / "dumps" / "1.pkl"),
+         "exception_string": "'error'"}]
+
+
 def test_saveframe_cmdline_frame_metadata(tmpdir):
     pkg_name = create_pkg(tmpdir)
     filename = str(tmpdir / f"saveframe_{get_random()}.pkl")
@@ -11,7 +11,9 @@ import sys
 from   tempfile                 import mkdtemp
 from   textwrap                 import dedent
 
-from   pyflyby                  import Filename, SaveframeReader, saveframe
+from   pyflyby                  import (Filename, SaveframeReader,
+                                        group_saveframes, query_saveframes,
+                                        saveframe)
 
 VERSION_INFO = sys.version_info
 
@@ -37,9 +39,7 @@ def tmpdir(request):
 
 
 def load_pkl(filename):
-    with open(filename, mode='rb') as f:
-        data = pickle.load(f)
-    return data
+    return SaveframeReader(str(filename)).data
 
 
 def writetext(filename, text, mode='w'):
@@ -778,3 +778,161 @@ def test_get_variables_invalid_frame_idx_3(tmpdir):
 
     expected = "Invalid value for 'frame_idx': '1'. Allowed values are: [3, 4]."
     assert str(err.value) == expected
+
+
+def test_legacy_format(tmpdir):
+    pkg_name = create_pkg(tmpdir)
+    filename = call_saveframe(pkg_name, tmpdir, frames=5)
+    data = SaveframeReader(filename).data
+    # Files written by older versions of saveframe are a single pickled dict.
+    legacy_filename = str(tmpdir / f"saveframe_{get_random()}.pkl")
+    with open(legacy_filename, 'wb') as f:
+        pickle.dump(data, f)
+    reader = SaveframeReader(legacy_filename)
+
+    assert reader.data.keys() == data.keys()
+    assert reader.data[1] == data[1]
+    assert repr(reader.data['exception_object']) == repr(
+        data['exception_object'])
+    assert reader.variables == SaveframeReader(filename).variables
+    assert reader.get_variables('var1', frame_idx=1) == [4, 'foo', 2.4]
+    assert reader.get_metadata('lineno') == SaveframeReader(
+        filename).get_metadata('lineno')
+    assert reader.get_metadata('exception_class_name') == 'ValueError'
+    assert str(reader) == str(SaveframeReader(filename))
+
+
+def test_lazy_variables(tmpdir, monkeypatch):
+    pkg_name = create_pkg(tmpdir)
+    filename = call_saveframe(pkg_name, tmpdir, frames=5)
+    unpickled = []
+    loads = pickle.loads
+    def recording_loads(data, *args, **kwargs):
+        value = loads(data, *args, **kwargs)
+        unpickled.append(value)
+        return value
+    monkeypatch.setattr(pickle, "loads", recording_loads)
+    reader = SaveframeReader(filename)
+    assert sorted(reader.variables[1]) == ['func3_var3', 'var1', 'var2']
+    assert reader.get_metadata('lineno', frame_idx=1) == 6
+    assert reader.get_metadata('exception_class_name') == 'ValueError'
+    assert unpickled == []
+
+    assert reader.get_variables('var2', frame_idx=1) == 'blah'
+    assert unpickled == ['blah']
+
+
+def test_truncated_file(tmpdir):
+    pkg_name = create_pkg(tmpdir)
+    filename = call_saveframe(pkg_name, tmpdir, frames=5)
+    with open(filename, 'rb') as f:
+        content = f.read()
+    with open(filename, 'wb') as f:
+        f.write(content[:-10])
+
+    with pytest.raises(ValueError) as err:
+        SaveframeReader(filename)
+
+    expected = (f"The file '{filename}' is truncated or corrupt, and is not "
+                "valid saveframe data: missing trailer")
+    assert str(err.value) == expected
+
+
+def test_out_of_band_buffers(tmpdir):
+    np = pytest.importorskip("numpy")
+    from pyflyby._saveframe import OUT_OF_BAND_BUFFER_ALIGNMENT
+    filename = str(tmpdir / f"saveframe_{get_random()}.pkl")
+    code = dedent("""
+        def func():
+            import numpy as np
+            big_array = np.arange(100000, dtype=np.float64)
+            small_array = np.arange(10)
+            raise ValueError("Error is raised")
+        func()
+    """)
+    with run_code_and_set_exception(code, ValueError):
+        saveframe(filename=filename, frames=1)
+    reader = SaveframeReader(filename)
+
+    big_array = reader.get_variables('big_array')
+    assert isinstance(big_array, np.ndarray)
+    assert (big_array == np.arange(100000, dtype=np.float64)).all()
+    assert not big_array.flags.writeable
+    assert big_array.ctypes.data % OUT_OF_BAND_BUFFER_ALIGNMENT == 0
+    small_array = reader.get_variables('small_array')
+    assert (small_array == np.arange(10)).all()
+    assert small_array.flags.writeable
+    # The raw data is self-contained.
+    data = reader.data
+    assert (pickle.loads(data[1]['variables']['big_array'])
+            == np.arange(100000, dtype=np.float64)).all()
+
+
+def test_query_saveframes(tmpdir, monkeypatch):
+    pkg_name = create_pkg(tmpdir)
+    os.mkdir(str(tmpdir / "dumps"))
+    os.mkdir(str(tmpdir / "dumps" / "sub"))
+    filenames = []
+    for frames in [1, 2]:
+        filename = call_saveframe(pkg_name, tmpdir, frames=frames)
+        filenames.append(str(tmpdir / "dumps" / "sub" / f"{frames}.pkl"))
+        os.rename(filename, filenames[-1])
+    code = dedent("""
+        def func():
+            raise KeyError("key")
+        func()
+    """)
+    filenames.insert(0, str(tmpdir / "dumps" / "0.pkl"))
+    with run_code_and_set_exception(code, KeyError):
+        saveframe(filename=filenames[0], frames=1)
+    legacy_filename = str(tmpdir / "dumps" / "legacy.pkl")
+    with open(legacy_filename, 'wb') as f:
+        pickle.dump(SaveframeReader(filenames[1]).data, f)
+    with open(str(tmpdir / "dumps" / "notes.txt"), 'w') as f:
+        f.write("Not a saveframe file.")
+
+    unpickled = []
+    loads = pickle.loads
+    def recording_loads(data, *args, **kwargs):
+        value = loads(data, *args, **kwargs)
+        unpickled.append(value)
+        return value
+    monkeypatch.setattr(pickle, "loads", recording_loads)
+    records = list(query_saveframes(str(tmpdir / "dumps"), max_workers=2))
+    assert unpickled == []
+
+    assert [record['path'] for record in records] == [
+        filenames[0], legacy_filename, filenames[1], filenames[2]]
+    assert records[1]['error'].startswith(
+        "ValueError: The file is not in the indexed saveframe format")
+    assert records[0]['exception_class_qualname'] == 'KeyError'
+    assert records[0]['frame_identifier'] == '<string>,3,func'
+    frame_identifier = f"{tmpdir}/{pkg_name}/pkg1/pkg2/mod3.py,6,func3"
+    for record in records[2:]:
+        assert record['exception_full_string'] == "ValueError: Error is raised"
+        assert record['frame_identifier'] == frame_identifier
+        assert record['lineno'] == 6
+        assert record['num_snapshots'] == 1
+        assert 'exception_object' not in record
+    assert [frame['frame_index'] for frame in records[3]['frames']] == [1, 2]
+    assert sorted(records[3]['frames'][1]['variables']) == [
+        'self', 'var1', 'var2']
+    assert list(records[3]['frames'][1]['skipped_variables']) == ['var3']
+
+    groups = group_saveframes(records)
+    assert groups == [
+        {'exception_class_qualname': 'ValueError',
+         'frame_identifier': frame_identifier, 'count': 2,
+         'paths': filenames[1:]},
+        {'exception_class_qualname': 'KeyError',
+         'frame_identifier': '<string>,3,func', 'count': 1,
+         'paths': filenames[:1]}]
+    with pytest.raises(ValueError):
+        group_saveframes(records, by=['variables'])
+
+    records = list(query_saveframes([legacy_filename, filenames[0]],
+                                    max_workers=1, unpickle=True))
+    assert repr(records[0]['exception_object']) == repr(
+        ValueError("Error is raised"))
+    assert records[0]['frame_identifier'] == frame_identifier
+    assert repr(records[1]['exception_object']) == repr(KeyError("key"))
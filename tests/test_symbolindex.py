@@ -0,0 +1,126 @@
+# pyflyby/test_symbolindex.py
+
+# License for THIS FILE ONLY: CC0 Public Domain Dedication
+# http://creativecommons.org/publicdomain/zero/1.0/
+
+from   textwrap                 import dedent
+
+import pytest
+
+from   pyflyby._autoimp         import auto_import_symbol, get_known_import
+from   pyflyby._importdb        import ImportDB
+from   pyflyby._imports2s       import fix_unused_and_missing_imports
+from   pyflyby._importstmt      import Import
+from   pyflyby._parse           import PythonBlock
+from   pyflyby._symbolindex     import SymbolIndex
+
+
+EXPORTS = [
+    ("pyflyby_test_symidx", ["alpha", "shared"]),
+    ("pyflyby_test_symidx.sub", ["shared", "beta"]),
+    ("pyflyby_test_symidx._impl", ["beta", "gamma"]),
+]
+
+
+@pytest.fixture
+def index_file(tmp_path):
+    filename = str(tmp_path / "symbols.sqlite")
+    assert SymbolIndex.build(filename, EXPORTS) == 6
+    return filename
+
+
+@pytest.fixture
+def default_index(index_file, monkeypatch):
+    monkeypatch.setenv("PYFLYBY_SYMBOL_INDEX", index_file)
+    monkeypatch.delenv("PYFLYBY_SYMBOL_INDEX_POLICY", raising=False)
+    return SymbolIndex.get_default()
+
+
+def test_SymbolIndex_modules_exporting_1(index_file):
+    index = SymbolIndex(index_file)
+    assert index.modules_exporting("alpha") == ["pyflyby_test_symidx"]
+    assert index.modules_exporting("shared") == [
+        "pyflyby_test_symidx", "pyflyby_test_symidx.sub"]
+    assert index.modules_exporting("beta") == [
+        "pyflyby_test_symidx.sub", "pyflyby_test_symidx._impl"]
+    assert index.modules_exporting("nonexistent") == []
+
+
+@pytest.mark.parametrize("policy,expected", [
+    ("public-shallow", "from pyflyby_test_symidx.sub import beta"),
+    ("shallow", "from pyflyby_test_symidx._impl import beta"),
+    ("unique", None),
+])
+def test_SymbolIndex_find_import_policy_1(index_file, policy, expected):
+    imp = SymbolIndex(index_file, policy=policy).find_import("beta")
+    assert imp == (Import(expected) if expected else None)
+
+
+def test_SymbolIndex_find_import_exclude_1(index_file):
+    index = SymbolIndex(index_file)
+    imp = index.find_import(
+        "beta", exclude=[Import("from pyflyby_test_symidx.sub import beta")])
+    assert imp == Import("from pyflyby_test_symidx._impl import beta")
+
+
+def test_SymbolIndex_bad_policy_1(index_file):
+    with pytest.raises(ValueError):
+        SymbolIndex(index_file, policy="nonexistent")
+
+
+def test_SymbolIndex_missing_file_1(tmp_path):
+    index = SymbolIndex(str(tmp_path / "nonexistent.sqlite"))
+    assert index.find_import("alpha") is None
+
+
+def test_SymbolIndex_get_default_unset_1(monkeypatch):
+    monkeypatch.delenv("PYFLYBY_SYMBOL_INDEX", raising=False)
+    assert SymbolIndex.get_default() is None
+
+
+def test_SymbolIndex_rebuild_1(index_file):
+    index = SymbolIndex(index_file)
+    assert index.find_import("alpha") is not None
+    SymbolIndex.build(index_file, [("pyflyby_test_symidx2", ["delta"])])
+    index = SymbolIndex(index_file)
+    assert index.find_import("alpha") is None
+    assert index.find_import("delta") == Import(
+        "from pyflyby_test_symidx2 import delta")
+
+
+def test_fix_missing_imports_symbol_index_1(default_index):
+    input = PythonBlock(dedent('''
+        from os import path
+        alpha, path
+        gamma_unknown_48219
+    ''').lstrip())
+    db = ImportDB("")
+    output = fix_unused_and_missing_imports(input, db=db)
+    expected = PythonBlock(dedent('''
+        from os                  import path
+        from pyflyby_test_symidx import alpha
+        alpha, path
+        gamma_unknown_48219
+    ''').lstrip())
+    assert output == expected
+
+
+def test_get_known_import_symbol_index_1(default_index):
+    db = ImportDB("")
+    assert get_known_import("alpha.real", db=db) == (
+        Import("from pyflyby_test_symidx import alpha"),)
+    # Importable modules win over the index.
+    assert get_known_import("os.path", db=db) is None
+
+
+def test_get_known_import_symbol_index_forget_1(default_index):
+    db = ImportDB("__forget_imports__ = ['from pyflyby_test_symidx import alpha']")
+    assert get_known_import("alpha", db=db) is None
+
+
+def test_auto_import_symbol_symbol_index_1(default_index, tmp_module):
+    tmp_module("pyflyby_test_symidx", "alpha = 42\nshared = 1\n",
+               package=True)
+    namespace = {}
+    assert auto_import_symbol("alpha", [namespace], db=ImportDB("")) is True
+    assert namespace["alpha"] == 42